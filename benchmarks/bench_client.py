@@ -0,0 +1,209 @@
+"""
+Benchmark of the client against the in-process fake API of `fake_api.py`: no network access is needed.
+
+Scenarios:
+    inference         `RecognitionSpec.inference()` from concurrent threads, task waiting included
+    task_wait         `Task.wait()` of already created tasks from concurrent threads
+    batch_wait        `Task.batch_wait()` of already created tasks
+    resource_list     iteration over `RecognitionSpec.list()` pages
+    multipart_upload  `Network.create()` with a model file sent as a multipart body
+
+Usage:
+    python benchmarks/bench_client.py [--scenario inference] [--latency 0.002] [--json] [--output results.json]
+    python benchmarks/bench_client.py --baseline results.json [--tolerance 0.2]
+
+With `--baseline`, the throughputs are compared with a previous `--output` and the script exits with
+status 1 if one of them dropped by more than `--tolerance`, to catch client-side regressions in CI.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# run from a checkout: `fake_api` is next to this script and `deepomatic` is imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_api import FakeAPI  # noqa: E402
+
+from deepomatic.api.client import Client  # noqa: E402
+from deepomatic.api.inputs import ImageInput  # noqa: E402
+from deepomatic.api.version import __version__  # noqa: E402
+
+IMAGE_URL = 'https://static.deepomatic.com/resources/demos/api-clients/dog1.jpg'
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(name, functor, count, workers, unit='ops', items_per_call=1):
+    """
+    Call `functor(i)` for i in range(count) from `workers` threads.
+    Return the throughput in `unit` per second and the latency percentiles in milliseconds of the calls.
+    """
+    latencies = []
+    errors = [0]
+
+    def timed_call(i):
+        start = time.time()
+        try:
+            functor(i)
+        except Exception:
+            errors[0] += 1
+        latencies.append(time.time() - start)
+
+    start = time.time()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(timed_call, range(count)))
+    else:
+        for i in range(count):
+            timed_call(i)
+    duration = time.time() - start
+
+    return {
+        'scenario': name,
+        'calls': count,
+        'workers': workers,
+        'errors': errors[0],
+        'duration_s': duration,
+        'throughput': count * items_per_call / duration,
+        'unit': unit + '/s',
+        'latency_ms': {label: percentile(latencies, q) * 1000
+                       for label, q in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.)]},
+    }
+
+
+def create_tasks(client, count, workers):
+    spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda i: spec.inference(inputs=[ImageInput(IMAGE_URL)], return_task=True, wait_task=False),
+                                 range(count)))
+
+
+def bench_inference(client, args):
+    spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+    return measure('inference', lambda i: spec.inference(inputs=[ImageInput(IMAGE_URL)]),
+                   args.count, args.workers, unit='inferences')
+
+
+def bench_task_wait(client, args):
+    tasks = create_tasks(client, args.count, args.workers)
+    return measure('task_wait', lambda i: tasks[i].wait(), args.count, args.workers, unit='tasks')
+
+
+def bench_batch_wait(client, args):
+    tasks = create_tasks(client, args.count * 10, args.workers)
+    return measure('batch_wait', lambda i: client.Task.batch_wait(tasks=tasks), 1, 1,
+                   unit='tasks', items_per_call=len(tasks))
+
+
+def bench_resource_list(client, args):
+    def iterate(i):
+        count = sum(1 for _ in client.RecognitionSpec.list())
+        assert count == 1000
+
+    return measure('resource_list', iterate, max(1, args.count // 20), 1, unit='resources', items_per_call=1000)
+
+
+def bench_multipart_upload(client, args):
+    model = os.urandom(args.upload_size)
+
+    def upload(i):
+        client.Network.create(name='network {}'.format(i), framework='tensorflow-1.x',
+                              preprocessing={'inputs': [{'tensor_name': 'input', 'image': {}}]},
+                              files={'saved_model.pb': model})
+
+    return measure('multipart_upload', upload, max(1, args.count // 10), min(args.workers, 4),
+                   unit='MB', items_per_call=args.upload_size / 1e6)
+
+
+SCENARIOS = {
+    'inference': bench_inference,
+    'task_wait': bench_task_wait,
+    'batch_wait': bench_batch_wait,
+    'resource_list': bench_resource_list,
+    'multipart_upload': bench_multipart_upload,
+}
+
+
+def run(args):
+    results = []
+    with FakeAPI(latency=args.latency, task_duration=args.task_duration, error_rate=args.error_rate,
+                 server_error_rate=args.server_error_rate) as api:
+        for name in args.scenario or list(SCENARIOS):
+            client = Client(api_key='fake', host=api.url, pool_maxsize=max(args.workers, 10))
+            results.append(SCENARIOS[name](client, args))
+    return {
+        'client_version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: getattr(args, key) for key in ['count', 'workers', 'latency', 'task_duration', 'error_rate',
+                                                       'server_error_rate', 'upload_size']},
+        'results': results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return the scenarios of `results` whose throughput is lower than in `baseline` by more than `tolerance`.
+    """
+    baseline = {result['scenario']: result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        reference = baseline.get(result['scenario'])
+        if reference is not None and result['throughput'] < reference['throughput'] * (1 - tolerance):
+            regressions.append((result['scenario'], reference['throughput'], result['throughput']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="Scenario to run, can be repeated. Defaults to all of them.")
+    parser.add_argument('--count', type=int, default=200, help="Number of calls of the inference and task scenarios.")
+    parser.add_argument('--workers', type=int, default=10, help="Number of concurrent threads.")
+    parser.add_argument('--latency', type=float, default=0.002, help="Latency in seconds of the fake API.")
+    parser.add_argument('--task-duration', type=float, default=0.05, help="Duration in seconds of the fake tasks.")
+    parser.add_argument('--error-rate', type=float, default=0., help="Probability of a fake task to fail.")
+    parser.add_argument('--server-error-rate', type=float, default=0.,
+                        help="Probability of a request to fail with a 502 error (retried by the client).")
+    parser.add_argument('--upload-size', type=int, default=8 * 1024 * 1024, help="Size in bytes of the uploaded model.")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    parser.add_argument('--baseline', help="Compare the throughputs with the results of a previous run.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed relative throughput drop compared with the baseline. Defaults to 0.2.")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print('{:<18}{:>8}{:>8}{:>16}{:>14}{:>10}{:>10}{:>10}'.format(
+            'scenario', 'calls', 'errors', 'throughput', 'unit', 'p50 ms', 'p90 ms', 'p99 ms'))
+        for r in results['results']:
+            latency = '{p50:>10.1f}{p90:>10.1f}{p99:>10.1f}'.format(**r['latency_ms'])
+            print('{scenario:<18}{calls:>8}{errors:>8}{throughput:>16.1f}{unit:>14}'.format(**r) + latency)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for scenario, reference, throughput in regressions:
+            print('REGRESSION {}: {:.1f} -> {:.1f}'.format(scenario, reference, throughput), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
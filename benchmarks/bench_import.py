@@ -0,0 +1,72 @@
+"""
+Benchmark of the startup of the client: time to import `deepomatic.api.client` and to construct a `Client`,
+measured in fresh Python processes.
+
+Usage:
+    python benchmarks/bench_import.py [--number 10] [--json] [--max-import-ms 500]
+
+The script exits with status 1 if a module which must be imported lazily (e.g. numpy) is loaded by the import
+and the construction of a client, or if the median import time is above `--max-import-ms`.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# modules only needed by some features, which must not slow down the startup
+LAZY_MODULES = ['numpy', 'aiohttp', 'PIL']
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import deepomatic.api.client
+imported = time.perf_counter()
+deepomatic.api.client.Client(api_key='fake')
+constructed = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - start) * 1000, 'client_ms': (constructed - imported) * 1000,
+                  'lazy_modules_loaded': [name for name in {lazy_modules!r} if name in sys.modules]}}))
+"""
+
+
+def run(number):
+    script = SCRIPT.format(lazy_modules=LAZY_MODULES)
+    samples = []
+    for _ in range(number):
+        output = subprocess.check_output([sys.executable, '-c', script])
+        samples.append(json.loads(output.decode('utf-8')))
+    return {
+        'number': number,
+        'import_ms': statistics.median(sample['import_ms'] for sample in samples),
+        'client_ms': statistics.median(sample['client_ms'] for sample in samples),
+        'lazy_modules_loaded': sorted(set(name for sample in samples for name in sample['lazy_modules_loaded'])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=10, help="Number of processes, the median is reported.")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+    parser.add_argument('--max-import-ms', type=float, help="Fail if the median import time is above this value.")
+    args = parser.parse_args()
+
+    results = run(args.number)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print('import deepomatic.api.client: {import_ms:.1f} ms'.format(**results))
+        print('Client():                     {client_ms:.1f} ms'.format(**results))
+
+    failed = False
+    if results['lazy_modules_loaded']:
+        print('Modules imported eagerly: {}'.format(', '.join(results['lazy_modules_loaded'])), file=sys.stderr)
+        failed = True
+    if args.max_import_ms is not None and results['import_ms'] > args.max_import_ms:
+        print('Import time above {} ms'.format(args.max_import_ms), file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark of the JSON codecs available to `HTTPHelper(json_codec=...)` on representative API payloads.
+
+Usage:
+    python benchmarks/bench_json_codec.py [--number 20] [--json]
+
+Codecs which are not installed are skipped. Times are in milliseconds per call.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+# run from a checkout: `deepomatic` is imported from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepomatic.api.json_codec import CODECS  # noqa: E402
+
+random.seed(0)
+
+
+def tensor(name, shape):
+    size = 1
+    for dim in shape:
+        size *= dim
+    return {'name': name, 'shape': shape, 'data': [random.random() for _ in range(size)]}
+
+
+def network_inference_payload():
+    # `Network.inference` task data with the raw output tensors
+    return {'tensors': [tensor('inception_v3/logits/predictions', [1, 1001]),
+                        tensor('inception_v3/mixed_7c', [1, 8, 8, 2048])]}
+
+
+def recognition_inference_payload():
+    # `RecognitionSpec.inference` task data with `show_discarded=True`
+    def prediction(i):
+        return {'label_id': i, 'label_name': 'label {}'.format(i), 'score': random.random(), 'threshold': 0.5}
+    return {'outputs': [{'labels': {'predicted': [prediction(i) for i in range(5)],
+                                    'discarded': [prediction(i) for i in range(5, 1000)]}}]}
+
+
+def list_page_payload():
+    # a page of `RecognitionSpec.list()`
+    def spec(i):
+        return {'id': i, 'name': 'spec {}'.format(i), 'description': 'description ' * 10,
+                'update_date': '2019-03-01T10:20:30.123456Z', 'current_version_id': i,
+                'metadata': {'key': 'value'},
+                'outputs': [{'labels': {'roi': 'NONE', 'labels': [{'id': j, 'name': 'label {}'.format(j)}
+                                                                  for j in range(100)]}}]}
+    return {'count': 1000, 'next': 'https://api.deepomatic.com/v0.7/recognition/specs/?offset=100',
+            'prev': None, 'results': [spec(i) for i in range(100)]}
+
+
+PAYLOADS = {
+    'network_inference': network_inference_payload,
+    'recognition_inference': recognition_inference_payload,
+    'list_page': list_page_payload,
+}
+
+
+def run(number):
+    results = []
+    for payload_name, build_payload in PAYLOADS.items():
+        payload = build_payload()
+        encoded = json.dumps(payload).encode('utf-8')
+        for codec_name, codec_class in CODECS.items():
+            try:
+                codec = codec_class()
+            except ImportError:
+                continue
+            encode = timeit.timeit(lambda: codec.dumps(payload), number=number) / number
+            decode = timeit.timeit(lambda: codec.loads(encoded), number=number) / number
+            results.append({'payload': payload_name, 'size': len(encoded), 'codec': codec_name,
+                            'encode_ms': encode * 1000, 'decode_ms': decode * 1000})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20, help="Number of calls per measure.")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    results = run(args.number)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:<24}{:>10}  {:<12}{:>12}{:>12}'.format('payload', 'bytes', 'codec', 'encode ms', 'decode ms'))
+    for r in results:
+        print('{payload:<24}{size:>10}  {codec:<12}{encode_ms:>12.2f}{decode_ms:>12.2f}'.format(**r))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+In-process fake of the Deepomatic API, used by the benchmarks to measure the client without any network access.
+
+It implements the endpoints used by the client:
+    - `/recognition/specs/`, `/recognition/public/`, `/recognition/versions/` and `/networks/`:
+      paginated lists, retrieve, create (JSON or multipart) and inference
+    - `/tasks/{id}/` and `/tasks/?task_ids=...`
+    - `/accounts/me/`
+
+Usage:
+    with FakeAPI(latency=0.005, task_duration=0.1, error_rate=0.01) as api:
+        client = Client(api_key='fake', host=api.url)
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# number of resources returned by the list endpoints
+LIST_COUNT = 1000
+
+RESOURCE_PATTERN = re.compile(r'^/(?:v[\d.]+/)?(?P<collection>recognition/specs|recognition/public|recognition/versions|networks/public'
+                              r'|networks|tasks|accounts)/(?:(?P<pk>[^/]+)/)?(?P<suffix>inference)?/?$')
+
+
+class FakeAPIState(object):
+    def __init__(self, latency, task_duration, error_rate, server_error_rate, seed):
+        self.latency = latency
+        self.task_duration = task_duration
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.task_ids = itertools.count(1)
+        self.resource_ids = itertools.count(LIST_COUNT + 1)
+        # task id -> (creation time, failed)
+        self.tasks = {}
+        self.requests = 0
+        self.bytes_received = 0
+
+    def create_task(self):
+        with self.lock:
+            task_id = next(self.task_ids)
+            self.tasks[task_id] = (time.time(), self.random.random() < self.error_rate)
+        return task_id
+
+    def task(self, task_id):
+        with self.lock:
+            created, failed = self.tasks.get(task_id, (None, False))
+        if created is None:
+            return None
+        status = 'pending'
+        if time.time() - created >= self.task_duration:
+            status = 'error' if failed else 'success'
+        return {
+            'id': task_id,
+            'status': status,
+            'error': 'Fake inference error' if status == 'error' else None,
+            'date_created': created,
+            'data': fake_inference_result(task_id) if status == 'success' else None,
+        }
+
+
+def fake_inference_result(task_id):
+    return {'outputs': [{'labels': {'discarded': [], 'predicted': [
+        {'label_id': task_id % 1000, 'label_name': 'label {}'.format(task_id % 1000), 'score': 0.9, 'threshold': 0.5,
+         'roi': {'region_id': 1, 'bbox': {'xmin': 0.1, 'ymin': 0.2, 'xmax': 0.8, 'ymax': 0.9}}}]}}]}
+
+
+def fake_resource(collection, pk):
+    resource = {'id': pk, 'name': '{} {}'.format(collection, pk), 'description': 'fake', 'metadata': {},
+                'update_date': '2019-03-01T10:20:30.123456Z'}
+    if collection.startswith('recognition/specs') or collection == 'recognition/public':
+        resource['current_version_id'] = pk
+        labels = [{'id': i, 'name': 'label {}'.format(i)} for i in range(10)]
+        resource['outputs'] = [{'labels': {'roi': 'NONE', 'labels': labels}}]
+    elif collection == 'recognition/versions':
+        resource.update({'spec_id': pk, 'network_id': pk, 'post_processings': []})
+    return resource
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send the headers and the body in one packet, Nagle's algorithm would delay the body by 40ms
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                body.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(body)
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def handle_request(self, method):
+        state = self.state
+        body = self.read_body() if method == 'POST' else b''
+        with state.lock:
+            state.requests += 1
+            state.bytes_received += len(body)
+        if state.latency:
+            time.sleep(state.latency)
+        if state.server_error_rate and state.random.random() < state.server_error_rate:
+            return self.send_json({'error': 'Fake server error'}, status=502)
+
+        url = urlparse(self.path)
+        match = RESOURCE_PATTERN.match(url.path)
+        if match is None:
+            return self.send_json({'error': 'Not found'}, status=404)
+        collection, pk, suffix = match.group('collection', 'pk', 'suffix')
+        params = parse_qs(url.query)
+
+        if method == 'POST':
+            if suffix == 'inference':
+                return self.send_json({'task_id': state.create_task()})
+            if pk is None and collection != 'tasks':
+                with state.lock:
+                    resource_id = next(state.resource_ids)
+                return self.send_json(fake_resource(collection, resource_id), status=201)
+        elif collection == 'tasks':
+            if pk is not None:
+                task = state.task(int(pk))
+                return self.send_json(task) if task else self.send_json({'error': 'Not found'}, status=404)
+            tasks = [state.task(int(task_id)) for task_id in params.get('task_ids', [])]
+            tasks = [task for task in tasks if task is not None]
+            return self.send_json({'count': len(tasks), 'next': None, 'previous': None, 'results': tasks})
+        elif pk is not None:
+            return self.send_json(fake_resource(collection, int(pk) if pk.isdigit() else pk))
+        else:
+            offset = int(params.get('offset', [0])[0])
+            limit = int(params.get('limit', [100])[0])
+            end = min(offset + limit, LIST_COUNT)
+            next_url = None
+            if end < LIST_COUNT:
+                host, port = self.server.server_address
+                next_url = 'http://{}:{}{}?offset={}&limit={}'.format(host, port, url.path, end, limit)
+            return self.send_json({'count': LIST_COUNT, 'next': next_url, 'previous': None,
+                                   'results': [fake_resource(collection, i) for i in range(offset + 1, end + 1)]})
+        self.send_json({'error': 'Method not allowed'}, status=405)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+
+class FakeAPI(object):
+    """
+    Fake API server running in a background thread.
+
+    :param latency (optional): time in seconds spent by the server before answering each request. Defaults to 0.
+    :param task_duration (optional): time in seconds after which an inference task is complete. Defaults to 0.
+    :param error_rate (optional): probability of an inference task to end in error. Defaults to 0.
+    :param server_error_rate (optional): probability of a request to fail with a 502 error. Defaults to 0.
+    :param seed (optional): seed of the random errors.
+    """
+    def __init__(self, latency=0., task_duration=0., error_rate=0., server_error_rate=0., seed=0):
+        self.state = FakeAPIState(latency, task_duration, error_rate, server_error_rate, seed)
+        self.server = None
+        self.url = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAPIHandler)
+        self.server.daemon_threads = True
+        self.server.state = self.state
+        thread = threading.Thread(target=self.server.serve_forever, name='fake-api')
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from deepomatic.api.aio.http_helper import AsyncHTTPHelper
+from deepomatic.api.aio.resources.account import AsyncAccount
+from deepomatic.api.aio.resources.network import AsyncNetwork
+from deepomatic.api.aio.resources.recognition import (AsyncRecognitionSpec,
+                                                      AsyncRecognitionVersion)
+from deepomatic.api.aio.resources.task import AsyncTask
+
+
+class AsyncClient(object):
+
+    def __init__(self, *args, **kwargs):
+        """
+           Constructs an asyncio Client to send requests to the Deepomatic API.
+           It takes the same parameters as `client.Client` and exposes the same resources,
+           all methods doing network calls are coroutines:
+
+           ```
+               async with AsyncClient(api_key=api_key) as client:
+                   spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+                   result = await spec.inference(inputs=[ImageInput(url)])
+                   async for spec in client.RecognitionSpec.list(public=True):
+                       ...
+           ```
+
+           Requires the `aiohttp` package: `pip install deepomatic-api[aio]`.
+           `pool_maxsize` is the maximum number of simultaneous connections, requests above this
+           limit are queued in the event loop until a connection is available.
+
+           :return: :class:`AsyncClient` object
+           :rtype: deepomatic.api.aio.client.AsyncClient
+        """
+        self.http_helper = AsyncHTTPHelper(*args, **kwargs)
+        self.metrics = self.http_helper.metrics
+
+        # /accounts
+
+        self.Account = AsyncAccount(self.http_helper)
+
+        # /tasks
+
+        self.Task = AsyncTask(self.http_helper)
+
+        # /networks
+
+        self.Network = AsyncNetwork(self.http_helper)
+
+        # /recognition
+
+        self.RecognitionSpec = AsyncRecognitionSpec(self.http_helper)
+
+        self.RecognitionVersion = AsyncRecognitionVersion(self.http_helper)
+
+    def stats(self, reset=False):
+        """
+        Return the metrics recorded for each endpoint, see `client.Client.stats()`.
+        """
+        return self.metrics.snapshot(reset=reset)
+
+    async def close(self):
+        """
+        Close the underlying HTTP connections.
+        """
+        await self.http_helper.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import asyncio
+import functools
+import json
+import time
+
+import requests
+from deepomatic.api.exceptions import UnimplementedException
+from deepomatic.api.http_helper import HTTPHelper
+from deepomatic.api.metrics import NULL_REQUEST_METRICS
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    raise ImportError("deepomatic.api.aio requires aiohttp, install it with: pip install deepomatic-api[aio]")
+
+
+###############################################################################
+
+class AsyncResponse(object):
+    """
+    Fully read HTTP response, exposing the subset of `requests.Response` used by the client,
+    so that `HTTPRetry` predicates and `BadStatus` exceptions behave the same way.
+    """
+    def __init__(self, status_code, headers, content, url=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncHTTPHelper(HTTPHelper):
+    def __init__(self, *args, **kwargs):
+        """
+        Init the asyncio HTTP helper, it takes the same parameters as `http_helper.HTTPHelper`.
+        `pool_maxsize` is the maximum number of simultaneous connections: requests above this limit
+        wait for a free connection without consuming a thread.
+        """
+        super(AsyncHTTPHelper, self).__init__(*args, **kwargs)
+
+    def _setup_session(self):
+        if self.share_connections:
+            raise UnimplementedException("share_connections is not available with the asyncio client")
+        if self.concurrency_limiter is not None:
+            raise UnimplementedException("concurrency_limiter is not available with the asyncio client")
+        if self.hedging is not None:
+            raise UnimplementedException("hedging is not available with the asyncio client")
+        if self.single_flight is not None:
+            raise UnimplementedException("coalesce_gets is not available with the asyncio client")
+        if self.response_cache is not None:
+            raise UnimplementedException("response_cache is not available with the asyncio client")
+        if self.inference_cache is not None:
+            raise UnimplementedException("inference_cache is not available with the asyncio client")
+        # aiohttp.ClientSession must be created inside a running event loop, see `get_session()`
+        self.session = None
+
+    def warmup(self, n=None):
+        raise UnimplementedException("warmup is not available with the asyncio client")
+
+    def get_session(self):
+        if self.session is None or self.session.closed:
+            connector_kwargs = {'limit': self.pool_maxsize}
+            if not self.verify_ssl:
+                connector_kwargs['ssl'] = False
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**connector_kwargs),
+                                                 headers=self.default_headers())
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    @staticmethod
+    def _client_timeout(requests_timeout):
+        # `requests` timeouts are either a float or a tuple (connect, read)
+        if isinstance(requests_timeout, (tuple, list)):
+            connect, read = requests_timeout
+        else:
+            connect = read = requests_timeout
+        return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+
+    @staticmethod
+    def _encode_params(params):
+        # same encoding as `requests`: lists are repeated keys and None values are dropped
+        if not params:
+            return None
+        encoded = []
+        for key, value in params.items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for v in values:
+                if v is not None:
+                    encoded.append((key, str(v)))
+        return encoded
+
+    @staticmethod
+    def _build_form_data(data, files):
+        form = aiohttp.FormData()
+        for key, value in (data or {}).items():
+            if value is not None:
+                form.add_field(key, value if isinstance(value, (str, bytes)) else str(value))
+        for key, value in files.items():
+            filename, content_type = key, None
+            if isinstance(value, (tuple, list)):
+                filename, value, content_type = value
+            elif hasattr(value, 'read'):
+                filename = getattr(value, 'name', key)
+            if value is None:
+                continue
+            if isinstance(value, (int, float, bool)):
+                value = str(value)
+            form.add_field(key, value, filename=filename, content_type=content_type)
+        return form
+
+    async def send_request(self, method, url, params=None, data=None, files=None,
+                           headers=None, timeout=None, request_metrics=NULL_REQUEST_METRICS):
+        # this is the timeout of requests module
+        if timeout is None:
+            timeout = self.requests_timeout
+
+        self.rewind_files(files)
+        if files:
+            data = self._build_form_data(data, files)
+
+        start_time = time.perf_counter()
+        try:
+            response = await self._send(method, url, params, data, headers, timeout)
+        except Exception as e:
+            request_metrics.add_attempt(start_time, exception=e)
+            raise
+        request_metrics.add_attempt(start_time, response=response)
+        return response
+
+    async def _send(self, method, url, params, data, headers, timeout):
+        # aiohttp exceptions are translated to their `requests` counterpart, to keep `HTTPRetry` semantics
+        try:
+            async with self.get_session().request(method, url,
+                                                  params=self._encode_params(params),
+                                                  data=data,
+                                                  headers=dict(headers or {}),
+                                                  timeout=self._client_timeout(timeout)) as response:
+                content = await response.read()
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e) or "Request timed out: {} {}".format(method, url)) from e
+        except aiohttp.InvalidURL as e:
+            raise requests.exceptions.InvalidURL(str(e)) from e
+        except aiohttp.ClientError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+        return AsyncResponse(response.status, response.headers, content, url)
+
+    async def maybe_retry_send_request(self, method, *args, **kwargs):
+        http_retry = kwargs.pop('http_retry', self.http_retry)
+
+        functor = functools.partial(self.send_request, method, *args, **kwargs)
+
+        if http_retry is not None:
+            return await http_retry.async_retry(functor)
+
+        return await functor()
+
+    async def make_request(self, method, resource, params=None, data=None,
+                           content_type='application/json', files=None, **kwargs):
+
+        with self.metrics.request(method, resource, self.resource_prefix) as request_metrics:
+            content_type, data, files = self.prepare_content(data, content_type, files)
+
+            headers = self.setup_headers(content_type=content_type)
+            params = self.format_params(params)
+
+            files, opened_files = self.open_files(files)
+            # multipart bodies are built by aiohttp, their size is unknown
+            request_metrics.serialized(data if not files else None)
+
+            if not resource.startswith('http'):
+                resource = self.resource_prefix + resource
+
+            try:
+                response = await self.maybe_retry_send_request(method, resource,
+                                                               params=params, data=data,
+                                                               files=files, headers=headers,
+                                                               request_metrics=request_metrics,
+                                                               **kwargs)
+            finally:
+                # Close opened files
+                for file in opened_files:
+                    file.close()
+            request_metrics.received(response)
+
+            if response.status_code == 204:  # delete
+                return None
+
+            self.raise_for_status(response)
+
+            if 'application/json' in response.headers.get('Content-Type', ''):
+                return self.json_codec.loads(response.content)
+            else:
+                return response.content
+
+    async def get(self, resource, *args, **kwargs):
+        """
+        Perform a GET request
+        """
+        return await self.make_request('GET', resource, *args, **kwargs)
+
+    async def delete(self, resource, *args, **kwargs):
+        """
+        Perform a DELETE request
+        """
+        return await self.make_request('DELETE', resource, *args, **kwargs)
+
+    async def post(self, resource, *args, **kwargs):
+        """
+        Perform a POST request
+        """
+        return await self.make_request('POST', resource, *args, **kwargs)
+
+    async def put(self, resource, *args, **kwargs):
+        """
+        Perform a PUT request
+        """
+        return await self.make_request('PUT', resource, *args, **kwargs)
+
+    async def patch(self, resource, *args, **kwargs):
+        """
+        Perform a PATCH request
+        """
+        return await self.make_request('PATCH', resource, *args, **kwargs)
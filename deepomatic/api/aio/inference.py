@@ -0,0 +1,28 @@
+from deepomatic.api.aio.resources.task import AsyncTask
+from deepomatic.api.exceptions import UnimplementedException
+from deepomatic.api.inference import InferenceResource
+
+
+class AsyncInferenceResource(InferenceResource):
+    async def inference(self, return_task=False, wait_task=True, **kwargs):
+        content_type, data, files = self._prepare_inference_kwargs(kwargs)
+        result = await self._helper.post(self._uri(pk=self._pk, suffix='/inference'), content_type=content_type, data=data, files=files)
+        task_id = result['task_id']
+        task = AsyncTask(self._helper, pk=task_id)
+        if wait_task:
+            await task.wait()
+
+        if return_task:
+            return task
+        else:
+            return task['data']
+
+    def inference_async(self, *args, **kwargs):
+        raise UnimplementedException("inference_async() is not available with the asyncio client, use inference()")
+
+    def batch_inference(self, *args, **kwargs):
+        raise UnimplementedException("batch_inference() is not available with the asyncio client, "
+                                     "use asyncio.gather() of inference()")
+
+    def _get_input_size(self):
+        raise UnimplementedException("ImageInput(max_side=AUTO_SIZE) is not available with the asyncio client")
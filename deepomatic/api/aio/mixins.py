@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from deepomatic.api.aio.resource import AsyncResourceList
+from deepomatic.api.mixins import (CreateableResource, DeletableResource,
+                                   ListableResource, UpdatableResource)
+
+
+###############################################################################
+
+class AsyncUpdatableResource(UpdatableResource):
+    async def update(self, replace=False, content_type='application/json', files=None, **kwargs):
+        assert (self._pk is not None)
+        self._check_update_kwargs(kwargs)
+
+        if replace:
+            self._data = await self._helper.put(self._uri(pk=self._pk), data=kwargs, content_type=content_type, files=files)
+        else:
+            self._data = await self._helper.patch(self._uri(pk=self._pk), data=kwargs, content_type=content_type, files=files)
+
+
+###############################################################################
+
+class AsyncDeletableResource(DeletableResource):
+    async def delete(self):
+        assert (self._pk is not None)
+        return await self._helper.delete(self._uri(pk=self._pk))
+
+
+###############################################################################
+
+class AsyncCreateableResource(CreateableResource):
+    async def create(self, content_type='application/json', files=None, **kwargs):
+        content_type, post_kwargs = self._prepare_create_kwargs(content_type, files, kwargs)
+        data = await self._helper.post(self._uri(), data=kwargs,
+                                       content_type=content_type,
+                                       files=files, **post_kwargs)
+        return self.__class__(self._helper, pk=data['id'], data=data)
+
+
+###############################################################################
+
+class AsyncListableResource(ListableResource):
+    def list(self, offset=0, limit=100, **kwargs):
+        return AsyncResourceList(self.__class__, self._helper, self._uri(**kwargs), offset, limit, **kwargs)
+
+
+###############################################################################
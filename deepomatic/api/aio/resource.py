@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import asyncio
+import copy
+
+from deepomatic.api.exceptions import NoData
+from deepomatic.api.resource import Resource
+
+
+###############################################################################
+
+class AsyncResource(Resource):
+    """
+    Same as `resource.Resource` but network calls are coroutines.
+    As `__getitem__` cannot perform a request, it requires data to be fetched
+    with `await resource.data()` or `await resource.refresh()` first.
+    """
+
+    async def refresh(self):
+        assert (self._pk is not None)
+        self._data = await self._helper.get(self._uri(pk=self._pk))
+        return self
+
+    async def data(self, no_raise=False, no_refresh=False):
+        if self._data is None:
+            if self._pk is None:
+                if no_raise:
+                    return None
+                else:
+                    raise NoData()
+            else:
+                if not no_refresh:
+                    await self.refresh()
+        return self._data
+
+    def __getitem__(self, key):
+        if self._data is None:
+            raise NoData()
+        return self._data[key]
+
+
+###############################################################################
+
+class AsyncResourceList(AsyncResource):
+    """
+    This is an helper to access a resource list.
+    Unlike `resource.ResourceList`, the first page is lazily fetched, iterate with `async for`.
+    """
+
+    def __init__(self, resource_class, helper, uri, offset=None, limit=None, **kwargs):
+        super(AsyncResourceList, self).__init__(helper)
+        self._resource_class = resource_class
+        self._list_uri = uri
+        self._params = copy.deepcopy(kwargs)
+        if offset is not None:
+            self._params['offset'] = offset
+        if limit is not None:
+            self._params['limit'] = limit
+
+    async def refresh(self):
+        # `format_params` mutates the params
+        self._data = await self._helper.get(self._list_uri, params=copy.deepcopy(self._params))
+        return self
+
+    async def data(self, no_raise=False, no_refresh=False):
+        if self._data is None and not no_refresh:
+            await self.refresh()
+        return self._data
+
+    def __aiter__(self):
+        return self._iter_resources()
+
+    async def _iter_resources(self):
+        page = await self.data()
+        next_fetch = None
+        try:
+            while True:
+                next_page = self._handle_prev_next(page['next'])
+                # fetch the next page while the current one is consumed
+                next_fetch = asyncio.ensure_future(next_page.data()) if next_page is not None else None
+                for resource in page['results']:
+                    yield self._resource_class(self._helper, resource['id'], resource)
+                if next_fetch is None:
+                    break
+                page = await next_fetch
+                next_fetch = None
+        finally:
+            if next_fetch is not None:
+                next_fetch.cancel()
+
+    async def count(self):
+        return (await self.data())['count']
+
+    async def next(self):
+        return await self._fetch_prev_next((await self.data())['next'])
+
+    async def prev(self):
+        return await self._fetch_prev_next((await self.data())['prev'])
+
+    async def _fetch_prev_next(self, uri):
+        resource_list = self._handle_prev_next(uri)
+        if resource_list is not None:
+            await resource_list.refresh()
+        return resource_list
+
+    def _handle_prev_next(self, uri):
+        if uri is None:
+            return None
+        else:
+            return AsyncResourceList(self._resource_class, self._helper, uri)
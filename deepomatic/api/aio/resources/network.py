@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from deepomatic.api.aio.inference import AsyncInferenceResource
+from deepomatic.api.aio.mixins import (AsyncCreateableResource, AsyncDeletableResource,
+                                       AsyncListableResource, AsyncUpdatableResource)
+from deepomatic.api.aio.resource import AsyncResource
+from deepomatic.api.http_helper import RequestsTimeout
+from deepomatic.api.resources.network import Network
+
+###############################################################################
+
+
+class AsyncNetwork(AsyncListableResource,
+                   AsyncCreateableResource,
+                   AsyncUpdatableResource,
+                   AsyncDeletableResource,
+                   AsyncInferenceResource,
+                   AsyncResource,
+                   Network):
+    """
+    This is an helper to manipulate a 'Network' object with asyncio.
+    """
+
+    async def inference(self, convert_to_numpy=True, return_task=False, dtype=None, tensor_encoding=None, **kwargs):
+        if convert_to_numpy:
+            return_task = False
+        if tensor_encoding is not None:
+            kwargs['tensor_encoding'] = tensor_encoding
+        result = await super(AsyncNetwork, self).inference(return_task=return_task, **kwargs)
+
+        if convert_to_numpy:
+            return self._convert_result_to_numpy(result, dtype)
+        else:
+            return result
+
+    async def create(self, *args, **kwargs):
+        # No retry on Network.create() errors by default as this is a large request
+        kwargs['http_retry'] = kwargs.get('http_retry', None)
+        kwargs['timeout'] = kwargs.get('timeout', RequestsTimeout.SLOW)
+        return await super(AsyncNetwork, self).create(*args, **kwargs)
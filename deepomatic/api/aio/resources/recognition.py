@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+from deepomatic.api.aio.inference import AsyncInferenceResource
+from deepomatic.api.aio.mixins import (AsyncCreateableResource, AsyncDeletableResource,
+                                       AsyncListableResource, AsyncUpdatableResource)
+from deepomatic.api.aio.resource import AsyncResource, AsyncResourceList
+from deepomatic.api.resources.recognition import RecognitionSpec, RecognitionVersion
+
+
+###############################################################################
+
+class AsyncRecognitionSpec(AsyncListableResource,
+                           AsyncCreateableResource,
+                           AsyncUpdatableResource,
+                           AsyncDeletableResource,
+                           AsyncInferenceResource,
+                           AsyncResource,
+                           RecognitionSpec):
+    """
+    This is an helper to manipulate a 'Recognition Specification' object with asyncio.
+    """
+
+    def versions(self, offset=0, limit=100):
+        assert (self._pk is not None)
+        return AsyncResourceList(AsyncRecognitionVersion, self._helper, self._uri(pk=self._pk, suffix='versions'), offset, limit)
+
+
+###############################################################################
+
+class AsyncRecognitionVersion(AsyncCreateableResource,
+                              AsyncDeletableResource,
+                              AsyncListableResource,
+                              AsyncInferenceResource,
+                              AsyncResource,
+                              RecognitionVersion):
+    """
+    This is an helper to manipulate a 'Recognition Version' object with asyncio.
+    """
+    pass
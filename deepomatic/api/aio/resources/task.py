@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2017 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+
+import asyncio
+import logging
+
+from deepomatic.api.aio.mixins import AsyncListableResource
+from deepomatic.api.aio.resource import AsyncResource
+from deepomatic.api.exceptions import (TaskError, TaskTimeout, HTTPRetryError,
+                                       TaskRetryError, UnimplementedException)
+from deepomatic.api.resources.task import (DEFAULT_CHUNK_SIZE, Task, get_tasks_retry_strategy,
+                                           has_pending_tasks, is_error_status,
+                                           is_pending_status)
+from deepomatic.api.utils import async_retry, async_warn_on_http_retry_error
+from tenacity import RetryError, retry_if_exception_type, retry_if_result
+
+logger = logging.getLogger(__name__)
+
+
+###############################################################################
+
+
+async def async_retry_get_tasks(apply_func, retry_if, timeout=60,
+                                wait_exp_multiplier=0.05, wait_exp_max=1.0, retry_budget=None):
+    wait, stop = get_tasks_retry_strategy(timeout, wait_exp_multiplier, wait_exp_max, retry_budget)
+    return await async_retry(apply_func, retry_if, wait, stop, retry_error_cls=TaskRetryError)
+
+
+class AsyncTask(AsyncListableResource, AsyncResource, Task):
+
+    def list(self, task_ids):
+        """
+        Returns a list of tasks
+        """
+        assert (isinstance(task_ids, list))
+        return super(AsyncTask, self).list(task_ids=task_ids)
+
+    async def wait(self, **retry_kwargs):
+        """
+        Wait until task is completed. Expires after 'timeout' seconds.
+        """
+        try:
+            await async_retry_get_tasks(self._refresh_status,
+                                        retry_if_exception_type(HTTPRetryError)
+                                        | retry_if_result(is_pending_status),
+                                        **self._with_retry_budget(retry_kwargs))
+        except TaskRetryError as retry_error:
+            raise TaskTimeout(self._data, retry_error)
+
+        if is_error_status(self._data['status']):
+            raise TaskError(self._data)
+
+        return self
+
+    async def _refresh_status(self):
+        logger.debug("Refreshing Task {}".format(self))
+        await async_warn_on_http_retry_error(self.refresh, suffix="Retrying until Task.wait timeouts.", reraise=True)
+        return self._data['status']
+
+    async def _list_tasks(self, task_ids):
+        return [task async for task in self.list(task_ids=task_ids)]
+
+    async def _refresh_tasks_status(self, pending_tasks, success_tasks, error_tasks,
+                                    chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None):
+        logger.debug("Refreshing batch of {} Task".format(len(pending_tasks)))
+        task_ids = [task.pk for idx, task in pending_tasks]
+        chunks = [task_ids[i:i + chunk_size] for i in range(0, len(task_ids), chunk_size)]
+        semaphore = asyncio.Semaphore(max_workers or self._helper.pool_maxsize)
+
+        async def refresh_chunk(chunk):
+            async with semaphore:
+                return await async_warn_on_http_retry_error(lambda: self._list_tasks(chunk),
+                                                            suffix="Retrying until Task.batch_wait timeouts.",
+                                                            reraise=True)
+
+        results = await asyncio.gather(*[refresh_chunk(chunk) for chunk in chunks], return_exceptions=True)
+
+        # the tasks of the chunks which have been refreshed are dispatched even if another chunk failed
+        refreshed_tasks = [task for result in results if not isinstance(result, BaseException) for task in result]
+        self._dispatch_tasks_status(refreshed_tasks, pending_tasks, success_tasks, error_tasks)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return pending_tasks
+
+    async def batch_wait(self, tasks, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, **retry_kwargs):
+        """
+        Wait until a list of task are completed. Expires after 'timeout' seconds.
+
+        Returns a tuple of list (pending_tasks, success_tasks, error_tasks).
+        Each list contains a couple (original_position, task) sorted by original_position asc
+        original_position gives the original index in the input tasks list parameter. This helps to keep the order.
+
+        Pending tasks are refreshed by chunks of `chunk_size` task ids, with up to `max_workers` concurrent
+        requests (defaults to the client `pool_maxsize`).
+        """
+        retry_kwargs['timeout'] = retry_kwargs.get('timeout', 300)
+        pending_tasks = list(enumerate(tasks))
+        success_tasks = []
+        error_tasks = []
+
+        async def refresh():
+            return await self._refresh_tasks_status(pending_tasks, success_tasks, error_tasks, chunk_size, max_workers)
+
+        try:
+            await async_retry_get_tasks(refresh, retry_if_result(has_pending_tasks), **retry_kwargs)
+        except RetryError:
+            pass
+
+        return (pending_tasks,
+                sorted(success_tasks, key=lambda v: v[0]),
+                sorted(error_tasks, key=lambda v: v[0]))
+
+    def as_completed(self, *args, **kwargs):
+        raise UnimplementedException("Task.as_completed() is not available with the asyncio client, use batch_wait()")
+
+
+###############################################################################
@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import argparse
+import csv
+import glob
+import io
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from six.moves import queue
+
+from deepomatic.api.checkpoint import CheckpointJournal
+from deepomatic.api.exceptions import DeepomaticException
+from deepomatic.api.inputs import ImageInput
+from deepomatic.api.resources.task import TaskPoller
+
+logger = logging.getLogger(__name__)
+
+
+# Bulk inference over directories, glob patterns and manifests of image paths or URLs,
+# fanned out across processes and streamed to a JSONL file:
+#     deepomatic-infer --spec imagenet-inception-v3 images/ --output results.jsonl
+#     python -m deepomatic.api.bulk --version 42 manifest.jsonl --processes 4 --in-flight 32
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+
+# columns or keys of a manifest entry holding the image path or URL, by priority
+MANIFEST_SOURCE_KEYS = ('source', 'path', 'url')
+
+RESOURCE_TYPES = ('spec', 'version', 'network')
+
+# timeout in seconds of the wait of a task
+WAIT_TIMEOUT = 300
+
+
+###############################################################################
+
+def is_url(source):
+    return any(source.startswith(protocol) for protocol in ImageInput.supported_protocols)
+
+
+def iter_inputs(location):
+    """
+    Yield a tuple (key, source) per image of `location`, which is either:
+        - a directory, walked recursively for files with an `IMAGE_EXTENSIONS` extension
+        - a glob pattern, e.g. 'images/**/*.jpg'
+        - a JSONL manifest (`.jsonl`): one JSON string per line, or an object with a 'source', 'path' or 'url' field
+          and an optional 'key'
+        - a CSV manifest (`.csv`) with a header: the same columns, or the image in the first column
+        - an image path or URL
+    The key identifies the input in the results, it defaults to the source.
+    """
+    if is_url(location):
+        yield location, location
+    elif os.path.isdir(location):
+        for root, dirs, files in os.walk(location):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    yield path, path
+    elif location.endswith('.jsonl'):
+        with io.open(location, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield _manifest_entry(json.loads(line))
+    elif location.endswith('.csv'):
+        with io.open(location, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                yield _manifest_entry(row)
+    elif glob.has_magic(location):
+        for path in sorted(glob.iglob(location, recursive=True)):
+            if os.path.isfile(path):
+                yield path, path
+    else:
+        yield location, location
+
+
+def _manifest_entry(entry):
+    if not isinstance(entry, dict):
+        return entry, entry
+    for name in MANIFEST_SOURCE_KEYS:
+        if entry.get(name):
+            source = entry[name]
+            break
+    else:
+        # CSV without a known column
+        source = next(iter(entry.values()))
+    return entry.get('key') or source, source
+
+
+def load_image_input(source):
+    """
+    Return the `ImageInput` of a path or URL, local files are read and sent as binary.
+    """
+    if is_url(source):
+        return ImageInput(source)
+    with open(source, 'rb') as f:
+        return ImageInput(f.read(), encoding='binary')
+
+
+###############################################################################
+
+# Set in each worker process by `_init_worker()`
+_worker = None
+
+
+def _init_worker(resource_type, resource_id, client_kwargs, inference_kwargs, max_in_flight, window_size, journal_path=None):
+    global _worker
+    # imported here as the client is only needed in the workers
+    from deepomatic.api.client import Client
+
+    client = Client(**client_kwargs)
+    inference_kwargs = dict(inference_kwargs)
+    if resource_type == 'spec':
+        resource = client.RecognitionSpec.retrieve(resource_id)
+    elif resource_type == 'version':
+        resource = client.RecognitionVersion.retrieve(resource_id)
+    elif resource_type == 'network':
+        resource = client.Network.retrieve(resource_id)
+        # results are written as JSON
+        inference_kwargs['convert_to_numpy'] = False
+    else:
+        raise DeepomaticException("Unknown resource type '{}', expected one of {}".format(resource_type, RESOURCE_TYPES))
+    journal = CheckpointJournal(journal_path) if journal_path is not None else None
+    _worker = (client, resource, inference_kwargs, max_in_flight, window_size, journal)
+
+
+def _error_record(key, source, error, task_id=None):
+    record = {'key': key, 'source': source, 'status': 'error',
+              'error': str(error), 'error_type': error.__class__.__name__}
+    if hasattr(error, 'get_task_id'):
+        # `TaskError` and `TaskTimeout`
+        task_id = error.get_task_id()
+    if task_id is not None:
+        record['task_id'] = task_id
+    return record
+
+
+def _send_input(source, task_id):
+    # run in the threads of `_infer_inputs()`: the inputs with a `task_id` were already sent
+    client, resource, inference_kwargs = _worker[:3]
+    if task_id is not None:
+        return client.Task.retrieve(task_id)
+    return resource.inference(inputs=[load_image_input(source)], return_task=True, wait_task=False, **inference_kwargs)
+
+
+def _infer_inputs(inputs):
+    """
+    Run the inferences of `inputs`, an iterable of tuples (seq, key, source, task_id), in the current process:
+    the inputs with a `task_id` were already sent, only their task is waited for.
+    Yield lists of tuples (seq, record) as the tasks complete, with one result record per input, errors included.
+
+    Up to `window_size` inputs are sent or waited for at once: the requests are sent by `max_in_flight` threads
+    and the tasks are waited for by the `TaskPoller` of the client. The next input is read as soon as one
+    completes, a slow task doesn't hold back the others.
+    """
+    client, resource, inference_kwargs, max_in_flight, window_size, journal = _worker
+    task_poller = TaskPoller.for_helper(client.http_helper)
+    inputs = iter(inputs)
+    # future => (seq, key, source, task_id), the futures of the inference requests then of their tasks
+    sending = {}
+    waiting = {}
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        while True:
+            while len(sending) + len(waiting) < window_size:
+                item = next(inputs, None)
+                if item is None:
+                    break
+                sending[executor.submit(_send_input, *item[2:])] = item
+            if not sending and not waiting:
+                return
+
+            completed, _ = wait(list(sending) + list(waiting), return_when=FIRST_COMPLETED)
+            submitted = []
+            records = []
+            for future in completed:
+                if future in sending:
+                    seq, key, source, task_id = sending.pop(future)
+                    try:
+                        task = future.result()
+                    except Exception as e:
+                        records.append((seq, _error_record(key, source, e, task_id)))
+                        continue
+                    if task_id is None:
+                        submitted.append((key, source, task.pk))
+                    waiting[task_poller.submit(task, timeout=WAIT_TIMEOUT)] = (seq, key, source, task.pk)
+                else:
+                    seq, key, source, task_id = waiting.pop(future)
+                    try:
+                        task = future.result()
+                    except Exception as e:
+                        # `TaskError`, `TaskTimeout` or the error of the status requests
+                        records.append((seq, _error_record(key, source, e, task_id)))
+                    else:
+                        records.append((seq, {'key': key, 'source': source, 'status': 'success',
+                                              'task_id': task.pk, 'data': task['data']}))
+            if journal is not None and submitted:
+                # before the results: an interrupted job waits for these tasks instead of sending the inputs again
+                journal.set_submitted(submitted)
+            if records:
+                yield records
+
+
+def _worker_main(init_args, input_queue, output_queue):
+    """
+    Main function of the worker processes: run the inferences of the inputs read from `input_queue` until `None`.
+    The messages put on `output_queue` are tuples (message, pid, value):
+        - ('taken', pid, seq) when an input is read
+        - ('done', pid, records) with a list of tuples (seq, record), see `_infer_inputs()`
+        - ('exit', pid, None) once all the inputs are complete
+    """
+    pid = os.getpid()
+    _init_worker(*init_args)
+
+    def taken():
+        for item in iter(input_queue.get, None):
+            output_queue.put(('taken', pid, item[0]))
+            yield item
+
+    for records in _infer_inputs(taken()):
+        output_queue.put(('done', pid, records))
+    output_queue.put(('exit', pid, None))
+
+
+def bulk_inference(inputs, resource_type, resource_id, processes=1, max_in_flight=16, window_size=None,
+                   client_kwargs=None, inference_kwargs=None, journal=None):
+    """
+    Run one inference per input and yield the result records as they arrive, in no particular order.
+    Each process keeps up to `window_size` inputs sent or waited for and reads the next input as soon as one completes.
+
+    :param inputs: iterable of tuples (key, source) with source an image path or URL, see `iter_inputs()`.
+    :type inputs: iterable
+    :param resource_type: 'spec', 'version' or 'network'.
+    :type resource_type: string
+    :param resource_id: id of the resource, a string for public specs and networks.
+    :type resource_id: int or string
+    :param processes (optional): number of worker processes, each one with its own client. If 1, the inferences
+        run in the current process. Defaults to 1.
+    :type processes: int
+    :param max_in_flight (optional): maximum number of concurrent inference requests per process. Defaults to 16.
+    :type max_in_flight: int
+    :param window_size (optional): maximum number of inputs sent or waited for at once per process.
+        Defaults to 4 times `max_in_flight`.
+    :type window_size: int
+    :param client_kwargs (optional): parameters of the `Client` of each process.
+    :type client_kwargs: dict
+    :param inference_kwargs (optional): parameters of the inference requests, e.g. `{'show_discarded': True}`.
+    :type inference_kwargs: dict
+    :param journal (optional): checkpoint journal of the job, to resume it after an interruption.
+        The successful inputs of the journal are skipped and the inputs sent but not complete are not sent again.
+    :type journal: checkpoint.CheckpointJournal
+
+    :return: a generator of dicts with the 'key' and 'source' of the input, its 'status' ('success' or 'error'),
+        the 'task_id' and either the inference 'data' or the 'error' message and 'error_type'.
+    :rtype: generator
+    """
+    window_size = window_size or 4 * max_in_flight
+    init_args = (resource_type, resource_id, client_kwargs or {}, inference_kwargs or {}, max_in_flight, window_size,
+                 journal.path if journal is not None else None)
+    if journal is not None:
+        inputs = journal.pending_inputs(inputs)
+    else:
+        inputs = ((key, source, None) for key, source in inputs)
+    items = ((seq, key, source, task_id) for seq, (key, source, task_id) in enumerate(inputs))
+
+    def done(records):
+        records = [record for _, record in records]
+        if journal is not None:
+            journal.set_done(records)
+        return records
+
+    if processes <= 1:
+        _init_worker(*init_args)
+        for records in _infer_inputs(items):
+            for record in done(records):
+                yield record
+        return
+
+    # the inputs are read as they are processed
+    input_queue = multiprocessing.Queue(maxsize=window_size)
+    output_queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_worker_main, args=(init_args, input_queue, output_queue))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    # seq => (key, source, task_id) of the inputs read and not complete
+    pending = {}
+    # pid => seqs of the inputs read by the worker and not complete
+    taken = {worker.pid: set() for worker in workers}
+    running = set(taken)
+    item = None
+    stopped = 0
+    try:
+        while running:
+            # one `None` per worker once all the inputs are queued
+            while stopped < processes:
+                if item is None:
+                    item = next(items, None)
+                    if item is not None:
+                        pending[item[0]] = item[1:]
+                try:
+                    input_queue.put_nowait(item)
+                except queue.Full:
+                    break
+                stopped += item is None
+                item = None
+
+            try:
+                message, pid, value = output_queue.get(timeout=0.1)
+            except queue.Empty:
+                for worker in workers:
+                    # a worker which exits normally sends 'exit' first
+                    if worker.pid in running and worker.exitcode:
+                        # e.g. killed: the other workers go on
+                        running.discard(worker.pid)
+                        logger.error("Worker process {} exited with code {}, {} inputs lost".format(
+                            worker.pid, worker.exitcode, len(taken[worker.pid])))
+                        error = DeepomaticException("Worker process exited with code {}".format(worker.exitcode))
+                        for record in done(_lost_records(taken.pop(worker.pid), pending, error, journal)):
+                            yield record
+                continue
+
+            if message == 'taken':
+                taken[pid].add(value)
+            elif message == 'done':
+                records = []
+                for seq, record in value:
+                    taken[pid].discard(seq)
+                    if pending.pop(seq, None) is not None:
+                        records.append((seq, record))
+                for record in done(records):
+                    yield record
+            else:
+                running.discard(pid)
+
+        if pending or stopped < processes:
+            # all the workers failed, e.g. at their initialization
+            error = DeepomaticException("All the worker processes exited")
+            for record in done(_lost_records(list(pending), pending, error, journal)):
+                yield record
+            raise error
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        # the inputs queued for workers which failed
+        input_queue.cancel_join_thread()
+
+
+def _lost_records(seqs, pending, error, journal):
+    # the records of the inputs of a failed worker process, with the id of their task if they were sent
+    records = []
+    for seq in seqs:
+        key, source, task_id = pending.pop(seq)
+        if task_id is None and journal is not None:
+            task_id = journal.lookup(key)[1]
+        records.append((seq, _error_record(key, source, error, task_id)))
+    return records
+
+
+###############################################################################
+
+def parse_inference_param(param):
+    """
+    Parse a 'name=value' command line inference parameter, the value is parsed as JSON if possible.
+    """
+    name, sep, value = param.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError("Expected name=value, got '{}'".format(param))
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return name, value
+
+
+def parse_resource_id(resource_id):
+    return int(resource_id) if resource_id.isdigit() else resource_id
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='deepomatic-infer',
+                                     description="Run inferences on images from directories, glob patterns, "
+                                                 "JSONL or CSV manifests, and write the results as JSONL.")
+    parser.add_argument('inputs', nargs='+',
+                        help="Directories, glob patterns, manifests (.jsonl or .csv), image paths or URLs.")
+    resource = parser.add_mutually_exclusive_group(required=True)
+    for resource_type in RESOURCE_TYPES:
+        resource.add_argument('--' + resource_type, type=parse_resource_id,
+                              help="Id of the {} used for the inferences.".format(resource_type))
+    parser.add_argument('-o', '--output', default='-', help="Output JSONL file. Defaults to the standard output.")
+    parser.add_argument('-p', '--processes', type=int, default=1, help="Number of worker processes. Defaults to 1.")
+    parser.add_argument('-n', '--in-flight', type=int, default=16,
+                        help="Maximum number of concurrent requests per process. Defaults to 16.")
+    parser.add_argument('--window-size', type=int,
+                        help="Maximum number of inputs sent or waited for at once per process. Defaults to 4 times --in-flight.")
+    parser.add_argument('--param', type=parse_inference_param, action='append', default=[],
+                        help="Inference parameter as name=value, e.g. show_discarded=true. Can be repeated.")
+    parser.add_argument('--journal',
+                        help="Checkpoint journal (SQLite file) to resume an interrupted job: successful inputs are "
+                             "skipped and sent inputs are not sent again. The results are appended to --output.")
+    parser.add_argument('--host', help="API root URL.")
+    parser.add_argument('--api-key', help="API key. Defaults to the DEEPOMATIC_API_KEY environment variable.")
+    return parser
+
+
+def main(args=None):
+    args = get_parser().parse_args(args)
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING'))
+
+    for resource_type in RESOURCE_TYPES:
+        resource_id = getattr(args, resource_type)
+        if resource_id is not None:
+            break
+
+    client_kwargs = {'user_agent_prefix': 'deepomatic-infer', 'pool_maxsize': max(args.in_flight, 10)}
+    if args.host is not None:
+        client_kwargs['host'] = args.host
+    if args.api_key is not None:
+        client_kwargs['api_key'] = args.api_key
+
+    journal = CheckpointJournal(args.journal) if args.journal is not None else None
+    inputs = (item for location in args.inputs for item in iter_inputs(location))
+    records = bulk_inference(inputs, resource_type, resource_id, processes=args.processes,
+                             max_in_flight=args.in_flight, window_size=args.window_size,
+                             client_kwargs=client_kwargs, inference_kwargs=dict(args.param), journal=journal)
+
+    # the results of the previous runs of a journaled job are kept
+    mode = 'a' if journal is not None else 'w'
+    output = sys.stdout if args.output == '-' else io.open(args.output, mode, encoding='utf-8')
+    start = time.time()
+    count = errors = 0
+    try:
+        for record in records:
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+            count += 1
+            errors += record['status'] != 'success'
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    duration = time.time() - start
+    sys.stderr.write("{} inputs processed in {:.1f}s ({} errors): {:.1f} inputs/s\n".format(
+        count, duration, errors, count / duration if duration > 0 else 0.))
+    if journal is not None:
+        sys.stderr.write("{} inputs skipped as already successful, {} resumed tasks\n".format(journal.skipped, journal.resumed))
+        journal.close()
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import json
+import sqlite3
+
+
+###############################################################################
+
+class CheckpointJournal(object):
+    """
+    Durable journal of a bulk inference job, stored in a SQLite database: for each input key, the id of its task
+    once the inference request is sent, then its result record once the task is complete.
+    A job restarted with the same journal skips the inputs already successful and waits for the tasks of the
+    inputs sent before the interruption instead of sending them again. Inputs in error are sent again, unless
+    their task may still be running (e.g. `TaskTimeout`): it is waited for again.
+
+    The journal can be used by several processes at once.
+
+    :param path: path of the SQLite database, created if needed.
+    :type path: string
+    """
+    SUBMITTED = 'submitted'
+    SUCCESS = 'success'
+    ERROR = 'error'
+
+    # errors of the inputs whose task is complete or unusable, the other errors with a task id are resumed
+    RESEND_ERROR_TYPES = ('TaskError', 'ClientError')
+
+    def __init__(self, path):
+        self.path = path
+        self.skipped = 0
+        self.resumed = 0
+        self._connection = sqlite3.connect(path, timeout=60)
+        with self._connection:
+            # readers and writers of other processes do not block each other
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS inputs ('
+                                     'key TEXT PRIMARY KEY, source TEXT, task_id INTEGER, status TEXT NOT NULL, record TEXT)')
+
+    def close(self):
+        self._connection.close()
+
+    def lookup(self, key):
+        """
+        Return a tuple (status, task_id) of the input `key`, (None, None) if it is unknown.
+        """
+        row = self._connection.execute('SELECT status, task_id FROM inputs WHERE key = ?', (key,)).fetchone()
+        return row if row is not None else (None, None)
+
+    def pending_inputs(self, inputs):
+        """
+        Filter the tuples (key, source) of `inputs` and yield a tuple (key, source, task_id) for each input
+        to process, with the id of its task if it was already sent, `None` otherwise.
+        """
+        for key, source in inputs:
+            row = self._connection.execute('SELECT status, task_id, record FROM inputs WHERE key = ?', (key,)).fetchone()
+            status, task_id, record = row if row is not None else (None, None, None)
+            if status == self.SUCCESS:
+                self.skipped += 1
+                continue
+            if status == self.ERROR and task_id is not None:
+                # e.g. `TaskTimeout`: the task may still be running
+                resume = json.loads(record).get('error_type') not in self.RESEND_ERROR_TYPES
+            else:
+                resume = status == self.SUBMITTED
+            if resume:
+                self.resumed += 1
+            else:
+                task_id = None
+            yield key, source, task_id
+
+    def set_submitted(self, entries):
+        """
+        Record the tuples (key, source, task_id) of inputs whose inference request was sent.
+        """
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO inputs (key, source, task_id, status) VALUES (?, ?, ?, ?)',
+                                         [(key, source, task_id, self.SUBMITTED) for key, source, task_id in entries])
+
+    def set_done(self, records):
+        """
+        Record the result records of `bulk.bulk_inference()`.
+        """
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO inputs (key, source, task_id, status, record) VALUES (?, ?, ?, ?, ?)',
+                                         [(record['key'], record['source'], record.get('task_id'), record['status'],
+                                           json.dumps(record)) for record in records])
+
+    def records(self, status=None):
+        """
+        Yield the result records of the complete inputs, only those with `status` if given.
+        """
+        query = 'SELECT record FROM inputs WHERE record IS NOT NULL'
+        params = ()
+        if status is not None:
+            query += ' AND status = ?'
+            params = (status,)
+        for row in self._connection.execute(query, params):
+            yield json.loads(row[0])
@@ -27,7 +27,7 @@ from deepomatic.api.resources.account import Account
 from deepomatic.api.resources.network import Network
 from deepomatic.api.resources.recognition import (RecognitionSpec,
                                                   RecognitionVersion)
-from deepomatic.api.resources.task import Task
+from deepomatic.api.resources.task import Task, TaskPoller
 
 
 class Client(object):
@@ -59,6 +59,22 @@ class Client(object):
            :param pool_maxsize (optional): Set `requests.adapters.HTTPAdapter.pool_maxsize` for concurrent calls.
                Defaults to 20.
            :type pool_maxsize: int
+           :param pool_connections (optional): Set `requests.adapters.HTTPAdapter.pool_connections`, the number of hosts
+               for which connections are cached. Defaults to 10.
+           :type pool_connections: int
+           :param pool_block (optional): Set `requests.adapters.HTTPAdapter.pool_block`. If True, requests wait for a free
+               connection when `pool_maxsize` connections are in use, instead of opening a connection that is discarded after use.
+               Defaults to False.
+           :type pool_block: bool
+           :param share_connections (optional): If True, the connection pools are shared with all other clients of the process
+               created with the same host, TLS verification and pool parameters (e.g. one client per API key).
+               Defaults to False.
+           :type share_connections: bool
+           :param json_codec (optional): JSON library used to serialize requests and parse responses.
+               Either 'auto' to use the fastest installed library among orjson, ujson and rapidjson,
+               one of those names, 'json', or a `json_codec.JSONCodec` instance.
+               Defaults to `None`: the standard library `json` module.
+           :type json_codec: string or json_codec.JSONCodec
            :param requests_timeout: timeout of each request.
                Defaults to `http_helper.RequestsTimeout.FAST`.
                More details in the `requests` documentation: https://2.python-requests.org/en/master/user/advanced/#timeouts
@@ -66,12 +82,50 @@ class Client(object):
            :param http_retry (optional): Customize the retry of http errors.
                Defaults to `HTTPRetry()`. See `http_retry.HTTPRetry` documentation for details about parameters and default values.
                If `None`, no retry will be done on errors.
+               Use `HTTPRetry(retry_budget=RetryBudget(), circuit_breaker=CircuitBreaker())` to cap the retries of all the
+               threads using the client and to fail fast when the API is down.
            :type http_retry: http_retry.HTTPRetry
+           :param task_poller (optional): If True, `Task.wait()` calls from all threads are merged by a background
+               `resources.task.TaskPoller` into a few batched task status requests per tick, available as `client.task_poller`.
+               Defaults to False.
+           :type task_poller: bool
+           :param concurrency_limiter (optional): If True, the number of requests in flight is adapted to the API backpressure
+               by a `concurrency.AIMDLimiter` growing up to `pool_maxsize`: it grows while latency is stable and is cut on
+               429/503 responses or timeouts. Requests above the limit wait. A limiter instance can also be given.
+               Its limit is exported by `client.metrics.to_prometheus()`. Defaults to `None`: no limit.
+           :type concurrency_limiter: bool or concurrency.AIMDLimiter
+           :param hedging (optional): If True, GET requests (e.g. task status, retrieve) slower than the 95th percentile
+               latency of their endpoint are duplicated and the first response is used, for at most 5% of the requests.
+               A `hedging.RequestHedging` instance can be given to customize it. Defaults to `None`: no hedging.
+           :type hedging: bool or hedging.RequestHedging
+           :param coalesce_gets (optional): If True, concurrent identical GET requests (same URL and query parameters),
+               e.g. many threads refreshing the same resource, share a single request and its response.
+               A GET sent while an identical one is in flight may get data read before a concurrent update.
+               Defaults to False.
+           :type coalesce_gets: bool
+           :param response_cache (optional): If True, GET responses of specs, versions, networks and accounts are cached in memory
+               and revalidated with conditional requests, versions are served without any request for an hour.
+               A `http_cache.ResponseCache` instance can be given to customize the TTLs and its size. Defaults to `None`: no cache.
+           :type response_cache: bool or http_cache.ResponseCache
+           :param inference_cache (optional): If True, the results of `inference()` calls waiting for their task are cached
+               in memory by a hash of the inputs (file contents included), the resource and the inference parameters:
+               inferences on the same inputs return the cached task without any request.
+               If a directory path, the results are also cached on disk, see `inference_cache.InferenceCache`.
+               Defaults to `None`: no cache.
+           :type inference_cache: bool, string or inference_cache.InferenceCache
+           :param metrics (optional): If True, latencies, retries and payload sizes of the requests are recorded per endpoint,
+               see `Client.stats()` and `client.metrics`. Defaults to True.
+           :type metrics: bool
 
            :return: :class:`Client` object
            :rtype: deepomatic.api.client.Client
         """
+        task_poller = kwargs.pop('task_poller', False)
         self.http_helper = HTTPHelper(*args, **kwargs)
+        if task_poller:
+            self.http_helper.task_poller = TaskPoller(self.http_helper)
+        self.task_poller = self.http_helper.task_poller
+        self.metrics = self.http_helper.metrics
 
         # /accounts
 
@@ -90,3 +144,31 @@ class Client(object):
         self.RecognitionSpec = RecognitionSpec(self.http_helper)
 
         self.RecognitionVersion = RecognitionVersion(self.http_helper)
+
+    def warmup(self, n=None):
+        """
+        Open `n` keep-alive connections to the API ahead of time, to avoid paying the TCP and TLS handshakes
+        on the first burst of requests.
+
+        :param n (optional): number of connections to open. Defaults to and is capped by `pool_maxsize`.
+        :type n: int
+
+        :return: the number of connections opened.
+        :rtype: int
+        """
+        return self.http_helper.warmup(n)
+
+    def stats(self, reset=False):
+        """
+        Return the metrics recorded for each endpoint: number of requests, status codes, errors, retries by cause,
+        bytes sent and received, and histograms of latency, serialization, network, retry wait and deserialization
+        durations (in seconds) and of payload sizes (in bytes).
+        Use `client.metrics.to_prometheus()` to export them in the Prometheus text format.
+
+        :param reset (optional): If True, the metrics are cleared after being read. Defaults to False.
+        :type reset: bool
+
+        :return: a dict mapping 'METHOD endpoint' (e.g. 'GET /tasks/{id}/') to the endpoint metrics.
+        :rtype: dict
+        """
+        return self.metrics.snapshot(reset=reset)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import threading
+
+from requests.exceptions import Timeout
+
+
+###############################################################################
+
+class AIMDLimiter(object):
+    """
+    Adaptive limit of the number of requests in flight (Additive Increase, Multiplicative Decrease),
+    so that bulk jobs run at the highest rate the API sustains without tuning `pool_maxsize` by hand:
+        - while latency stays within `latency_tolerance` times the baseline (the smallest recent latency),
+          the limit grows by 1 every `limit` successful requests (about once per round trip)
+        - on backpressure (status codes 429 or 503, or a timeout), the limit is multiplied by `backoff_ratio`,
+          at most once per round trip: the requests sent before the decrease do not decrease it again
+
+    Requests above the limit wait for a free slot in `acquire()`.
+
+    :param initial_limit (optional): limit before any feedback. Defaults to 10.
+    :type initial_limit: int
+    :param min_limit (optional): Defaults to 1.
+    :type min_limit: int
+    :param max_limit (optional): Defaults to 200.
+    :type max_limit: int
+    :param backoff_ratio (optional): Defaults to 0.5.
+    :type backoff_ratio: float
+    :param latency_tolerance (optional): latency increase over the baseline above which the limit stops growing.
+        Defaults to 2.
+    :type latency_tolerance: float
+    """
+    CONGESTION_STATUS_CODES = (429, 503)
+    CONGESTION_EXCEPTION_TYPES = (Timeout, )
+
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=200, backoff_ratio=0.5, latency_tolerance=2.):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._baseline_latency = None
+        # incremented on each decrease, to decrease only once for the requests in flight at that time
+        self._epoch = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """
+        Wait for a free slot. Returns a token to give back to `release()`.
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+            return self._epoch
+
+    def release(self, token, latency, response=None, exception=None):
+        """
+        Free the slot taken by `acquire()` and adapt the limit from the outcome of the request.
+
+        :param token: returned by `acquire()`.
+        :param latency: duration of the request in seconds.
+        :param response (optional): the response, if any.
+        :param exception (optional): the exception raised by the request, if any.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if self.is_congestion(response, exception):
+                if token == self._epoch:
+                    self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+                    self._epoch += 1
+            elif exception is None:
+                if self._baseline_latency is None or latency < self._baseline_latency:
+                    self._baseline_latency = latency
+                else:
+                    # the baseline slowly follows latency increases, to adapt to a server or payloads change
+                    self._baseline_latency += (latency - self._baseline_latency) * 0.01
+                if latency <= self._baseline_latency * self.latency_tolerance:
+                    self._limit = min(self.max_limit, self._limit + 1. / self._limit)
+            self._condition.notify_all()
+
+    def is_congestion(self, response=None, exception=None):
+        if exception is not None:
+            return isinstance(exception, self.CONGESTION_EXCEPTION_TYPES)
+        return response is not None and response.status_code in self.CONGESTION_STATUS_CODES
+
+    def __repr__(self):
+        return '<{} limit={} in_flight={}>'.format(self.__class__.__name__, self.limit, self.in_flight)
+
+
+def get_concurrency_limiter(concurrency_limiter=None, max_limit=200):
+    """
+    Return a limiter from `concurrency_limiter` which is either:
+        - `None` or `False`: no limiter
+        - `True`: an `AIMDLimiter` growing up to `max_limit`
+        - a limiter instance, returned as is
+    """
+    if concurrency_limiter is None or concurrency_limiter is False:
+        return None
+    if concurrency_limiter is True:
+        return AIMDLimiter(initial_limit=min(10, max_limit), max_limit=max_limit)
+    return concurrency_limiter
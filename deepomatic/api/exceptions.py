@@ -83,6 +83,21 @@ class ServerError(BadStatus):
     pass
 
 
+class CircuitOpenError(DeepomaticException):
+    """
+    Thrown when a request is not sent because the `http_retry.CircuitBreaker` is open.
+    """
+    pass
+
+
+class SpoolFullError(DeepomaticException):
+    """
+    Thrown when a request can not be written to a `spool.InferenceSpool` which reached its maximum size.
+    """
+    def __init__(self, size, max_size):
+        super(SpoolFullError, self).__init__("Spool full: {} bytes used out of {}".format(size, max_size))
+
+
 class TaskError(DeepomaticException):
     def __init__(self, task):
         self.task = task
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from deepomatic.api.http_retry import RetryBudget
+
+
+###############################################################################
+
+class RequestHedging(object):
+    """
+    Hedge idempotent requests to cut tail latency: if a request has not answered after the `percentile` latency
+    of its endpoint, a duplicate is sent and the first one to answer is used, the other one is ignored.
+    Each hedged call runs the whole request (with its retries) in a thread of the hedging executor.
+
+    The number of duplicates is capped to a fraction `max_ratio` of the requests by a token bucket.
+
+    :param percentile (optional): latency quantile of the endpoint after which a duplicate is sent. Defaults to 0.95.
+    :type percentile: float
+    :param initial_delay (optional): delay used until `min_samples` requests of the endpoint have been measured.
+        Defaults to 0.5 seconds.
+    :type initial_delay: float
+    :param min_delay (optional): minimum delay before sending a duplicate. Defaults to 0.01 seconds.
+    :type min_delay: float
+    :param min_samples (optional): Defaults to 20.
+    :type min_samples: int
+    :param max_ratio (optional): maximum fraction of requests that are duplicated. Defaults to 0.05.
+    :type max_ratio: float
+    :param max_workers (optional): number of threads sending the hedged requests, it should be higher than
+        the number of threads using the client, otherwise requests wait for a free thread. Defaults to 64.
+    :type max_workers: int
+    """
+    def __init__(self, percentile=0.95, initial_delay=0.5, min_delay=0.01, min_samples=20,
+                 max_ratio=0.05, max_workers=64):
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.budget = RetryBudget(ratio=max_ratio, min_retries_per_second=0., max_tokens=10.)
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get_delay(self, metrics, method, resource, resource_prefix=''):
+        delay = metrics.quantile(method, resource, self.percentile, resource_prefix=resource_prefix,
+                                 min_count=self.min_samples)
+        if delay is None:
+            delay = self.initial_delay
+        return max(self.min_delay, delay)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def shutdown(self, wait=True):
+        """
+        Stop the threads of the hedging executor, waiting for the requests still running if `wait` is True.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def call(self, functor, delay):
+        """
+        Call `functor`, and call it again if it didn't return after `delay` seconds and the hedge budget allows it.
+        Returns the result (or raises the exception) of the first call to finish.
+        """
+        self.budget.deposit()
+        executor = self._get_executor()
+        primary = executor.submit(functor)
+        done, not_done = wait([primary], timeout=delay)
+        if done or not self.budget.withdraw():
+            return primary.result()
+
+        hedge = executor.submit(functor)
+        with self._lock:
+            self.hedges_sent += 1
+        done, not_done = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        if primary in done:
+            return primary.result()
+        with self._lock:
+            self.hedges_won += 1
+        return hedge.result()
+
+
+def get_request_hedging(hedging=None, max_workers=64):
+    """
+    Return a `RequestHedging` from `hedging` which is either:
+        - `None` or `False`: no hedging
+        - `True`: a `RequestHedging` with default parameters and `max_workers` threads
+        - a `RequestHedging` instance, returned as is
+    """
+    if hedging is None or hedging is False:
+        return None
+    if hedging is True:
+        return RequestHedging(max_workers=max_workers)
+    return hedging
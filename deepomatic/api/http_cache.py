@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from six.moves.urllib.parse import urlencode
+
+
+###############################################################################
+
+class CacheEntry(object):
+    """
+    A cached GET response: its raw body, its content type and its validators (`ETag` and `Last-Modified`).
+    """
+    __slots__ = ('content', 'content_type', 'etag', 'last_modified', 'validated_at')
+
+    def __init__(self, content, content_type, etag=None, last_modified=None):
+        self.content = content
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.validated_at = time.time()
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def is_fresh(self, ttl):
+        return time.time() - self.validated_at < ttl
+
+    def validators(self):
+        """
+        Return the headers making the request conditional: the API answers 304 if the resource did not change.
+        """
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+###############################################################################
+
+class ResponseCache(object):
+    """
+    LRU cache of the GET responses of resources (specs, versions, networks, accounts), bounded by the size of
+    the cached bodies.
+    A response is served from the cache without any request during the TTL of its resource class
+    (`Resource.cache_ttl`, e.g. one hour for the immutable `RecognitionVersion`). After that, or if the TTL is 0,
+    the request is sent with `If-None-Match` / `If-Modified-Since` headers and a 304 response reuses the cached body.
+    Updating, deleting or creating a resource with the client invalidates the affected entries.
+
+    :param max_size (optional): maximum total size in bytes of the cached bodies. Defaults to 32MB.
+    :type max_size: int
+    :param ttls (optional): TTL in seconds per resource class name, overriding `Resource.cache_ttl`,
+        e.g. `{'RecognitionSpec': 60}`. A TTL of `None` disables the cache for this resource class.
+    :type ttls: dict
+    """
+    def __init__(self, max_size=32 * 1024 * 1024, ttls=None):
+        self.max_size = max_size
+        self.ttls = dict(ttls or {})
+        self.size = 0
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_ttl(self, resource_class):
+        """
+        Return the TTL of `resource_class`, `None` if its responses must not be cached.
+        """
+        return self.ttls.get(resource_class.__name__, resource_class.cache_ttl)
+
+    @staticmethod
+    def get_key(url, params=None):
+        if not params:
+            return url
+        return url + '?' + urlencode(sorted(params.items()), doseq=True)
+
+    def get(self, key, ttl):
+        """
+        Return a tuple (entry, fresh): the cached entry of `key` or `None`, and whether it can be used
+        without revalidation given the `ttl` of its resource.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None, False
+            # most recently used last
+            self._entries[key] = entry
+        fresh = entry.is_fresh(ttl)
+        if fresh:
+            self.hits += 1
+        return entry, fresh
+
+    def revalidated(self, entry):
+        """
+        Mark `entry` as fresh after a 304 response.
+        """
+        entry.validated_at = time.time()
+        self.revalidations += 1
+
+    def set(self, key, response):
+        """
+        Cache the body of a successful `requests.Response`.
+        """
+        self.misses += 1
+        headers = response.headers
+        entry = CacheEntry(response.content, headers.get('Content-Type', ''),
+                           etag=headers.get('ETag'), last_modified=headers.get('Last-Modified'))
+        with self._lock:
+            self._remove(key)
+            if entry.size > self.max_size:
+                return
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+    def invalidate(self, url, collection=False):
+        """
+        Remove the entries affected by a change of the resource at `url`: the resource, its sub-resources
+        (e.g. the versions of a spec) and the lists of its collection.
+        If `collection` is True, `url` is a collection in which a resource was created: only its lists are removed.
+        """
+        if collection:
+            prefixes = ()
+            lists = url
+        else:
+            prefixes = (url,)
+            lists = url.rstrip('/').rsplit('/', 1)[0] + '/'
+        with self._lock:
+            for key in list(self._entries):
+                if key.startswith(prefixes) or key == lists or key.startswith(lists + '?'):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+
+def get_response_cache(response_cache=None):
+    """
+    Return a `ResponseCache` from `response_cache` which is either:
+        - `None` or `False`: no cache
+        - `True`: a `ResponseCache` with default parameters
+        - a `ResponseCache` instance, returned as is
+    """
+    if response_cache is None or response_cache is False:
+        return None
+    if response_cache is True:
+        return ResponseCache()
+    return response_cache
@@ -22,24 +22,38 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import copy
 import functools
-import json
+import logging
 import os
-import platform
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from deepomatic.api.concurrency import get_concurrency_limiter
 from deepomatic.api.exceptions import (BadStatus, ServerError,
                                        ClientError, DeepomaticException,
                                        CredentialsNotFound)
+from deepomatic.api.hedging import get_request_hedging
+from deepomatic.api.http_cache import get_response_cache
 from deepomatic.api.http_retry import HTTPRetry
+from deepomatic.api.inference_cache import get_inference_cache
+from deepomatic.api.json_codec import get_json_codec
+from deepomatic.api.metrics import ClientMetrics, NULL_REQUEST_METRICS
+from deepomatic.api.multipart import MultipartEncoder
+from deepomatic.api.single_flight import SingleFlight
 from deepomatic.api.version import __title__, __version__
 from requests.structures import CaseInsensitiveDict
 from six import string_types
+from urllib3.exceptions import EmptyPoolError
 
 API_HOST = 'https://api.deepomatic.com'
 API_VERSION = 0.7
 
+logger = logging.getLogger(__name__)
+
 ###############################################################################
 
 
@@ -49,11 +63,47 @@ class RequestsTimeout(object):
     SLOW = 600.
 
 
+# Adapters shared between clients created with `share_connections=True`, see `HTTPHelper.get_adapter()`
+_shared_adapters = {}
+_shared_adapters_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def get_default_user_agent():
+    """
+    Return the User-Agent without prefix, computed once per process as `platform.platform()` is slow.
+    """
+    import platform
+
+    python_version = "{0}.{1}.{2}".format(sys.version_info.major,
+                                          sys.version_info.minor,
+                                          sys.version_info.micro)
+
+    user_agent_params = {
+        'package_title': __title__,
+        'package_version': __version__,
+        'requests_version': requests.__version__,
+        'python_version': python_version,
+        'platform': platform.platform()
+    }
+
+    user_agent_list = [
+        '{package_title}-python-client/{package_version}',
+        'requests/{requests_version}',
+        'python/{python_version} platform/{platform}',
+    ]
+    return ' '.join(user_agent_list).format(**user_agent_params)
+
+
 class HTTPHelper(object):
     def __init__(self, app_id=None, api_key=None, verify_ssl=None,
                  host=None, version=API_VERSION, check_query_parameters=True,
                  user_agent_prefix='', pool_maxsize=20,
-                 requests_timeout=RequestsTimeout.FAST, **kwargs):
+                 requests_timeout=RequestsTimeout.FAST,
+                 pool_connections=requests.adapters.DEFAULT_POOLSIZE,
+                 pool_block=False, share_connections=False, json_codec=None, metrics=True,
+                 concurrency_limiter=None, hedging=None, coalesce_gets=False, response_cache=None,
+                 inference_cache=None, **kwargs):
         """
         Init the HTTP helper with API key and secret.
         Check out the `client.Client` documentation for more details about the parameters.
@@ -67,6 +117,11 @@ class HTTPHelper(object):
             raise TypeError("Too many parameters. HTTPHelper does not handle kwargs: {}".format(kwargs))
 
         self.requests_timeout = requests_timeout
+        self.pool_maxsize = pool_maxsize
+        self.pool_connections = pool_connections
+        self.pool_block = pool_block
+        self.share_connections = share_connections
+        self.json_codec = get_json_codec(json_codec)
 
         self._setup_host(host, verify_ssl)
 
@@ -79,13 +134,136 @@ class HTTPHelper(object):
         # This is only used in mixins, this should not stay here
         self.check_query_parameters = check_query_parameters
 
+        # Set by the client, used by `Task.wait()`
+        self.task_poller = None
+
+        # resource uri => input size of its network, see `InferenceResource._get_input_size()`
+        self._input_sizes = {}
+
+        self.metrics = ClientMetrics(enabled=metrics)
+
+        self.concurrency_limiter = get_concurrency_limiter(concurrency_limiter, max_limit=pool_maxsize)
+        if self.concurrency_limiter is not None:
+            limiter = self.concurrency_limiter
+            self.metrics.add_gauge('concurrency_limit', 'Current limit of requests in flight.', lambda: limiter.limit)
+            self.metrics.add_gauge('in_flight_requests', 'Number of requests in flight.', lambda: limiter.in_flight)
+
+        self.hedging = get_request_hedging(hedging, max_workers=max(64, 2 * pool_maxsize))
+        if self.hedging is not None:
+            hedging = self.hedging
+            self.metrics.add_gauge('hedged_requests_total', 'Number of duplicated GET requests.',
+                                   lambda: hedging.hedges_sent, metric_type='counter')
+            self.metrics.add_gauge('hedged_requests_won_total', 'Number of duplicated GET requests answering first.',
+                                   lambda: hedging.hedges_won, metric_type='counter')
+
+        self.single_flight = SingleFlight() if coalesce_gets else None
+        if self.single_flight is not None:
+            single_flight = self.single_flight
+            self.metrics.add_gauge('coalesced_requests_total', 'Number of GET requests which waited for an identical one.',
+                                   lambda: single_flight.coalesced, metric_type='counter')
+
+        self.response_cache = get_response_cache(response_cache)
+        if self.response_cache is not None:
+            cache = self.response_cache
+            self.metrics.add_gauge('response_cache_hits_total', 'Number of GET requests served from the cache.',
+                                   lambda: cache.hits, metric_type='counter')
+            self.metrics.add_gauge('response_cache_revalidations_total', 'Number of cached responses revalidated by a 304.',
+                                   lambda: cache.revalidations, metric_type='counter')
+            self.metrics.add_gauge('response_cache_size_bytes', 'Size of the cached responses.', lambda: cache.size)
+
+        self.inference_cache = get_inference_cache(inference_cache)
+        if self.inference_cache is not None:
+            inference_cache = self.inference_cache
+            self.metrics.add_gauge('inference_cache_hits_total', 'Number of inferences served from the cache.',
+                                   lambda: inference_cache.hits, metric_type='counter')
+            self.metrics.add_gauge('inference_cache_misses_total', 'Number of inferences not found in the cache.',
+                                   lambda: inference_cache.misses, metric_type='counter')
+
+        self._setup_session()
+
+    def _setup_session(self):
         self.session = requests.Session()
         self.session.headers.update(self.default_headers())
-        # Use pool_maxsize to cache connections for the same host
-        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+        adapter = self.get_adapter()
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
 
+    def get_adapter(self):
+        """
+        Return the `requests.adapters.HTTPAdapter` holding the connection pools.
+        With `share_connections=True`, the adapter is shared by all the clients of the process
+        with the same host, TLS verification and pool settings, so that they reuse the same connections.
+        """
+        if not self.share_connections:
+            return self._build_adapter()
+
+        key = (self.host, self.verify_ssl, self.pool_connections, self.pool_maxsize, self.pool_block)
+        with _shared_adapters_lock:
+            adapter = _shared_adapters.get(key)
+            if adapter is None:
+                adapter = _shared_adapters[key] = self._build_adapter()
+        return adapter
+
+    def _build_adapter(self):
+        # Use pool_maxsize to cache connections for the same host
+        # With pool_block, requests wait for a free connection instead of opening (and dropping) extra ones
+        return requests.adapters.HTTPAdapter(pool_connections=self.pool_connections,
+                                             pool_maxsize=self.pool_maxsize,
+                                             pool_block=self.pool_block)
+
+    def warmup(self, n=None):
+        """
+        Open `n` keep-alive connections to the API host ahead of time, so that the first requests
+        don't pay for the TCP and TLS handshakes. `n` defaults to and is capped by `pool_maxsize`,
+        and with `pool_block` by the number of connections not in use.
+        Returns the number of connections opened.
+        """
+        n = self.pool_maxsize if n is None else min(n, self.pool_maxsize)
+        if n <= 0:
+            return 0
+
+        pool = self._get_pool()
+
+        def connect(conn):
+            try:
+                conn.connect()
+                return True
+            except Exception as e:
+                logger.warning("Failed to open a connection to {}: {}".format(self.host, e))
+                return False
+
+        # take the connections out of the pool at the same time to get `n` distinct ones.
+        # `_get_conn` and `_put_conn` are private APIs of urllib3, unchanged from 1.21 (requests 2.19) to 2.x
+        connections = []
+        try:
+            for _ in range(n):
+                try:
+                    # with `pool_block`, the connections used by other threads are not waited for
+                    connections.append(pool._get_conn(timeout=0))
+                except EmptyPoolError:
+                    break
+            to_connect = [conn for conn in connections if getattr(conn, 'sock', None) is None]
+            opened = len(connections) - len(to_connect)
+            if to_connect:
+                with ThreadPoolExecutor(max_workers=len(to_connect)) as executor:
+                    opened += sum(executor.map(connect, to_connect))
+        finally:
+            for conn in connections:
+                pool._put_conn(conn)
+        return opened
+
+    def _get_pool(self):
+        # the urllib3 pool the requests use: same environment settings (CA bundle, proxies) as `Session.request`
+        request = requests.Request('GET', self.resource_prefix).prepare()
+        settings = self.session.merge_environment_settings(request.url, {}, False, self.verify_ssl, None)
+        adapter = self.session.get_adapter(request.url)
+        if hasattr(adapter, 'get_connection_with_tls_context'):
+            return adapter.get_connection_with_tls_context(request, settings['verify'], proxies=settings['proxies'])
+        # requests < 2.32
+        pool = adapter.get_connection(request.url, proxies=settings['proxies'])
+        adapter.cert_verify(pool, request.url, settings['verify'], None)
+        return pool
+
     def _setup_host(self, host, verify_ssl):
         if host is None:
             host = os.getenv('DEEPOMATIC_API_URL', API_HOST)
@@ -120,29 +298,10 @@ class HTTPHelper(object):
         self.app_id = str(app_id) if app_id else None
 
     def _get_user_agent(self, user_agent_prefix):
-        python_version = "{0}.{1}.{2}".format(sys.version_info.major,
-                                              sys.version_info.minor,
-                                              sys.version_info.micro)
-
-        user_agent_params = {
-            'package_title': __title__,
-            'package_version': __version__,
-            'requests_version': requests.__version__,
-            'python_version': python_version,
-            'platform': platform.platform()
-        }
-
-        user_agent_list = []
-
+        user_agent = get_default_user_agent()
         if user_agent_prefix:
-            user_agent_list.append(user_agent_prefix)
-
-        user_agent_list += [
-            '{package_title}-python-client/{package_version}',
-            'requests/{requests_version}',
-            'python/{python_version} platform/{platform}',
-        ]
-        return ' '.join(user_agent_list).format(**user_agent_params)
+            return user_agent_prefix + ' ' + user_agent
+        return user_agent
 
     def default_headers(self):
         """
@@ -178,7 +337,8 @@ class HTTPHelper(object):
                 if isinstance(value, bool):
                     data[key] = int(value)
                 elif isinstance(value, dict):
-                    data[key] = json.dumps(value)
+                    value = self.json_codec.dumps(value)
+                    data[key] = value.decode('utf-8') if isinstance(value, bytes) else value
         return data
 
     def dump_json_for_multipart(self, data_dict):
@@ -208,11 +368,7 @@ class HTTPHelper(object):
 
         return new_dict
 
-    def send_request(self, requests_callable, *args, **kwargs):
-        # this is the timeout of requests module
-        requests_timeout = kwargs.pop('timeout', self.requests_timeout)
-
-        files = kwargs.pop('files', None)
+    def rewind_files(self, files):
         if files:
             for key, f in files.items():
                 # file can be a tuple
@@ -231,10 +387,36 @@ class HTTPHelper(object):
 
                 raise DeepomaticException("{}: not a scalar or seekable.".format(error))
 
-        return requests_callable(*args, files=files,
-                                 timeout=requests_timeout,
-                                 verify=self.verify_ssl,
-                                 **kwargs)
+    def send_request(self, requests_callable, *args, **kwargs):
+        # this is the timeout of requests module
+        requests_timeout = kwargs.pop('timeout', self.requests_timeout)
+        request_metrics = kwargs.pop('request_metrics', NULL_REQUEST_METRICS)
+
+        files = kwargs.pop('files', None)
+        self.rewind_files(files)
+        # a streamed multipart body must be sent again from its start on retry
+        data = kwargs.get('data')
+        if isinstance(data, MultipartEncoder):
+            data.rewind()
+
+        # each attempt takes a slot of the concurrency limiter, and its outcome adapts the limit
+        limiter = self.concurrency_limiter
+        limiter_token = limiter.acquire() if limiter is not None else None
+        start_time = time.perf_counter()
+        try:
+            response = requests_callable(*args, files=files,
+                                         timeout=requests_timeout,
+                                         verify=self.verify_ssl,
+                                         **kwargs)
+        except BaseException as e:
+            request_metrics.add_attempt(start_time, exception=e)
+            if limiter is not None:
+                limiter.release(limiter_token, time.perf_counter() - start_time, exception=e)
+            raise
+        request_metrics.add_attempt(start_time, response=response)
+        if limiter is not None:
+            limiter.release(limiter_token, time.perf_counter() - start_time, response=response)
+        return response
 
     def maybe_retry_send_request(self, requests_callable, *args, **kwargs):
         # requests_callable must be a method from the requests module
@@ -250,29 +432,34 @@ class HTTPHelper(object):
 
         return functor()
 
-    def make_request(self, func, resource, params=None, data=None,
-                     content_type='application/json', files=None,
-                     stream=False, *args, **kwargs):
-
+    def prepare_content(self, data=None, content_type='application/json', files=None):
+        """
+        Serialize `data` and `files` for the given `content_type`.
+        Returns a tuple (content_type, data, files), `content_type` is `None` for multipart
+        as the boundaries are computed when the body is built.
+        """
         if content_type is not None:
             if content_type.strip() == 'application/json':
                 if data is not None:
-                    data = json.dumps(data)
+                    data = self.json_codec.dumps(data)
             elif content_type.strip() == 'multipart/mixed':
                 # If no files are provided, requests will default to form-urlencoded content type
                 # But the API doesn't support it.
                 if not files:
                     raise DeepomaticException("Cannot send the request as multipart without files provided.")
-                # requests will build the good multipart content types with the boundaries
+                # the multipart content type with the boundary is set when the body is built
                 content_type = None
                 data = self.dump_json_for_multipart(data)
                 files = self.dump_json_for_multipart(files)
             else:
                 raise DeepomaticException("Unsupported Content-Type")
+        return content_type, data, files
 
-        headers = self.setup_headers(content_type=content_type)
-        params = self.format_params(params)
-
+    def open_files(self, files):
+        """
+        Open file paths and wrap scalar values of the `files` dict.
+        Returns a tuple (files, opened_files), the caller is responsible for closing `opened_files`.
+        """
         opened_files = []
         if files is not None:
             new_files = {}
@@ -296,23 +483,10 @@ class HTTPHelper(object):
                     new_files[key] = (None, file, 'application/json')
 
             files = new_files
+        return files, opened_files
 
-        if not resource.startswith('http'):
-            resource = self.resource_prefix + resource
-
-        response = self.maybe_retry_send_request(func, resource, *args,
-                                                 params=params, data=data,
-                                                 files=files, headers=headers,
-                                                 stream=stream, **kwargs)
-
-        # Close opened files
-        for file in opened_files:
-            file.close()
-
+    def raise_for_status(self, response):
         status_code = response.status_code
-        if status_code == 204:  # delete
-            return None
-
         if status_code < 200 or status_code >= 300:
             if status_code >= 400 and status_code < 500:
                 raise ClientError(response)
@@ -321,20 +495,110 @@ class HTTPHelper(object):
             else:
                 raise BadStatus(response)
 
-        if stream:
-            # we asked for a stream, we let the user download it as he wants or it will load everything in RAM
-            # not good for big files
-            return response
-        elif 'application/json' in response.headers.get('Content-Type', ''):
-            return response.json()
+    def make_request(self, func, resource, params=None, data=None,
+                     content_type='application/json', files=None,
+                     stream=False, *args, **kwargs):
+
+        # requests_callable are the methods of `requests.Session`, their name is the HTTP method
+        with self.metrics.request(func.__name__, resource, self.resource_prefix) as request_metrics:
+            content_type, data, files = self.prepare_content(data, content_type, files)
+
+            headers = self.setup_headers(content_type=content_type)
+            params = self.format_params(params)
+
+            if not resource.startswith('http'):
+                resource = self.resource_prefix + resource
+
+            # `cache_ttl` is set by the resources which can be cached, see `http_cache.ResponseCache`
+            cache_ttl = kwargs.pop('cache_ttl', None)
+            cache_key = cache_entry = None
+            if cache_ttl is not None and self.response_cache is not None and func.__name__ == 'get' and not stream:
+                cache_key = self.response_cache.get_key(resource, params)
+                cache_entry, fresh = self.response_cache.get(cache_key, cache_ttl)
+                if fresh:
+                    return self.parse_content(cache_entry.content_type, cache_entry.content)
+                if cache_entry is not None:
+                    headers.update(cache_entry.validators())
+
+            files, opened_files = self.open_files(files)
+
+            try:
+                if files:
+                    # stream the multipart body instead of letting requests build it in memory
+                    data = MultipartEncoder(data, files)
+                    headers['Content-Type'] = data.content_type
+                    files = None
+                request_metrics.serialized(data)
+
+                response = self.maybe_retry_send_request(func, resource, *args,
+                                                         params=params, data=data,
+                                                         files=files, headers=headers,
+                                                         stream=stream, request_metrics=request_metrics,
+                                                         **kwargs)
+            finally:
+                # Close opened files
+                for file in opened_files:
+                    file.close()
+            request_metrics.received(response, stream=stream)
+
+            if response.status_code == 204:  # delete
+                return None
+
+            if response.status_code == 304 and cache_entry is not None:
+                self.response_cache.revalidated(cache_entry)
+                return self.parse_content(cache_entry.content_type, cache_entry.content)
+
+            self.raise_for_status(response)
+
+            if stream:
+                # we asked for a stream, we let the user download it as he wants or it will load everything in RAM
+                # not good for big files
+                return response
+
+            if cache_key is not None:
+                self.response_cache.set(cache_key, response)
+            return self.parse_content(response.headers.get('Content-Type', ''), response.content)
+
+    def parse_content(self, content_type, content):
+        if 'application/json' in content_type:
+            return self.json_codec.loads(content)
         else:
-            return response.content
+            return content
+
+    def invalidate_cache(self, resource, collection=False):
+        """
+        Remove the cached responses affected by a change of `resource`, see `http_cache.ResponseCache.invalidate`.
+        """
+        if self.response_cache is None:
+            return
+        if not resource.startswith('http'):
+            resource = self.resource_prefix + resource
+        self.response_cache.invalidate(resource, collection=collection)
 
     def get(self, resource, *args, **kwargs):
         """
         Perform a GET request
+        With `coalesce_gets`, concurrent identical GET requests share a single request, see `single_flight.SingleFlight`.
+        With `hedging`, a duplicate request is sent when it is slower than usual, see `hedging.RequestHedging`.
+        With `response_cache`, resources are served from or revalidated with the cache, see `http_cache.ResponseCache`.
         """
-        return self.make_request(self.session.get, resource, *args, **kwargs)
+        # only the simple calls are coalesced: resource and query parameters, no stream or custom options
+        if self.single_flight is None or args or set(kwargs) - {'params', 'cache_ttl'}:
+            return self._get(resource, *args, **kwargs)
+
+        params = kwargs.get('params') or {}
+        key = (resource, tuple(sorted((name, repr(value)) for name, value in params.items())))
+        result, shared = self.single_flight.do(key, functools.partial(self._get, resource, **kwargs))
+        # the parsed JSON is mutable: each caller gets its own copy when several callers share it
+        return copy.deepcopy(result) if shared else result
+
+    def _get(self, resource, *args, **kwargs):
+        if self.hedging is None or kwargs.get('stream'):
+            return self.make_request(self.session.get, resource, *args, **kwargs)
+
+        functor = functools.partial(self.make_request, self.session.get, resource, *args, **kwargs)
+        delay = self.hedging.get_delay(self.metrics, 'GET', resource, self.resource_prefix)
+        return self.hedging.call(functor, delay)
 
     def delete(self, resource, *args, **kwargs):
         """
@@ -1,9 +1,15 @@
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
 from deepomatic.api import utils
-from deepomatic.api.exceptions import HTTPRetryError
+from deepomatic.api.exceptions import CircuitOpenError, HTTPRetryError
 from requests.exceptions import (ProxyError, RequestException,
                                  TooManyRedirects, URLRequired)
 from tenacity import (retry_if_exception, retry_if_result, stop_after_delay,
                       wait_chain, wait_fixed, wait_random_exponential)
+from tenacity.stop import stop_any, stop_base
+from tenacity.wait import wait_base
 
 
 class retry_if_exception_type(retry_if_exception):
@@ -20,6 +26,201 @@ class retry_if_exception_type(retry_if_exception):
         super(retry_if_exception_type, self).__init__(self.__predicate)
 
 
+def parse_retry_after(value):
+    """
+    Return the delay in seconds of a `Retry-After` header value, either a number of seconds or an HTTP date.
+    Returns `None` if the value is missing or invalid.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0., mktime_tz(date) - time.time())
+
+
+def get_max_delay(stop):
+    # the smallest `stop_after_delay` in `stop`, None if it doesn't stop after a delay
+    delays = []
+    if hasattr(stop, 'max_delay'):
+        delays.append(stop.max_delay)
+    for sub_stop in getattr(stop, 'stops', ()):
+        delay = get_max_delay(sub_stop)
+        if delay is not None:
+            delays.append(delay)
+    return min(delays) if delays else None
+
+
+class wait_retry_after(wait_base):
+    """
+    Wait for the delay asked by the server in the `Retry-After` header of the last response (e.g. on 429 or 503),
+    or use the `fallback` wait strategy if there is none.
+    The delay is capped by `max_wait` and by the time remaining before `stop` gives up.
+    """
+    def __init__(self, fallback, stop=None, max_wait=None):
+        self.fallback = fallback
+        self.stop = stop
+        self.max_wait = max_wait
+
+    def __call__(self, retry_state):
+        retry_after = None
+        outcome = retry_state.outcome
+        if outcome is not None and not outcome.failed:
+            headers = getattr(outcome.result(), 'headers', None) or {}
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+        if retry_after is None:
+            return self.fallback(retry_state)
+
+        if self.max_wait is not None:
+            retry_after = min(retry_after, self.max_wait)
+        max_delay = get_max_delay(self.stop)
+        if max_delay is not None:
+            retry_after = min(retry_after, max(0., max_delay - retry_state.seconds_since_start))
+        return retry_after
+
+
+class RetryBudget(object):
+    """
+    Token bucket capping the retries to a fraction of the requests, shared by all the threads using the same `HTTPRetry`.
+    Each request deposits `ratio` token and each retry withdraws one token, so that when the API degrades
+    the clients stop multiplying the load. `min_retries_per_second` tokens are added every second
+    so that clients sending few requests can still retry.
+
+    :param ratio (optional): tokens deposited per request, i.e. the maximum fraction of retries. Defaults to 0.2.
+    :type ratio: float
+    :param min_retries_per_second (optional): tokens added every second. Defaults to 1.
+    :type min_retries_per_second: float
+    :param max_tokens (optional): capacity of the bucket, which starts full. Defaults to 20.
+    :type max_tokens: float
+    """
+    def __init__(self, ratio=0.2, min_retries_per_second=1., max_tokens=20.):
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, tokens):
+        now = time.monotonic()
+        tokens += (now - self._last_refill) * self.min_retries_per_second
+        self._last_refill = now
+        self._tokens = min(self.max_tokens, tokens)
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill(self._tokens)
+            return self._tokens
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self._tokens + self.ratio)
+
+    def withdraw(self):
+        """
+        Return True and withdraw a token if a retry is allowed.
+        """
+        with self._lock:
+            self._refill(self._tokens)
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class stop_if_retry_budget_exhausted(stop_base):
+    """
+    Stop retrying when the `RetryBudget` is empty, a token is withdrawn for each retry.
+    With `exceptions_only`, only the retries of failed attempts are counted (e.g. not the polling of a pending task).
+    It must be the last stop condition, so that no token is withdrawn when another one stops:
+    `stop_after_delay(60) | stop_if_retry_budget_exhausted(budget)`.
+    """
+    def __init__(self, retry_budget, exceptions_only=False):
+        self.retry_budget = retry_budget
+        self.exceptions_only = exceptions_only
+
+    def __call__(self, retry_state):
+        if self.exceptions_only and not retry_state.outcome.failed:
+            return False
+        return not self.retry_budget.withdraw()
+
+
+class CircuitBreaker(object):
+    """
+    Fail fast with `CircuitOpenError` after `failure_threshold` consecutive failed attempts (5xx or connection errors),
+    instead of sending requests to an API which is down.
+    After `recovery_timeout` seconds, the circuit is half-open: a single probe request is allowed,
+    the circuit is closed if it succeeds and opened again if it fails.
+
+    :param failure_threshold (optional): number of consecutive failures opening the circuit. Defaults to 10.
+    :type failure_threshold: int
+    :param recovery_timeout (optional): seconds before probing the API when the circuit is open. Defaults to 10.
+    :type recovery_timeout: float
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=10, recovery_timeout=10.):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self):
+        """
+        Raise `CircuitOpenError` if the request must not be sent.
+        Return True if the request is the probe of the half-open circuit, to give to `after_call()`.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+            if self._state == self.OPEN:
+                remaining = self.recovery_timeout - (time.monotonic() - self._opened_at)
+                if remaining > 0:
+                    raise CircuitOpenError("Circuit breaker is open after {} consecutive failures, "
+                                           "next probe in {:.1f}s".format(self._failures, remaining))
+                self._state = self.HALF_OPEN
+            if self._probing:
+                raise CircuitOpenError("Circuit breaker is half-open, waiting for the probe request")
+            self._probing = True
+            return True
+
+    def after_call(self, failed, probe=False):
+        """
+        Record the result of a request. Only the probe settles the half-open circuit: the requests which
+        started before the circuit opened do not change its state when they complete.
+        """
+        with self._lock:
+            if probe:
+                self._probing = False
+            elif self._state != self.CLOSED:
+                return
+            if not failed:
+                self._failures = 0
+                self._state = self.CLOSED
+                return
+            self._failures += 1
+            if probe or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
 class HTTPRetry(object):
 
     """
@@ -44,26 +245,41 @@ class HTTPRetry(object):
                               wait_fixed(0.1) + random_wait)
                ```
             :type wait: tenacity.wait_base
+            :param respect_retry_after (optional): If True, the `Retry-After` header of a retried response replaces
+                the `wait` strategy, capped by Default.RETRY_AFTER_MAX and by the time remaining before `stop`.
+                Defaults to True.
+            :type respect_retry_after: bool
             :param stop (optional). Tell when to stop retrying. By default it stops retrying after 60s (Default.RETRY_TIMEOUT).
                 A last retry can be done just before this delay is reached, thus the total amount of elapsed time might be a bit higher.
                 More details in tenacity source code https://github.com/jd/tenacity/blob/5.1.1/tenacity/stop.py
                 Raises tenacity.RetryError when timeout is reached.
             :type timeout: tenacity.stop_base
+            :param retry_budget (optional): caps the retries as a fraction of the requests, see `RetryBudget`.
+                Share the same `HTTPRetry` between threads (it is the case within a client) to share the budget.
+                When the budget is exhausted, requests stop retrying and raise `HTTPRetryError`. Defaults to `None`: no budget.
+            :type retry_budget: RetryBudget
+            :param circuit_breaker (optional): fails fast with `CircuitOpenError` after sustained failures,
+                see `CircuitBreaker`. Defaults to `None`: no circuit breaker.
+            :type circuit_breaker: CircuitBreaker
     """
 
     class Default(object):
         RETRY_TIMEOUT = 60
         RETRY_EXP_MAX = 10.
         RETRY_EXP_MULTIPLIER = 0.5
-        RETRY_STATUS_CODES = [500, 502, 503, 504]
+        RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+        RETRY_AFTER_MAX = 60.
         RETRY_EXCEPTION_TYPES = (RequestException, )
         RETRY_EXCEPTION_TYPES_BLACKLIST = (ValueError, ProxyError, TooManyRedirects, URLRequired)
 
-    def __init__(self, retry_if=None, wait=None, stop=None):
+    def __init__(self, retry_if=None, wait=None, stop=None, retry_budget=None, circuit_breaker=None,
+                 respect_retry_after=True):
         self.retry_status_code = {}
         self.retry_if = retry_if
         self.wait = wait
         self.stop = stop
+        self.retry_budget = retry_budget
+        self.circuit_breaker = circuit_breaker
 
         if self.stop is None:
             self.stop = stop_after_delay(HTTPRetry.Default.RETRY_TIMEOUT)
@@ -81,8 +297,55 @@ class HTTPRetry(object):
                                    wait_fixed(0.1),
                                    wait_fixed(0.1) + random_wait)
 
+        if respect_retry_after:
+            self.wait = wait_retry_after(self.wait, self.stop, HTTPRetry.Default.RETRY_AFTER_MAX)
+
+    def get_stop(self):
+        if self.retry_budget is None:
+            return self.stop
+        self.retry_budget.deposit()
+        return stop_any(self.stop, stop_if_retry_budget_exhausted(self.retry_budget))
+
     def retry(self, functor):
-        return utils.retry(functor, self.retry_if, self.wait, self.stop, retry_error_cls=HTTPRetryError)
+        if self.circuit_breaker is not None:
+            functor = self._guard(functor)
+        return utils.retry(functor, self.retry_if, self.wait, self.get_stop(), retry_error_cls=HTTPRetryError)
+
+    async def async_retry(self, functor):
+        if self.circuit_breaker is not None:
+            functor = self._async_guard(functor)
+        return await utils.async_retry(functor, self.retry_if, self.wait, self.get_stop(), retry_error_cls=HTTPRetryError)
+
+    def is_failure(self, response=None, exception=None):
+        # failures counted by the circuit breaker: server errors and network errors
+        if exception is not None:
+            return (isinstance(exception, HTTPRetry.Default.RETRY_EXCEPTION_TYPES)
+                    and not isinstance(exception, HTTPRetry.Default.RETRY_EXCEPTION_TYPES_BLACKLIST))
+        return response.status_code >= 500
+
+    def _guard(self, functor):
+        def guarded_functor():
+            probe = self.circuit_breaker.before_call()
+            try:
+                response = functor()
+            except Exception as e:
+                self.circuit_breaker.after_call(self.is_failure(exception=e), probe)
+                raise
+            self.circuit_breaker.after_call(self.is_failure(response=response), probe)
+            return response
+        return guarded_functor
+
+    def _async_guard(self, functor):
+        async def guarded_functor():
+            probe = self.circuit_breaker.before_call()
+            try:
+                response = await functor()
+            except Exception as e:
+                self.circuit_breaker.after_call(self.is_failure(exception=e), probe)
+                raise
+            self.circuit_breaker.after_call(self.is_failure(response=response), probe)
+            return response
+        return guarded_functor
 
     def retry_if_status_code(self, response):
         return response.status_code in self.retry_status_code
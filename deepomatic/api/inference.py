@@ -1,23 +1,191 @@
-from deepomatic.api.exceptions import DeepomaticException
-from deepomatic.api.resources.task import Task
-from deepomatic.api.inputs import format_inputs
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from requests.exceptions import RequestException
+
+from deepomatic.api.exceptions import DeepomaticException, HTTPRetryError, TaskError, TaskTimeout
+from deepomatic.api.resources.task import Task, TaskPoller
+from deepomatic.api.inputs import AUTO_SIZE, format_inputs
+from deepomatic.api.inference_cache import inference_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceFuture(Future):
+    """
+    `concurrent.futures.Future` of an inference result, returned by `inference_async()`.
+    The inference task is available as `future.task` once the inference request has been sent.
+    It can't be cancelled: the task runs on the API anyway.
+    """
+    def __init__(self):
+        super(InferenceFuture, self).__init__()
+        self.task = None
+        self.set_running_or_notify_cancel()
+
+
+def chain_future(source, transform, future):
+    """
+    Resolve `future` with `transform(source.result())` once `source` is done.
+    """
+    def callback(source):
+        try:
+            future.set_result(transform(source.result()))
+        except Exception as e:
+            future.set_exception(e)
+    source.add_done_callback(callback)
+    return future
 
 
 class InferenceResource(object):
     def inference(self, return_task=False, wait_task=True, **kwargs):
-        assert (self._pk is not None)
+        content_type, data, files = self._prepare_inference_kwargs(kwargs)
+        uri = self._uri(pk=self._pk, suffix='/inference')
 
-        inputs = kwargs.pop('inputs', None)
-        if inputs is None:
-            raise DeepomaticException("Missing keyword argument: inputs")
-        content_type, data, files = format_inputs(inputs, kwargs)
-        result = self._helper.post(self._uri(pk=self._pk, suffix='/inference'), content_type=content_type, data=data, files=files)
+        # with `inference_cache`, see `inference_cache.InferenceCache`
+        cache = self._helper.inference_cache
+        cache_key = None
+        if cache is not None and wait_task:
+            cache_key = inference_cache_key(self._helper.resource_prefix + uri, data, files)
+            task_data = cache.get(cache_key)
+            if task_data is not None:
+                task = Task(self._helper, pk=task_data['id'], data=task_data)
+                return task if return_task else task['data']
+
+        result = self._helper.post(uri, content_type=content_type, data=data, files=files)
         task_id = result['task_id']
         task = Task(self._helper, pk=task_id)
         if wait_task:
             task.wait()
+            if cache_key is not None:
+                cache.set(cache_key, task._data)
 
         if return_task:
             return task
         else:
             return task['data']
+
+    def inference_async(self, return_task=False, timeout=60, **kwargs):
+        """
+        Send the inference request and return an `InferenceFuture` without waiting for the task.
+        The future is compatible with `concurrent.futures.wait()` and `concurrent.futures.as_completed()`:
+        its result is the inference result (or the `Task` if `return_task` is True), its exception is the
+        error raised by the request, a `TaskError` or a `TaskTimeout` after `timeout` seconds.
+
+        Tasks are waited for by a `TaskPoller` background thread, no thread is blocked per inference.
+        """
+        return self._inference_async(lambda task: task if return_task else task['data'], timeout, kwargs)
+
+    def _inference_async(self, transform, timeout, kwargs):
+        future = InferenceFuture()
+        try:
+            # bypass subclasses overrides (Network converts results), we only want the task here
+            future.task = InferenceResource.inference(self, return_task=True, wait_task=False, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            return future
+        task_future = TaskPoller.for_helper(self._helper).submit(future.task, timeout=timeout)
+        return chain_future(task_future, transform, future)
+
+    def batch_inference(self, inputs_list, max_in_flight=None, return_task=False,
+                        wait_task=True, wait_timeout=300, **kwargs):
+        """
+        Run one inference per element of `inputs_list` with the same inference `kwargs`.
+        Inference requests are sent concurrently from a thread pool sharing the client connection pool,
+        then all the tasks are waited for with `Task.batch_wait`.
+
+        :param inputs_list: list of `inputs`, each one is a list of `inputs.AbstractInput` as in `inference()`.
+        :type inputs_list: list
+        :param max_in_flight (optional): maximum number of concurrent inference requests.
+            Defaults to the client `pool_maxsize`.
+        :type max_in_flight: int
+        :param wait_timeout (optional): timeout in seconds of `Task.batch_wait`. Defaults to 300.
+        :type wait_timeout: float
+
+        :return: a list with one element per input, in the order of `inputs_list`.
+            An element is either the inference result (or the `Task` if `return_task` is True)
+            or the exception raised for this input: the failure of one input doesn't fail the whole batch.
+            A `TaskError` is returned for tasks in error and a `TaskTimeout` for tasks still pending after `wait_timeout`.
+            If `wait_task` is False, the tasks are returned as soon as the inference requests are sent.
+        :rtype: list
+        """
+        if max_in_flight is None:
+            max_in_flight = self._helper.pool_maxsize
+
+        def send_inference(inputs):
+            # bypass subclasses overrides (Network converts results), we only want the task here
+            return InferenceResource.inference(self, inputs=inputs, return_task=True, wait_task=False, **kwargs)
+
+        results = [None] * len(inputs_list)
+        tasks = []
+        positions = []
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+            futures = [executor.submit(send_inference, inputs) for inputs in inputs_list]
+            for pos, future in enumerate(futures):
+                try:
+                    task = future.result()
+                except Exception as e:
+                    results[pos] = e
+                else:
+                    tasks.append(task)
+                    positions.append(pos)
+                    results[pos] = task
+
+        if not wait_task or not tasks:
+            return results
+
+        pending_tasks, success_tasks, error_tasks = Task(self._helper).batch_wait(tasks, timeout=wait_timeout)
+        for idx, task in success_tasks:
+            results[positions[idx]] = task if return_task else task['data']
+        for idx, task in error_tasks:
+            results[positions[idx]] = TaskError(task._data)
+        for idx, task in pending_tasks:
+            # the task might never have been refreshed
+            results[positions[idx]] = TaskTimeout(task._data or {'id': task.pk})
+        return results
+
+    def _prepare_inference_kwargs(self, kwargs):
+        assert (self._pk is not None)
+
+        inputs = kwargs.pop('inputs', None)
+        if inputs is None:
+            raise DeepomaticException("Missing keyword argument: inputs")
+        input_size = None
+        if any(getattr(input_data, 'max_side', None) == AUTO_SIZE for input_data in inputs):
+            input_size = self._get_input_size()
+        return format_inputs(inputs, kwargs, input_size)
+
+    def _get_input_size(self):
+        """
+        Return the largest dimension of the input images of the network of this resource, read from the
+        `target_size` of its preprocessing, or `None` if it is unknown. Used by `ImageInput(max_side=AUTO_SIZE)`.
+        The size is requested once per resource id and client, the requests are not retried: if they fail,
+        the images are sent without downscaling and the size is requested again by the next inference.
+        """
+        # imported here to avoid circular imports
+        from deepomatic.api.resources.network import Network
+        from deepomatic.api.resources.recognition import RecognitionVersion
+
+        def get_data(resource_class, pk):
+            return self._helper.get(resource_class._uri(pk=pk), http_retry=None,
+                                    **resource_class._cache_kwargs(self._helper))
+
+        uri = self._uri(pk=self._pk)
+        input_sizes = self._helper._input_sizes
+        if uri not in input_sizes:
+            try:
+                data = self._data if self._data is not None else get_data(self.__class__, self._pk)
+                if 'preprocessing' not in data:
+                    if 'network_id' not in data:
+                        data = get_data(RecognitionVersion, data['current_version_id'])
+                    data = get_data(Network, data['network_id'])
+            except (DeepomaticException, HTTPRetryError, RequestException) as e:
+                logger.warning("Images are not downscaled, the input size of the network could not be retrieved: {}".format(e))
+                return None
+            try:
+                sizes = [int(dimension) for preprocessing in data['preprocessing']['inputs'] if 'image' in preprocessing
+                         for dimension in preprocessing['image']['target_size'].split('x')]
+                input_sizes[uri] = max(sizes)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning("Images are not downscaled, the input size of the network is unknown: {}".format(e))
+                input_sizes[uri] = None
+        return input_sizes[uri]
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from six import binary_type, string_types, text_type
+
+
+###############################################################################
+
+def _is_file_path(value):
+    # same check as `HTTPHelper.open_files()`, which sends the content of the file paths of `files`
+    try:
+        return isinstance(value, string_types) and os.path.isfile(value)
+    except (TypeError, ValueError):
+        return False
+
+
+def _update_hash(hasher, value, files=False):
+    # every value is prefixed by its type so that e.g. '1' and 1 or b'' and '' hash differently
+    # with `files`, the content of the file paths is hashed instead of the path
+    if isinstance(value, dict):
+        hasher.update(b'{')
+        for key in sorted(value, key=text_type):
+            _update_hash(hasher, key)
+            _update_hash(hasher, value[key], files)
+        hasher.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        hasher.update(b'[')
+        for item in value:
+            _update_hash(hasher, item, files)
+        hasher.update(b']')
+    elif isinstance(value, binary_type):
+        hasher.update(b'b' + hashlib.sha256(value).digest())
+    elif hasattr(value, 'read'):
+        hasher.update(b'f' + _hash_file(value))
+    elif files and _is_file_path(value):
+        with open(value, 'rb') as file:
+            hasher.update(b'f' + _hash_file(file))
+    else:
+        hasher.update(b'j' + json.dumps(value, default=repr).encode('utf-8'))
+
+
+def _hash_file(file, chunk_size=1024 * 1024):
+    # the file is read again when the request is sent
+    position = file.tell()
+    hasher = hashlib.sha256()
+    chunk = file.read(chunk_size)
+    while chunk:
+        hasher.update(chunk if isinstance(chunk, binary_type) else chunk.encode('utf-8'))
+        chunk = file.read(chunk_size)
+    file.seek(position)
+    return hasher.digest()
+
+
+def inference_cache_key(uri, data, files=None):
+    """
+    Return the cache key of an inference request: a hash of the resource `uri` (spec, version or network)
+    and of the `data` and `files` built by `inputs.format_inputs()`, file, file path and binary contents included.
+    """
+    hasher = hashlib.sha256()
+    _update_hash(hasher, [uri, data])
+    _update_hash(hasher, files or {}, files=True)
+    return hasher.hexdigest()
+
+
+###############################################################################
+
+class InferenceCache(object):
+    """
+    Cache of the successful inference tasks, keyed by `inference_cache_key()`: running an inference on
+    inputs already seen (e.g. duplicated images) returns the cached task without sending any request.
+    It has an in-memory LRU tier and an optional on-disk tier, shared between processes and runs, in which
+    the least recently used tasks are removed when the directory grows over `max_disk_size`.
+    Files are read and written outside of the lock of the cache: concurrent inferences do not wait for each other.
+
+    The results are cached forever: clear the cache when the models used by the cached specs change.
+
+    :param max_entries (optional): maximum number of tasks kept in memory. Defaults to 1024.
+    :type max_entries: int
+    :param directory (optional): directory of the on-disk tier, created if needed. Defaults to `None`: memory only.
+    :type directory: string
+    :param max_disk_size (optional): maximum size in bytes of the on-disk tier. Defaults to 1GB.
+    :type max_disk_size: int
+    """
+    # when the on-disk tier is over `max_disk_size`, the least recently used tasks are removed until its size
+    # is below this fraction of `max_disk_size`, so that the directory is scanned once for many insertions
+    low_water_mark = 0.9
+
+    def __init__(self, max_entries=1024, directory=None, max_disk_size=1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # only protects the in-memory state: the files are read and written outside of it
+        self._lock = threading.Lock()
+        self._evicting = False
+        self.disk_size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_size = sum(size for _, _, size in self._disk_entries())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Return a copy of the task data cached for `key`, or `None`.
+        """
+        with self._lock:
+            task_data = self._entries.pop(key, None)
+            if task_data is not None:
+                self.hits += 1
+                self._memory_set(key, task_data)
+        if task_data is None and self.directory is not None:
+            task_data = self._disk_get(key)
+            with self._lock:
+                if task_data is not None:
+                    self.hits += 1
+                    self._memory_set(key, task_data)
+        if task_data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return copy.deepcopy(task_data)
+
+    def set(self, key, task_data):
+        task_data = copy.deepcopy(task_data)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._memory_set(key, task_data)
+        if self.directory is not None:
+            self._disk_set(key, task_data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.directory is not None:
+            for path, _, _ in self._disk_entries():
+                self._remove(path)
+            with self._lock:
+                self.disk_size = 0
+
+    def _memory_set(self, key, task_data):
+        # most recently used last
+        self._entries[key] = task_data
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _disk_get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                task_data = json.loads(f.read().decode('utf-8'))
+            # the modification time is the last access time used for the eviction
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return task_data
+
+    def _disk_set(self, key, task_data):
+        content = json.dumps(task_data).encode('utf-8')
+        if len(content) > self.max_disk_size:
+            return
+        path = self._path(key)
+        try:
+            previous_size = os.path.getsize(path)
+        except OSError:
+            previous_size = 0
+        # write then rename so that other processes never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.disk_size += len(content) - previous_size
+            # a single thread evicts, the others go on
+            evict = self.disk_size > self.max_disk_size and not self._evicting
+            if evict:
+                self._evicting = True
+        if evict:
+            try:
+                self._evict()
+            finally:
+                with self._lock:
+                    self._evicting = False
+
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict(self):
+        # other processes may write to the directory: its size is recomputed
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+        disk_size = sum(size for _, _, size in entries)
+        target_size = self.max_disk_size * self.low_water_mark
+        removed_size = 0
+        for path, _, size in entries:
+            if disk_size - removed_size <= target_size:
+                break
+            self._remove(path)
+            removed_size += size
+        with self._lock:
+            self.disk_size = disk_size - removed_size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_inference_cache(inference_cache=None):
+    """
+    Return an `InferenceCache` from `inference_cache` which is either:
+        - `None` or `False`: no cache
+        - `True`: an in-memory `InferenceCache` with default parameters
+        - a string: an `InferenceCache` with an on-disk tier in this directory
+        - an `InferenceCache` instance, returned as is
+    """
+    if inference_cache is None or inference_cache is False:
+        return None
+    if inference_cache is True:
+        return InferenceCache()
+    if isinstance(inference_cache, (binary_type, text_type)):
+        return InferenceCache(directory=inference_cache)
+    return inference_cache
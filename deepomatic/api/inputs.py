@@ -25,19 +25,27 @@ THE SOFTWARE.
 import sys
 import copy
 import base64
+import functools
+import io
+import os
 
 from deepomatic.api.exceptions import DeepomaticException
+from six import string_types
+
+# `ImageInput(max_side=AUTO_SIZE)`: the size is read from the preprocessing of the network, see `InferenceResource`
+AUTO_SIZE = 'auto'
+DEFAULT_QUALITY = 90
 
 
 ###############################################################################
 
-def format_inputs(inputs, data):
+def format_inputs(inputs, data, input_size=None):
     assert (isinstance(inputs, list))
 
     data = copy.deepcopy(data)
     files = {}
     need_multipart = any([input_data.need_multipart() for input_data in inputs])
-    inputs_data = [input_data.get_input() for input_data in inputs]
+    inputs_data = [input_data.get_input(input_size) for input_data in inputs]
     if need_multipart:
         files['inputs'] = inputs_data
     else:
@@ -47,6 +55,147 @@ def format_inputs(inputs, data):
     return content_type, data, files
 
 
+def _import_pil():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise DeepomaticException("Pillow is required to resize images: pip install deepomatic-api[image]")
+    return Image
+
+
+def _is_instance_of_module(source, module):
+    # numpy and PIL are not imported to check the type of the inputs: they are only loaded if used
+    return any(cls.__module__ == module or cls.__module__.startswith(module + '.') for cls in type(source).__mro__)
+
+
+def is_image_object(source):
+    """
+    Return True if `source` is a numpy array or a PIL image.
+    """
+    return _is_instance_of_module(source, 'numpy') or _is_instance_of_module(source, 'PIL')
+
+
+def _get_scaled_size(width, height, max_side=None, min_side=None):
+    """
+    Return the size of the image downscaled for `max_side` or `min_side`, or `None` if it is already small enough.
+    """
+    if max_side is not None:
+        scale = float(max_side) / max(width, height)
+    elif min_side is not None:
+        scale = float(min_side) / min(width, height)
+    else:
+        return None
+    if scale >= 1:
+        return None
+    return (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+
+
+def _save_pil_image(image, quality, exif=None):
+    save_kwargs = {}
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        save_kwargs['format'] = 'PNG'
+    else:
+        save_kwargs.update(format='JPEG', quality=quality)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+    if exif:
+        # the orientation is kept as is: normalized coordinates stay valid
+        save_kwargs['exif'] = exif
+    output = io.BytesIO()
+    image.save(output, **save_kwargs)
+    return output.getvalue()
+
+
+def downscale_image(content, max_side=None, min_side=None, quality=DEFAULT_QUALITY):
+    """
+    Downscale an encoded image, keeping its aspect ratio, so that its longest side is at most `max_side`
+    or its shortest side is `min_side`. Return the re-encoded image, JPEG unless it has transparency,
+    or `content` if the image is already small enough or can not be decoded.
+    """
+    Image = _import_pil()
+    try:
+        image = Image.open(io.BytesIO(content))
+        width, height = image.size
+    except (IOError, OSError, ValueError, Image.DecompressionBombError):
+        return content
+    size = _get_scaled_size(width, height, max_side, min_side)
+    if size is None:
+        return content
+
+    exif = image.info.get('exif')
+    # JPEG images are decoded at a reduced scale by libjpeg, much faster than decoding then resizing
+    image.draft('RGB', size)
+    image = image.resize(size, Image.BICUBIC, reducing_gap=3.)
+    resized = _save_pil_image(image, quality, exif)
+    return resized if len(resized) < len(content) else content
+
+
+def _encode_simplejpeg(array, quality):
+    import numpy
+    import simplejpeg
+    colorspace = 'GRAY' if array.ndim == 2 else 'RGB'
+    if array.ndim == 2:
+        array = array[:, :, None]
+    return simplejpeg.encode_jpeg(numpy.ascontiguousarray(array), quality=quality, colorspace=colorspace)
+
+
+def _encode_cv2(array, quality):
+    import cv2
+    if array.ndim == 3:
+        array = array[:, :, ::-1]  # OpenCV expects BGR channels
+    success, buffer = cv2.imencode('.jpg', array, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise DeepomaticException("Could not encode the image with OpenCV")
+    return buffer.tobytes()
+
+
+def _encode_pil(array, quality):
+    return _save_pil_image(_import_pil().fromarray(array), quality)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_jpeg_encoder():
+    """
+    Return the fastest JPEG encoder of arrays installed: simplejpeg, then OpenCV, then Pillow.
+    All of them are built upon libjpeg-turbo in their binary wheels.
+    """
+    for module, encoder in [('simplejpeg', _encode_simplejpeg), ('cv2', _encode_cv2)]:
+        try:
+            __import__(module)
+            return encoder
+        except ImportError:
+            pass
+    return _encode_pil
+
+
+def encode_image(image, max_side=None, min_side=None, quality=DEFAULT_QUALITY):
+    """
+    Encode a PIL image or a numpy array of uint8 with shape HxW or HxWxC (RGB or RGBA channels), downscaled
+    like `downscale_image()` if `max_side` or `min_side` is set. Images with an alpha channel are encoded
+    to PNG with Pillow, the others to JPEG with the fastest encoder installed.
+    """
+    if _is_instance_of_module(image, 'PIL'):
+        size = _get_scaled_size(image.width, image.height, max_side, min_side)
+        if size is not None:
+            image = image.resize(size, _import_pil().BICUBIC, reducing_gap=3.)
+        return _save_pil_image(image, quality)
+
+    shape = getattr(image, 'shape', ())
+    if str(image.dtype) != 'uint8' or len(shape) not in (2, 3) or (len(shape) == 3 and shape[2] not in (1, 3, 4)):
+        raise DeepomaticException("Unsupported array of shape {} and type {}: expected HxW or HxWxC arrays of uint8 "
+                                  "with 1, 3 or 4 channels".format(shape, image.dtype))
+    if len(shape) == 3 and shape[2] == 1:
+        image = image[:, :, 0]
+    size = _get_scaled_size(shape[1], shape[0], max_side, min_side)
+    if size is not None:
+        import numpy
+        Image = _import_pil()
+        image = numpy.asarray(Image.fromarray(image).resize(size, Image.BICUBIC, reducing_gap=3.))
+    if image.ndim == 3 and image.shape[2] == 4:
+        return _encode_pil(image, quality)
+    return _get_jpeg_encoder()(image, quality)
+
+
 ###############################################################################
 
 class AbstractInput(object):
@@ -57,9 +206,10 @@ class AbstractInput(object):
     supported_encodings = ['binary', 'base64']
 
     def __init__(self, source, encoding=None):
-        is_file = hasattr(source, 'read')
+        is_object = self.is_supported_object(source)
+        is_file = not is_object and hasattr(source, 'read')
         is_raw = False
-        if not is_file:
+        if not is_file and not is_object:
             is_raw = ((sys.version_info >= (3, 0) and isinstance(source, bytes))
                       or not any([source.startswith(p) for p in self.supported_protocols]))
             if is_raw:
@@ -74,9 +224,19 @@ class AbstractInput(object):
                     encoding = 'binary'
 
         self._source = source
-        self._need_multipart = is_file or (is_raw and encoding == 'binary')
+        self._is_object = is_object
+        self._need_multipart = is_file or is_object or (is_raw and encoding == 'binary')
+
+    def is_supported_object(self, source):
+        """
+        Return True if `source` is an object encoded by the input itself before being sent.
+        """
+        return False
 
-    def get_input(self):
+    def get_input(self, input_size=None):
+        """
+        Return the input to send. `input_size` is the input size of the network used for the inference if known.
+        """
         raise NotImplementedError()
 
     def need_multipart(self):
@@ -89,15 +249,70 @@ class ImageInput(AbstractInput):
     content_type = r'image/*'
     key = u'image'
 
-    def __init__(self, source, encoding=None, bbox=None, polygon=None, crop_uniform_background=False):
+    def __init__(self, source, encoding=None, bbox=None, polygon=None, crop_uniform_background=False,
+                 max_side=None, quality=DEFAULT_QUALITY):
+        """
+        :param source: URL, file object, raw data, numpy array of uint8 with shape HxW or HxWxC (RGB or RGBA
+            channels) or PIL image. Arrays and PIL images do not need `encoding`: they are encoded once, when the
+            input is sent, to JPEG, or PNG if they have an alpha channel.
+        :type source: string, bytes, file, numpy.ndarray or PIL.Image.Image
+        :param max_side (optional): if set, images sent as files or binary data are downscaled before upload
+            so that their longest side is at most `max_side` pixels, and re-encoded. The aspect ratio is kept:
+            the normalized `bbox` and `polygon` coordinates stay valid. With `AUTO_SIZE`, they are downscaled to
+            the input size of the network of the spec, version or network used for the inference.
+            Images given by URL are not modified. Requires Pillow. Defaults to `None`: images are sent as is.
+        :type max_side: int or string
+        :param quality (optional): JPEG quality of the downscaled images. Defaults to 90.
+        :type quality: int
+        """
         super(ImageInput, self).__init__(source, encoding)
         self.bbox = bbox
         self.polygon = polygon
         self.crop_uniform_background = crop_uniform_background
+        self.max_side = max_side
+        self.quality = quality
+        self._encoded = None
+
+    def is_supported_object(self, source):
+        return is_image_object(source)
+
+    def get_source(self, input_size=None):
+        """
+        Return the source to send, encoded and downscaled if needed: it is computed once and the same bytes
+        are reused by the next calls with the same `input_size` and the retries. The source itself is kept as is.
+        """
+        if not self._need_multipart:
+            return self._source
+        if self.max_side == AUTO_SIZE:
+            params = (None, input_size, self.quality)
+        else:
+            params = (self.max_side, None, self.quality)
+        if params[:2] == (None, None) and not self._is_object:
+            return self._source
+        if self._encoded is None or self._encoded[0] != params:
+            if self._is_object:
+                content = encode_image(self._source, *params)
+            elif isinstance(self._source, string_types) and not os.path.isfile(self._source):
+                # not a file path: sent as is, like `HTTPHelper.open_files()` does
+                return self._source
+            else:
+                if hasattr(self._source, 'read'):
+                    # read again for another `input_size`
+                    self._source.seek(0)
+                    content = self._source.read()
+                elif isinstance(self._source, string_types):
+                    # file path, opened by `HTTPHelper.open_files()` when sent as is
+                    with open(self._source, 'rb') as f:
+                        content = f.read()
+                else:
+                    content = self._source
+                content = downscale_image(content, *params)
+            self._encoded = (params, content)
+        return self._encoded[1]
 
-    def get_input(self):
+    def get_input(self, input_size=None):
         image = {
-            'source': self._source,
+            'source': self.get_source(input_size),
             'crop_uniform_background': self.crop_uniform_background
         }
         if self.bbox is not None:
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import importlib
+import json
+
+from deepomatic.api.exceptions import DeepomaticException
+
+
+###############################################################################
+
+class JSONCodec(object):
+    """
+    Serialize request bodies and parse response bodies, using the standard library `json` module.
+    Subclass it and override `dumps` and `loads` to plug another implementation,
+    `dumps` may return `str` or `bytes` and `loads` must accept both.
+    """
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def __repr__(self):
+        return '<{} {}>'.format(self.__class__.__name__, self.name)
+
+
+class _ModuleJSONCodec(JSONCodec):
+    # a third-party library with `dumps` / `loads` functions, imported when the codec is created
+    def __init__(self):
+        module = importlib.import_module(self.name)
+        self.dumps = module.dumps
+        self.loads = module.loads
+
+
+class OrjsonCodec(_ModuleJSONCodec):
+    name = 'orjson'
+
+
+class UjsonCodec(_ModuleJSONCodec):
+    name = 'ujson'
+
+
+class RapidjsonCodec(_ModuleJSONCodec):
+    name = 'rapidjson'
+
+
+CODECS = {codec.name: codec for codec in [OrjsonCodec, UjsonCodec, RapidjsonCodec, JSONCodec]}
+
+# order of preference for `json_codec='auto'`
+AUTO_CODECS = ['orjson', 'ujson', 'rapidjson', 'json']
+
+
+def get_json_codec(json_codec=None):
+    """
+    Return a codec instance from `json_codec` which is either:
+        - `None`: the standard library `json` module
+        - 'auto': the fastest library installed among `AUTO_CODECS`, falling back to the standard library
+        - a codec name from `CODECS`
+        - a `JSONCodec` instance, returned as is
+    """
+    if json_codec is None:
+        return JSONCodec()
+    if isinstance(json_codec, JSONCodec):
+        return json_codec
+    if json_codec == 'auto':
+        for name in AUTO_CODECS:
+            try:
+                return CODECS[name]()
+            except ImportError:
+                continue
+    if json_codec not in CODECS:
+        raise DeepomaticException("Unknown JSON codec '{}', expected one of: auto, {}".format(json_codec, ', '.join(CODECS)))
+    try:
+        return CODECS[json_codec]()
+    except ImportError:
+        raise DeepomaticException("JSON codec '{}' is not installed.".format(json_codec))
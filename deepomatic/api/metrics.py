@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import math
+import re
+import threading
+import time
+
+from six import string_types
+from six.moves.urllib.parse import urlparse
+
+
+###############################################################################
+
+# collections of the API routes, longest first: the path segment following a collection is the id of a resource
+# (numeric or not, e.g. a public spec name) and is replaced by '{id}' so that metrics are aggregated per endpoint
+_COLLECTIONS = [('recognition', 'specs'), ('recognition', 'public'), ('recognition', 'versions'),
+                ('networks', 'public'), ('networks',), ('tasks',), ('accounts',)]
+# segments following a collection which are not ids
+_NOT_IDS = {'me'}
+# in the routes unknown to the client, path segments containing a digit are assumed to be ids
+_ID_SEGMENT = re.compile(r'.*\d')
+
+# quantiles reported for each histogram, with their key in `Histogram.to_dict()`
+QUANTILES = [(0.5, 'p50'), (0.9, 'p90'), (0.99, 'p99'), (0.999, 'p999')]
+
+
+def endpoint_label(resource, resource_prefix=''):
+    """
+    Return the endpoint of `resource` used to aggregate metrics, e.g. '/tasks/{id}/'.
+    `resource` is either a path relative to `resource_prefix` or an absolute URL (e.g. the next page of a list).
+    """
+    if resource.startswith('http'):
+        if resource_prefix and resource.startswith(resource_prefix):
+            resource = resource[len(resource_prefix):]
+        else:
+            resource = urlparse(resource).path
+    segments = resource.split('?', 1)[0].split('/')
+    label = []
+    i = 0
+    while i < len(segments):
+        for collection in _COLLECTIONS:
+            if tuple(segments[i:i + len(collection)]) == collection:
+                label.extend(collection)
+                i += len(collection)
+                if i < len(segments) and segments[i] and segments[i] not in _NOT_IDS:
+                    label.append('{id}')
+                    i += 1
+                break
+        else:
+            label.append('{id}' if _ID_SEGMENT.match(segments[i]) else segments[i])
+            i += 1
+    return '/'.join(label)
+
+
+def body_size(data):
+    """
+    Return the size in bytes of a request body, 0 if unknown.
+    """
+    if data is None:
+        return 0
+    if isinstance(data, string_types) and not isinstance(data, bytes):
+        return len(data.encode('utf-8'))
+    try:
+        return len(data)
+    except TypeError:
+        return 0
+
+
+class Histogram(object):
+    """
+    Log-linear histogram of positive values with a bounded relative error, in the spirit of HDR histograms:
+    each power of two is split in `SUB_BUCKETS` buckets, so quantiles are precise to about 3% whatever the scale.
+    Recording a value is a `math.frexp` and a dict increment.
+    """
+    SUB_BUCKETS = 16
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def _index(self, value):
+        if value <= 0:
+            return None
+        mantissa, exponent = math.frexp(value)  # 0.5 <= mantissa < 1
+        return exponent * self.SUB_BUCKETS + int((mantissa - 0.5) * 2 * self.SUB_BUCKETS)
+
+    def _value(self, index):
+        # middle of the bucket
+        if index is None:
+            return 0.
+        exponent, sub_bucket = divmod(index, self.SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub_bucket + 0.5) / (2. * self.SUB_BUCKETS), exponent)
+
+    def quantile(self, q):
+        """
+        Return the value below which a fraction `q` of the recorded values fall, `None` if the histogram is empty.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = self.counts.get(None, 0)
+        if seen >= rank:
+            return self._value(None)
+        for index in sorted(i for i in self.counts if i is not None):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def to_dict(self):
+        result = {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+        }
+        for q, key in QUANTILES:
+            result[key] = self.quantile(q)
+        return result
+
+
+class EndpointStats(object):
+    """
+    Counters and histograms of the requests sent to one endpoint.
+    Durations are in seconds and sizes in bytes.
+    """
+    HISTOGRAMS = ['latency', 'serialization', 'network', 'retry_wait', 'deserialization',
+                  'request_size', 'response_size']
+
+    def __init__(self, method, endpoint):
+        self.method = method
+        self.endpoint = endpoint
+        self.requests = 0
+        self.attempts = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.status_codes = {}
+        self.errors = {}
+        self.retries = {}
+        for name in self.HISTOGRAMS:
+            setattr(self, name, Histogram())
+
+    def to_dict(self):
+        result = {
+            'method': self.method,
+            'endpoint': self.endpoint,
+            'requests': self.requests,
+            'attempts': self.attempts,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'status_codes': dict(self.status_codes),
+            'errors': dict(self.errors),
+            'retries': dict(self.retries),
+        }
+        for name in self.HISTOGRAMS:
+            result[name] = getattr(self, name).to_dict()
+        return result
+
+
+def _increment(counter, key, value=1):
+    counter[key] = counter.get(key, 0) + value
+
+
+def attempt_outcome(response=None, exception=None):
+    # label of an attempt: the status code or the exception class name, used as the retry cause
+    if exception is not None:
+        return exception.__class__.__name__
+    return str(response.status_code)
+
+
+class RequestMetrics(object):
+    """
+    Timings of one `HTTPHelper.make_request()` call, recorded into `ClientMetrics` when the request is done.
+    """
+    def __init__(self, metrics, method, endpoint):
+        self.metrics = metrics
+        self.method = method
+        self.endpoint = endpoint
+        self.start_time = time.perf_counter()
+        self.serialized_time = None
+        self.received_time = None
+        self.attempts = []  # list of tuples (duration, outcome)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.status_code = None
+
+    def serialized(self, data):
+        self.serialized_time = time.perf_counter()
+        self.bytes_sent = body_size(data)
+
+    def add_attempt(self, start_time, response=None, exception=None):
+        self.attempts.append((time.perf_counter() - start_time, attempt_outcome(response, exception)))
+
+    def received(self, response, stream=False):
+        self.received_time = time.perf_counter()
+        self.status_code = response.status_code
+        if stream:
+            # the body is not downloaded yet
+            self.bytes_received = int(response.headers.get('Content-Length') or 0)
+        else:
+            self.bytes_received = len(response.content or b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(self, exc_value)
+        return False
+
+
+class NullRequestMetrics(object):
+    # used when metrics are disabled
+    def serialized(self, data):
+        pass
+
+    def add_attempt(self, start_time, response=None, exception=None):
+        pass
+
+    def received(self, response, stream=False):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_REQUEST_METRICS = NullRequestMetrics()
+
+
+class ClientMetrics(object):
+    """
+    Per endpoint instrumentation of the requests sent by a client:
+        - counters: requests, attempts, status codes, errors by exception type, retries by cause, bytes sent and received
+        - histograms: latency (end to end), serialization, network (each attempt), retry wait, deserialization,
+          request and response sizes
+
+    Requests are aggregated by method and endpoint, identifiers in the URL are replaced by '{id}'.
+    Overhead is a few timer reads and a lock per request, so it is enabled by default.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._gauges = []
+
+    def request(self, method, resource, resource_prefix=''):
+        """
+        Return a context manager measuring a request, recorded when the block exits.
+        """
+        if not self.enabled:
+            return NULL_REQUEST_METRICS
+        return RequestMetrics(self, method.upper(), endpoint_label(resource, resource_prefix))
+
+    def record(self, request_metrics, exception=None):
+        end_time = time.perf_counter()
+        start_time = request_metrics.start_time
+        serialized_time = request_metrics.serialized_time or end_time
+        received_time = request_metrics.received_time or end_time
+        attempts = request_metrics.attempts
+        network_time = sum(duration for duration, outcome in attempts)
+
+        key = (request_metrics.method, request_metrics.endpoint)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = EndpointStats(*key)
+            stats.requests += 1
+            stats.attempts += len(attempts)
+            stats.bytes_sent += request_metrics.bytes_sent * len(attempts)
+            stats.bytes_received += request_metrics.bytes_received
+            if request_metrics.status_code is not None:
+                _increment(stats.status_codes, str(request_metrics.status_code))
+            if exception is not None:
+                _increment(stats.errors, exception.__class__.__name__)
+            # all attempts but the last one have been retried
+            for duration, outcome in attempts[:-1]:
+                _increment(stats.retries, outcome)
+            for duration, outcome in attempts:
+                stats.network.record(duration)
+
+            stats.latency.record(end_time - start_time)
+            stats.serialization.record(serialized_time - start_time)
+            if len(attempts) > 1:
+                stats.retry_wait.record(max(0., received_time - serialized_time - network_time))
+            if request_metrics.received_time is not None:
+                stats.deserialization.record(end_time - received_time)
+                stats.response_size.record(request_metrics.bytes_received)
+            if request_metrics.serialized_time is not None:
+                stats.request_size.record(request_metrics.bytes_sent)
+
+    def add_gauge(self, name, description, getter, metric_type='gauge'):
+        """
+        Export the current value of `getter()` as the gauge `name`, e.g. the limit of a concurrency limiter.
+        Use `metric_type='counter'` for values which only increase.
+        """
+        self._gauges.append((name, description, getter, metric_type))
+
+    def gauges(self):
+        """
+        Return a dict mapping the gauges names to their current value.
+        """
+        return {name: getter() for name, description, getter, metric_type in self._gauges}
+
+    def quantile(self, method, resource, q, resource_prefix='', histogram='latency', min_count=1):
+        """
+        Return the quantile `q` of a histogram of the endpoint of `resource`,
+        `None` if less than `min_count` values have been recorded.
+        """
+        key = (method.upper(), endpoint_label(resource, resource_prefix))
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None or getattr(stats, histogram).count < min_count:
+                return None
+            return getattr(stats, histogram).quantile(q)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def snapshot(self, reset=False):
+        """
+        Return a dict mapping 'METHOD endpoint' to the stats of the endpoint, see `EndpointStats.to_dict()`.
+
+        :param reset (optional): If True, all the metrics are cleared after the snapshot.
+        :type reset: bool
+        """
+        with self._lock:
+            endpoints = self._endpoints
+            result = {'{} {}'.format(*key): stats.to_dict() for key, stats in endpoints.items()}
+            if reset:
+                self._endpoints = {}
+        return result
+
+    def to_prometheus(self, prefix='deepomatic_client'):
+        """
+        Export the metrics in the Prometheus text exposition format.
+        Histograms are exported as summaries with the quantiles 0.5, 0.9, 0.99 and 0.999.
+        """
+        with self._lock:
+            endpoints = [stats.to_dict() for key, stats in sorted(self._endpoints.items())]
+
+        lines = []
+
+        def add_metric(name, metric_type, description, samples):
+            name = prefix + '_' + name
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            for suffix, labels, value in samples:
+                labels = '{{{}}}'.format(_format_labels(labels)) if labels else ''
+                lines.append('{}{}{} {}'.format(name, suffix, labels, _format_value(value)))
+
+        def counter(name, description, field):
+            samples = []
+            for stats in endpoints:
+                labels = [('method', stats['method']), ('endpoint', stats['endpoint'])]
+                samples.append(('', labels, stats[field]))
+            add_metric(name, 'counter', description, samples)
+
+        def labeled_counter(name, description, field, label):
+            samples = []
+            for stats in endpoints:
+                for value, count in sorted(stats[field].items()):
+                    labels = [('method', stats['method']), ('endpoint', stats['endpoint']), (label, value)]
+                    samples.append(('', labels, count))
+            add_metric(name, 'counter', description, samples)
+
+        def summary(name, description, field):
+            samples = []
+            for stats in endpoints:
+                labels = [('method', stats['method']), ('endpoint', stats['endpoint'])]
+                histogram = stats[field]
+                for q, key in QUANTILES:
+                    samples.append(('', labels + [('quantile', '{:g}'.format(q))], histogram[key]))
+                samples.append(('_sum', labels, histogram['sum']))
+                samples.append(('_count', labels, histogram['count']))
+            add_metric(name, 'summary', description, samples)
+
+        counter('requests_total', 'Number of requests.', 'requests')
+        counter('attempts_total', 'Number of HTTP attempts, including retries.', 'attempts')
+        labeled_counter('responses_total', 'Number of responses by status code.', 'status_codes', 'status')
+        labeled_counter('errors_total', 'Number of failed requests by exception type.', 'errors', 'type')
+        labeled_counter('retries_total', 'Number of retries by cause (status code or exception type).', 'retries', 'cause')
+        counter('sent_bytes_total', 'Request bodies bytes sent, including retries.', 'bytes_sent')
+        counter('received_bytes_total', 'Response bodies bytes received.', 'bytes_received')
+        summary('request_duration_seconds', 'End to end duration of requests, including retries.', 'latency')
+        summary('serialization_duration_seconds', 'Duration of the request body serialization.', 'serialization')
+        summary('network_duration_seconds', 'Duration of each HTTP attempt.', 'network')
+        summary('retry_wait_seconds', 'Time spent waiting between retries, for retried requests.', 'retry_wait')
+        summary('deserialization_duration_seconds', 'Duration of the response parsing.', 'deserialization')
+        summary('request_size_bytes', 'Size of request bodies.', 'request_size')
+        summary('response_size_bytes', 'Size of response bodies.', 'response_size')
+        for name, description, getter, metric_type in self._gauges:
+            add_metric(name, metric_type, description, [('', [], getter())])
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    return ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for key, value in labels)
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    return '{!r}'.format(value) if isinstance(value, float) else str(value)
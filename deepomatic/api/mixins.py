@@ -59,7 +59,15 @@ class UpdateOnlyArg(Arg):
 class UpdatableResource(object):
     def update(self, replace=False, content_type='application/json', files=None, **kwargs):
         assert (self._pk is not None)
+        self._check_update_kwargs(kwargs)
 
+        if replace:
+            self._data = self._helper.put(self._uri(pk=self._pk), data=kwargs, content_type=content_type, files=files)
+        else:
+            self._data = self._helper.patch(self._uri(pk=self._pk), data=kwargs, content_type=content_type, files=files)
+        self._helper.invalidate_cache(self._uri(pk=self._pk))
+
+    def _check_update_kwargs(self, kwargs):
         if self._helper.check_query_parameters:
             for arg_name in kwargs:
                 if arg_name not in self.object_template:
@@ -68,24 +76,29 @@ class UpdatableResource(object):
                 if not arg._mutable and arg_name in kwargs:
                     raise DeepomaticException("Immutable keyword argument: " + arg_name)
 
-        if replace:
-            self._data = self._helper.put(self._uri(pk=self._pk), data=kwargs, content_type=content_type, files=files)
-        else:
-            self._data = self._helper.patch(self._uri(pk=self._pk), data=kwargs, content_type=content_type, files=files)
-
 
 ###############################################################################
 
 class DeletableResource(object):
     def delete(self):
         assert (self._pk is not None)
-        return self._helper.delete(self._uri(pk=self._pk))
+        result = self._helper.delete(self._uri(pk=self._pk))
+        self._helper.invalidate_cache(self._uri(pk=self._pk))
+        return result
 
 
 ###############################################################################
 
 class CreateableResource(object):
     def create(self, content_type='application/json', files=None, **kwargs):
+        content_type, post_kwargs = self._prepare_create_kwargs(content_type, files, kwargs)
+        data = self._helper.post(self._uri(), data=kwargs,
+                                 content_type=content_type,
+                                 files=files, **post_kwargs)
+        self._helper.invalidate_cache(self._uri(), collection=True)
+        return self.__class__(self._helper, pk=data['id'], data=data)
+
+    def _prepare_create_kwargs(self, content_type, files, kwargs):
         post_kwargs = {}
         # TODO: this is a hack, kwargs shouldn't be the data to post
         # it should be the requests kwargs
@@ -107,10 +120,7 @@ class CreateableResource(object):
         if files is not None:
             content_type = 'multipart/mixed'
 
-        data = self._helper.post(self._uri(), data=kwargs,
-                                 content_type=content_type,
-                                 files=files, **post_kwargs)
-        return self.__class__(self._helper, pk=data['id'], data=data)
+        return content_type, post_kwargs
 
 
 ###############################################################################
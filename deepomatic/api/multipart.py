@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import binascii
+import io
+import os
+
+from deepomatic.api.exceptions import DeepomaticException
+from requests.utils import guess_filename
+from six import string_types
+
+
+###############################################################################
+
+def _format_header_param(name, value):
+    # Same quoting as urllib3 (WHATWG HTML Standard): only \n, \r and " are percent encoded
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    value = value.translate({10: '%0A', 13: '%0D', 34: '%22'})
+    return '{}="{}"'.format(name, value)
+
+
+def _file_size(fileobj):
+    try:
+        return os.fstat(fileobj.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+class MultipartEncoder(object):
+    """
+    Streaming `multipart/form-data` body, encoded the same way as `requests` does for `files`.
+    Instead of building the whole body in memory, file objects are read by chunks of `chunk_size` bytes
+    while the request is sent, so the memory used per request is bounded whatever the payload size.
+
+    The body length is computed up front so that requests sends a `Content-Length` header.
+    Files must be seekable and opened in binary mode: `rewind()` is called before each retry to send the same body again.
+
+    :param fields (optional): dict of form fields, values are sent as strings.
+    :type fields: dict
+    :param files (optional): dict of files, as accepted by `requests`: a value is either a file object, bytes,
+        or a tuple (filename, fileobj or value, content_type).
+    :type files: dict
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, fields=None, files=None, boundary=None):
+        self.boundary = boundary or binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.content_type = 'multipart/form-data; boundary={}'.format(self.boundary)
+
+        # list of tuples (headers, body) with `body` being bytes or a seekable file object
+        self._parts = []
+        for key, value in (fields or {}).items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for v in values:
+                if v is not None:
+                    self._add_part(key, v if isinstance(v, bytes) else str(v))
+
+        for key, value in (files or {}).items():
+            content_type = None
+            if isinstance(value, (tuple, list)):
+                filename, value, content_type = value
+            else:
+                filename = guess_filename(value) or key
+            if value is None:
+                continue
+            self._add_part(key, value, filename, content_type)
+
+        self._closing = '--{}--\r\n'.format(self.boundary).encode('latin-1')
+        self._length = self._compute_length()
+        self.rewind()
+
+    def _add_part(self, name, body, filename=None, content_type=None):
+        disposition = 'form-data; ' + _format_header_param('name', name)
+        if filename is not None:
+            disposition += '; ' + _format_header_param('filename', filename)
+        headers = '--{}\r\nContent-Disposition: {}\r\n'.format(self.boundary, disposition)
+        if content_type:
+            headers += 'Content-Type: {}\r\n'.format(content_type)
+        headers += '\r\n'
+
+        if isinstance(body, string_types):
+            body = body.encode('utf-8')
+        elif isinstance(body, (int, float)):  # bool is an int
+            body = str(body).encode('utf-8')
+        elif isinstance(body, bytearray):
+            body = bytes(body)
+        elif not isinstance(body, bytes):
+            error = "Unsupported file object type '{}' for key '{}'".format(type(body), name)
+            if not hasattr(body, 'read') or not hasattr(body, 'seek'):
+                raise DeepomaticException("{}: not a scalar or seekable.".format(error))
+            if hasattr(body, 'seekable') and not body.seekable():
+                raise DeepomaticException("{}: not seekable".format(error))
+            if isinstance(body, io.TextIOBase):
+                # its size in bytes is unknown before reading it
+                raise DeepomaticException("{}: opened in text mode, open it in binary mode".format(error))
+        self._parts.append((headers.encode('utf-8'), body))
+
+    def _compute_length(self):
+        length = len(self._closing)
+        for headers, body in self._parts:
+            length += len(headers) + 2  # trailing \r\n
+            length += len(body) if isinstance(body, bytes) else _file_size(body)
+        return length
+
+    def __len__(self):
+        return self._length
+
+    def rewind(self):
+        """
+        Restart the body from the beginning, this seeks all files to their start.
+        """
+        for _, body in self._parts:
+            if not isinstance(body, bytes):
+                body.seek(0)
+        self._chunks = self._iter_chunks()
+        self._buffer = memoryview(b'')
+
+    def _iter_chunks(self):
+        for headers, body in self._parts:
+            yield headers
+            if isinstance(body, bytes):
+                yield body
+            else:
+                while True:
+                    chunk = body.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            yield b'\r\n'
+        yield self._closing
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return bytes(self._buffer) + b''.join(self._chunks)
+
+        chunks = []
+        while size > 0:
+            if not self._buffer:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._buffer = memoryview(chunk)
+            chunks.append(self._buffer[:size])
+            size -= len(chunks[-1])
+            self._buffer = self._buffer[len(chunks[-1]):]
+        return b''.join(chunks)
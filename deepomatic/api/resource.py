@@ -43,12 +43,27 @@ class Resource(object):
     def get_base_uri(self, pk, **kwargs):
         raise DeepomaticException('Unimplemented')
 
+    # Time in seconds during which a retrieved resource is served by the client response cache without any request,
+    # 0 to always revalidate it with a conditional request, `None` to never cache it. See `http_cache.ResponseCache`.
+    cache_ttl = 0
+
+    @classmethod
+    def _cache_kwargs(cls, helper, is_list=False):
+        cache = getattr(helper, 'response_cache', None)
+        if cache is None:
+            return {}
+        ttl = cache.get_ttl(cls)
+        if ttl is None:
+            return {}
+        # even if the resources do not change, the content of their lists does: always revalidate lists
+        return {'cache_ttl': 0 if is_list else ttl}
+
     def retrieve(self, pk):
         return self.__class__(self._helper, pk=pk)
 
     def refresh(self):
         assert (self._pk is not None)
-        self._data = self._helper.get(self._uri(pk=self._pk))
+        self._data = self._helper.get(self._uri(pk=self._pk), **self._cache_kwargs(self._helper))
         return self
 
     def data(self, no_raise=False, no_refresh=False):
@@ -115,7 +130,7 @@ class ResourceList(Resource):
             params['offset'] = offset
         if limit is not None:
             params['limit'] = limit
-        data = helper.get(uri, params=params)
+        data = helper.get(uri, params=params, **resource_class._cache_kwargs(helper, is_list=True))
         super(ResourceList, self).__init__(helper, data=data)
         self._resource_class = resource_class
 
@@ -22,7 +22,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-import numpy as np
+import base64
+import io
+
+from deepomatic.api.exceptions import DeepomaticException
 from deepomatic.api.http_helper import RequestsTimeout
 from deepomatic.api.inference import InferenceResource
 from deepomatic.api.mixins import (CreateableResource, DeletableResource,
@@ -34,6 +37,63 @@ from six import string_types
 
 ###############################################################################
 
+# Tensor encodings decoded without any per-element work, see `tensor_to_numpy`
+#   - 'base64': the base64 of the raw little-endian buffer, `dtype` gives its type
+#   - 'npy': the base64 of the tensor saved in the NumPy `.npy` format
+BINARY_TENSOR_ENCODINGS = ['base64', 'npy']
+
+
+def tensor_to_numpy(tensor, dtype=None):
+    """
+    Convert a tensor from a `Network.inference` result to a numpy array.
+    Binary tensors (see `BINARY_TENSOR_ENCODINGS`) are wrapped with `np.frombuffer`
+    without copy: the returned array is read-only, unless `dtype` differs from the type of the tensor
+    in which case it is a converted copy.
+    Tensors as JSON lists are converted in one pass when `dtype` is known.
+    """
+    # imported on first use: numpy is slow to import and only needed by `Network.inference`
+    import numpy as np
+
+    data = tensor['data']
+    encoding = tensor.get('encoding')
+    if encoding is not None:
+        if encoding not in BINARY_TENSOR_ENCODINGS:
+            raise DeepomaticException("Unknown tensor encoding '{}'".format(encoding))
+        buffer = base64.b64decode(data) if isinstance(data, string_types) else data
+        if encoding == 'npy':
+            array = _npy_frombuffer(np, buffer)
+        else:
+            array = np.frombuffer(buffer, dtype=np.dtype(tensor['dtype']).newbyteorder('<'))
+        if dtype is not None:
+            array = array.astype(dtype, copy=False)
+    else:
+        dtype = dtype or tensor.get('dtype')
+        if dtype is None:
+            array = np.array(data)
+        elif data and isinstance(data[0], list):
+            array = np.array(data, dtype=dtype)
+        else:
+            # flat list: no need to guess the type and shape of each element
+            array = np.fromiter(data, dtype=dtype, count=len(data))
+    return array.reshape(tensor['shape'])
+
+
+def _npy_frombuffer(np, buffer):
+    # same as `np.load` with `allow_pickle=False`, without copying the data after the header
+    header = io.BytesIO(buffer)
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    if dtype.hasobject:
+        raise DeepomaticException("Tensors of Python objects are not supported")
+    count = 1
+    for dim in shape:
+        count *= dim
+    array = np.frombuffer(buffer, dtype=dtype, count=count, offset=header.tell())
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
 
 class Network(ListableResource,
               CreateableResource,
@@ -58,16 +118,59 @@ class Network(ListableResource,
         public = public or isinstance(pk, string_types)
         return '/networks/public/' if public else '/networks/'
 
-    def inference(self, convert_to_numpy=True, return_task=False, **kwargs):
+    def inference(self, convert_to_numpy=True, return_task=False, dtype=None, tensor_encoding=None, **kwargs):
+        """
+        :param convert_to_numpy (optional): return a dict of numpy arrays indexed by tensor name. Defaults to True.
+        :type convert_to_numpy: bool
+        :param dtype (optional): numpy dtype of the returned arrays, avoids guessing it from the values.
+        :type dtype: numpy.dtype or string
+        :param tensor_encoding (optional): ask the API to send the tensors in a binary encoding
+            (one of `BINARY_TENSOR_ENCODINGS`) instead of JSON lists. Tensors are decoded whatever
+            the encoding the API answers with.
+        :type tensor_encoding: string
+        """
         if convert_to_numpy:
             return_task = False
+        if tensor_encoding is not None:
+            kwargs['tensor_encoding'] = tensor_encoding
         result = super(Network, self).inference(return_task=return_task, **kwargs)
 
         if convert_to_numpy:
-            return self._convert_result_to_numpy(result)
+            return self._convert_result_to_numpy(result, dtype)
         else:
             return result
 
+    def inference_async(self, convert_to_numpy=True, return_task=False, dtype=None, tensor_encoding=None,
+                        timeout=60, **kwargs):
+        if tensor_encoding is not None:
+            kwargs['tensor_encoding'] = tensor_encoding
+
+        def transform(task):
+            if convert_to_numpy:
+                return self._convert_result_to_numpy(task['data'], dtype)
+            return task if return_task else task['data']
+
+        return self._inference_async(transform, timeout, kwargs)
+
+    def batch_inference(self, inputs_list, convert_to_numpy=True, return_task=False, dtype=None, tensor_encoding=None, **kwargs):
+        """
+        See `InferenceResource.batch_inference`. With `wait_task=False`, the tasks are returned: `convert_to_numpy`
+        is ignored.
+        """
+        if not kwargs.get('wait_task', True):
+            convert_to_numpy = False
+        if convert_to_numpy:
+            return_task = False
+        if tensor_encoding is not None:
+            kwargs['tensor_encoding'] = tensor_encoding
+        results = super(Network, self).batch_inference(inputs_list, return_task=return_task, **kwargs)
+
+        if convert_to_numpy:
+            return [result if isinstance(result, Exception) else self._convert_result_to_numpy(result, dtype)
+                    for result in results]
+        else:
+            return results
+
     def create(self, *args, **kwargs):
         # No retry on Network.create() errors by default as this is a large request
         kwargs['http_retry'] = kwargs.get('http_retry', None)
@@ -75,8 +178,8 @@ class Network(ListableResource,
         return super(Network, self).create(*args, **kwargs)
 
     @staticmethod
-    def _convert_result_to_numpy(result):
+    def _convert_result_to_numpy(result, dtype=None):
         new_result = {}
         for tensor in result['tensors']:
-            new_result[tensor['name']] = np.array(tensor['data']).reshape(tensor['shape'])
+            new_result[tensor['name']] = tensor_to_numpy(tensor, dtype)
         return new_result
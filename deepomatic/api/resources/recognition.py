@@ -71,6 +71,9 @@ class RecognitionVersion(CreateableResource,
     """
     base_uri = '/recognition/versions/'
 
+    # a version can not be modified once created
+    cache_ttl = 3600
+
     object_template = {
         'spec_id': RequiredArg(),
         'network_id': RequiredArg(),
@@ -25,15 +25,22 @@ THE SOFTWARE.
 
 import functools
 import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from six.moves import queue
 
 from deepomatic.api.exceptions import (TaskError, TaskTimeout, HTTPRetryError,
                                        TaskRetryError, DeepomaticException)
+from deepomatic.api.http_retry import stop_if_retry_budget_exhausted
 from deepomatic.api.mixins import ListableResource
 from deepomatic.api.resource import Resource
 from deepomatic.api.utils import retry, warn_on_http_retry_error
 from tenacity import (RetryError, retry_if_exception_type, retry_if_result,
                       stop_after_delay, wait_chain, wait_fixed, stop_never,
                       wait_random_exponential)
+from tenacity.stop import stop_any
 
 logger = logging.getLogger(__name__)
 
@@ -53,26 +60,41 @@ def is_success_status(status):
     return status == 'success'
 
 
+# Maximum number of task ids per `Task.list(task_ids=...)` request, the default page size of the API
+DEFAULT_CHUNK_SIZE = 100
+
+
 def has_pending_tasks(pending_tasks):
     return len(pending_tasks) > 0
 
 
-def retry_get_tasks(apply_func, retry_if, timeout=60,
-                    wait_exp_multiplier=0.05, wait_exp_max=1.0):
+def get_tasks_retry_strategy(timeout=60, wait_exp_multiplier=0.05, wait_exp_max=1.0, retry_budget=None):
     if timeout is None:
         stop = stop_never
     else:
         stop = stop_after_delay(timeout)
+    if retry_budget is not None:
+        # polling a pending task is free, retrying after an `HTTPRetryError` is charged to the budget
+        stop = stop_any(stop, stop_if_retry_budget_exhausted(retry_budget, exceptions_only=True))
 
     wait = wait_chain(wait_fixed(0.05),
                       wait_fixed(0.1) + wait_random_exponential(multiplier=wait_exp_multiplier,
                                                                 max=min(timeout, wait_exp_max)))
+    return wait, stop
+
+
+def retry_get_tasks(apply_func, retry_if, timeout=60,
+                    wait_exp_multiplier=0.05, wait_exp_max=1.0, retry_budget=None):
+    wait, stop = get_tasks_retry_strategy(timeout, wait_exp_multiplier, wait_exp_max, retry_budget)
     return retry(apply_func, retry_if, wait, stop, retry_error_cls=TaskRetryError)
 
 
 class Task(ListableResource, Resource):
     base_uri = '/tasks/'
 
+    # the status of a task is polled until it is complete
+    cache_ttl = None
+
     def list(self, task_ids):
         """
         Returns a list of tasks
@@ -83,12 +105,23 @@ class Task(ListableResource, Resource):
     def wait(self, **retry_kwargs):
         """
         Wait until task is completed. Expires after 'timeout' seconds.
+        If the client has a `TaskPoller`, the status is refreshed by the poller with the other waited tasks.
         """
+        task_poller = getattr(self._helper, 'task_poller', None)
+        if task_poller is not None:
+            future = task_poller.submit(self, timeout=retry_kwargs.get('timeout', 60))
+            try:
+                self._data = future.result()._data
+            except (TaskError, TaskTimeout) as e:
+                self._data = e.task
+                raise
+            return self
+
         try:
             retry_get_tasks(self._refresh_status,
                             retry_if_exception_type(HTTPRetryError)
                             | retry_if_result(is_pending_status),
-                            **retry_kwargs)
+                            **self._with_retry_budget(retry_kwargs))
         except TaskRetryError as retry_error:
             raise TaskTimeout(self._data, retry_error)
 
@@ -97,24 +130,63 @@ class Task(ListableResource, Resource):
 
         return self
 
+    def _with_retry_budget(self, retry_kwargs):
+        # the retries of `Task.wait()` after an `HTTPRetryError` share the retry budget of the client
+        http_retry = self._helper.http_retry
+        if http_retry is not None and http_retry.retry_budget is not None:
+            retry_kwargs.setdefault('retry_budget', http_retry.retry_budget)
+        return retry_kwargs
+
     def _refresh_status(self):
         logger.debug("Refreshing Task {}".format(self))
         warn_on_http_retry_error(self.refresh, suffix="Retrying until Task.wait timeouts.", reraise=True)
         return self._data['status']
 
-    def _refresh_tasks_status(self, pending_tasks, success_tasks, error_tasks, positions):
-        logger.debug("Refreshing batch of Task {}".format(pending_tasks))
+    def _list_tasks(self, task_ids):
+        return list(self.list(task_ids=task_ids))
+
+    def _refresh_tasks_status(self, pending_tasks, success_tasks, error_tasks,
+                              chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None):
+        logger.debug("Refreshing batch of {} Task".format(len(pending_tasks)))
         task_ids = [task.pk for idx, task in pending_tasks]
-        functor = functools.partial(self.list, task_ids=task_ids)
-        refreshed_tasks = warn_on_http_retry_error(functor, suffix="Retrying until Task.batch_wait timeouts.", reraise=True)
+        chunks = [task_ids[i:i + chunk_size] for i in range(0, len(task_ids), chunk_size)]
+
+        def refresh_chunk(chunk):
+            functor = functools.partial(self._list_tasks, chunk)
+            try:
+                return warn_on_http_retry_error(functor, suffix="Retrying until Task.batch_wait timeouts.", reraise=True), None
+            except Exception as e:
+                return [], e
+
+        if len(chunks) <= 1:
+            results = [refresh_chunk(chunk) for chunk in chunks]
+        else:
+            max_workers = min(len(chunks), max_workers or self._helper.pool_maxsize)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(refresh_chunk, chunks))
+
+        # the tasks of the chunks which have been refreshed are dispatched even if another chunk failed
+        refreshed_tasks = [task for chunk_tasks, _ in results for task in chunk_tasks]
+        self._dispatch_tasks_status(refreshed_tasks, pending_tasks, success_tasks, error_tasks)
+        for _, exception in results:
+            if exception is not None:
+                raise exception
+        return pending_tasks
 
-        pending_tasks[:] = []  # clear the list (we have to keep the reference)
-        for task in refreshed_tasks:
+    @staticmethod
+    def _dispatch_tasks_status(refreshed_tasks, pending_tasks, success_tasks, error_tasks):
+        refreshed_tasks = {task.pk: task for task in refreshed_tasks}
+        still_pending_tasks = []
+        for pos, pending_task in pending_tasks:
+            task = refreshed_tasks.get(pending_task.pk)
+            if task is None:
+                # not refreshed (missing from the response or its chunk failed), keep it pending
+                still_pending_tasks.append((pos, pending_task))
+                continue
             status = task['status']
-            pos = positions[task.pk]
 
             if is_pending_status(status):
-                pending_tasks.append((pos, task))
+                still_pending_tasks.append((pos, task))
             elif is_error_status(status):
                 error_tasks.append((pos, task))
             elif is_success_status(status):
@@ -122,36 +194,234 @@ class Task(ListableResource, Resource):
             else:
                 raise DeepomaticException("Unknown task status %s" % status)
 
+        pending_tasks[:] = still_pending_tasks  # we have to keep the reference
         return pending_tasks
 
-    def batch_wait(self, tasks, **retry_kwargs):
+    def batch_wait(self, tasks, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, **retry_kwargs):
         """
         Wait until a list of task are completed. Expires after 'timeout' seconds.
 
         Returns a tuple of list (pending_tasks, success_tasks, error_tasks).
         Each list contains a couple (original_position, task) sorted by original_position asc
         original_position gives the original index in the input tasks list parameter. This helps to keep the order.
+
+        Pending tasks are refreshed by chunks of `chunk_size` task ids, with up to `max_workers` concurrent
+        requests (defaults to the client `pool_maxsize`). Completed tasks are not refreshed anymore.
         """
         retry_kwargs['timeout'] = retry_kwargs.get('timeout', 300)
+        pending_tasks = list(enumerate(tasks))
+        success_tasks = []
+        error_tasks = []
         try:
-            positions = {}
-            pending_tasks = []
-            for pos, task in enumerate(tasks):
-                positions[task.pk] = pos
-                pending_tasks.append((pos, task))
-            success_tasks = []
-            error_tasks = []
-
             functor = functools.partial(self._refresh_tasks_status, pending_tasks,
-                                        success_tasks, error_tasks, positions)
+                                        success_tasks, error_tasks, chunk_size, max_workers)
             retry_get_tasks(functor, retry_if_result(has_pending_tasks), **retry_kwargs)
 
         except RetryError:
             pass
 
-        return (sorted(pending_tasks, key=lambda v: v[0]),
+        # pending_tasks is still in the original order, completed tasks are sorted only once
+        return (pending_tasks,
                 sorted(success_tasks, key=lambda v: v[0]),
                 sorted(error_tasks, key=lambda v: v[0]))
 
+    def as_completed(self, tasks, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None, **retry_kwargs):
+        """
+        Yield a couple (original_position, task) as soon as each task is completed (status success or error).
+        Expires after 'timeout' seconds: tasks still pending at this time are not yielded.
+
+        Tasks are refreshed per batch as in `batch_wait`, in a background thread:
+        polling continues while the caller processes the completed tasks.
+        original_position gives the original index in the input tasks list parameter.
+        """
+        retry_kwargs['timeout'] = retry_kwargs.get('timeout', 300)
+        pending_tasks = list(enumerate(tasks))
+
+        completed = queue.Queue()
+        stopped = threading.Event()
+        end_of_polling = object()
+
+        def refresh():
+            if stopped.is_set():
+                # the generator has been closed, stop polling
+                pending_tasks[:] = []
+                return pending_tasks
+            success_tasks = []
+            error_tasks = []
+            self._refresh_tasks_status(pending_tasks, success_tasks, error_tasks, chunk_size, max_workers)
+            for completed_task in sorted(success_tasks + error_tasks, key=lambda v: v[0]):
+                completed.put(completed_task)
+            return pending_tasks
+
+        def poll():
+            try:
+                retry_get_tasks(refresh, retry_if_result(has_pending_tasks), **retry_kwargs)
+            except RetryError:
+                pass
+            except Exception as e:
+                completed.put(e)
+            finally:
+                completed.put(end_of_polling)
+
+        if not pending_tasks:
+            return
+
+        thread = threading.Thread(target=poll, name='deepomatic-task-as-completed')
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = completed.get()
+                if item is end_of_polling:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+
+###############################################################################
+
+class TaskPoller(object):
+    """
+    Refresh the status of all the waited tasks of a client with a few batched `Task.list(task_ids=...)`
+    requests per tick, from a background thread. The number of status requests grows with the number
+    of ticks instead of the number of waited tasks.
+
+    The thread is started when a task is submitted and stops when there is no more task to wait for.
+
+    :param helper: the client `HTTPHelper`.
+    :param interval (optional): time between two refreshes in seconds. Defaults to 0.1.
+    :type interval: float
+    :param batch_size (optional): maximum number of task ids per `Task.list` request. Defaults to 100.
+    :type batch_size: int
+    """
+
+    def __init__(self, helper, interval=0.1, batch_size=100):
+        self._helper = helper
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._thread = None
+        # task id => list of couples (future, deadline)
+        self._waiters = {}
+        # task id => last data of the pending tasks, for `TaskTimeout`
+        self._pending_data = {}
+
+    _for_helper_lock = threading.Lock()
+
+    @classmethod
+    def for_helper(cls, helper):
+        """
+        Return the `TaskPoller` of the client if it has one, otherwise a poller dedicated to this `helper`
+        created on first use, which doesn't change the behavior of `Task.wait()`.
+        The poller is stored on the helper, so that both are garbage collected with the client.
+        """
+        if getattr(helper, 'task_poller', None) is not None:
+            return helper.task_poller
+        with cls._for_helper_lock:
+            task_poller = getattr(helper, '_task_poller', None)
+            if task_poller is None:
+                task_poller = helper._task_poller = cls(helper)
+        return task_poller
+
+    def submit(self, task, timeout=60):
+        """
+        Register `task` and return a `concurrent.futures.Future` which result is the refreshed `Task` once completed.
+        The future raises `TaskError` if the task is in error and `TaskTimeout` if it is still pending after `timeout`
+        seconds (`None` to wait forever).
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            self._waiters.setdefault(task.pk, []).append((future, deadline))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='deepomatic-task-poller')
+                self._thread.daemon = True
+                self._thread.start()
+        return future
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._waiters)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    self._thread = None
+                    return
+                task_ids = list(self._waiters)
+
+            for i in range(0, len(task_ids), self.batch_size):
+                self._refresh(task_ids[i:i + self.batch_size])
+            self._expire()
+            time.sleep(self.interval)
+
+    def _refresh(self, task_ids):
+        logger.debug("TaskPoller refreshing {} tasks".format(len(task_ids)))
+        try:
+            functor = functools.partial(list, Task(self._helper).list(task_ids=task_ids))
+            refreshed_tasks = warn_on_http_retry_error(functor, suffix="Retrying at next TaskPoller tick.", reraise=False)
+        except Exception as e:
+            # not retryable, fail the waiters of this batch
+            self._resolve([(waiters, None, e) for waiters in self._pop_waiters(task_ids)])
+            return
+
+        completed = []
+        for task in refreshed_tasks or []:
+            status = task['status']
+            if is_pending_status(status):
+                with self._lock:
+                    self._pending_data[task.pk] = task._data
+                continue
+            if is_success_status(status):
+                result, exception = task, None
+            elif is_error_status(status):
+                result, exception = None, TaskError(task._data)
+            else:
+                result, exception = None, DeepomaticException("Unknown task status %s" % status)
+            completed.append((task.pk, result, exception))
+
+        waiters = self._pop_waiters([task_id for task_id, _, _ in completed])
+        self._resolve([(w, result, exception) for w, (_, result, exception) in zip(waiters, completed)])
+
+    def _expire(self):
+        now = time.time()
+        expired = []
+        with self._lock:
+            for task_id in list(self._waiters):
+                remaining = []
+                for future, deadline in self._waiters[task_id]:
+                    if deadline is not None and now >= deadline:
+                        data = self._pending_data.get(task_id, {'id': task_id})
+                        expired.append(([(future, deadline)], None, TaskTimeout(data)))
+                    else:
+                        remaining.append((future, deadline))
+                if remaining:
+                    self._waiters[task_id] = remaining
+                else:
+                    del self._waiters[task_id]
+                    self._pending_data.pop(task_id, None)
+        self._resolve(expired)
+
+    def _pop_waiters(self, task_ids):
+        with self._lock:
+            for task_id in task_ids:
+                self._pending_data.pop(task_id, None)
+            return [self._waiters.pop(task_id, []) for task_id in task_ids]
+
+    @staticmethod
+    def _resolve(resolutions):
+        # futures callbacks are called here, outside of the lock
+        for waiters, result, exception in resolutions:
+            for future, _ in waiters:
+                if exception is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(exception)
+
 
 ###############################################################################
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+###############################################################################
+
+class SingleFlight(object):
+    """
+    Deduplicate concurrent calls: while a call for a key is in flight, the other calls for the same key
+    wait for it and share its result (or its exception) instead of doing the work again.
+    """
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, functor):
+        """
+        Call `functor` unless a call for `key` is in flight, in which case wait for its result.
+        Returns a tuple (result, shared), `shared` is True if the same result is also returned to other callers,
+        including to the caller which started the call: it must not be mutated, callers must copy it first.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                call.followers = 0
+            else:
+                call.followers += 1
+                self.coalesced += 1
+
+        if not leader:
+            return call.result(), True
+
+        try:
+            result = functor()
+        except BaseException as e:
+            self._done(key)
+            call.set_exception(e)
+            raise
+        self._done(key)
+        # no caller joins the call after `_done`: `followers` is final
+        call.set_result(result)
+        return result, call.followers > 0
+
+    def _done(self, key):
+        # the calls arriving from now on start a new flight
+        with self._lock:
+            del self._calls[key]
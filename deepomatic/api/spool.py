@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2018 Deepomatic SAS
+http://www.deepomatic.com/
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import base64
+import collections
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from deepomatic.api.exceptions import (CircuitOpenError, ClientError, HTTPRetryError,
+                                       ServerError, SpoolFullError)
+from deepomatic.api.resources.task import Task
+from requests.exceptions import ConnectionError, Timeout
+
+logger = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = '.req'
+TMP_SUFFIX = '.tmp'
+
+# the binary values of the spooled requests are stored as {BYTES_KEY: base64 string}
+BYTES_KEY = '$base64'
+
+
+###############################################################################
+
+def is_transient_error(exception):
+    """
+    Return True if a request failed because the API is unavailable: it is sent again later.
+    The other errors of `requests`, e.g. `InvalidURL`, would fail again.
+    """
+    if isinstance(exception, (ConnectionError, Timeout, ServerError, CircuitOpenError, HTTPRetryError)):
+        return True
+    if isinstance(exception, ClientError):
+        return exception.response.status_code in (408, 429)
+    return False
+
+
+def _encode_files(value):
+    # the spool keeps the content of the file objects, binary values are encoded to be stored as JSON
+    if hasattr(value, 'read'):
+        value = value.read()
+    if isinstance(value, (bytes, bytearray)):
+        return {BYTES_KEY: base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        return {key: _encode_files(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_files(item) for item in value]
+    return value
+
+
+def _decode_files(value):
+    if isinstance(value, dict):
+        if list(value) == [BYTES_KEY]:
+            return base64.b64decode(value[BYTES_KEY])
+        return {key: _decode_files(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_files(item) for item in value]
+    return value
+
+
+###############################################################################
+
+class InferenceSpool(object):
+    """
+    Durable queue of inference requests: `submit()` writes the request to a file of `directory` and returns
+    at once, background threads send the requests to the API in submission order at a controlled rate.
+    When the API is unavailable (connection errors, 5xx, 429), sending is paused and retried with an exponential
+    backoff until the API is healthy again, the requests wait on disk, also across process restarts:
+    the requests found in `directory` are sent when the spool starts. They are stored as JSON, binary data in base64.
+
+    Each request is removed from disk once the API accepted it and `on_submitted(entry_id, task)` is called with
+    its `Task`. A request rejected by the API (e.g. 400) is removed and `on_error(entry_id, exception)` is called.
+    Requests are sent in submission order; with several `workers` they may be accepted out of order.
+    A request which failed `max_attempts` times is rejected if the API accepted other requests meanwhile,
+    otherwise it is sent again after the other spooled requests: it never blocks the queue.
+
+    :param client: the `Client` used to send the requests.
+    :type client: client.Client
+    :param directory: directory of the spooled requests, created if needed.
+    :type directory: string
+    :param max_size (optional): maximum size in bytes of the spooled requests, `submit()` raises a
+        `SpoolFullError` above it. Defaults to 1GB.
+    :type max_size: int
+    :param max_rate (optional): maximum number of requests sent per second. Defaults to `None`: no limit.
+    :type max_rate: float
+    :param workers (optional): number of threads sending the requests. Defaults to 1.
+    :type workers: int
+    :param on_submitted (optional): called with the entry id and the `Task` of each request accepted by the API.
+    :type on_submitted: callable
+    :param on_error (optional): called with the entry id and the exception of each request rejected by the API.
+    :type on_error: callable
+    :param min_backoff (optional): wait in seconds after the first failure of the API, doubled at each failure.
+        Defaults to 1.
+    :type min_backoff: float
+    :param max_backoff (optional): maximum wait in seconds between two attempts when the API is unavailable.
+        Defaults to 60.
+    :type max_backoff: float
+    :param max_attempts (optional): number of failures of a request before it is rejected or sent after the others.
+        Defaults to 5.
+    :type max_attempts: int
+    """
+    def __init__(self, client, directory, max_size=1024 * 1024 * 1024, max_rate=None, workers=1,
+                 on_submitted=None, on_error=None, min_backoff=1., max_backoff=60., max_attempts=5):
+        self._helper = getattr(client, 'http_helper', client)
+        self.directory = directory
+        self.max_size = max_size
+        self.max_rate = max_rate
+        self.workers = workers
+        self.on_submitted = on_submitted
+        self.on_error = on_error
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+
+        self.size = 0
+        # entry id => size of its file
+        self._entry_sizes = {}
+        self.submitted = 0
+        self.rejected = 0
+        self.failures = 0
+        self._entries = collections.deque()
+        self._in_flight = 0
+        self._next_send_time = 0.
+        self._retry_time = 0.
+        self._consecutive_failures = 0
+        # entry id => (number of failures, `submitted` at the first one) of the requests which failed
+        self._attempts = {}
+        self._stopped = False
+        self._threads = []
+        self._condition = threading.Condition()
+
+        os.makedirs(directory, exist_ok=True)
+        # requests spooled by a previous process, in submission order
+        self._next_id = 0
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(TMP_SUFFIX):
+                # partially written by a `submit()` interrupted by a crash
+                os.remove(os.path.join(self.directory, name))
+            elif name.endswith(ENTRY_SUFFIX):
+                entry_id = int(name[:-len(ENTRY_SUFFIX)])
+                self._entries.append(entry_id)
+                self._entry_sizes[entry_id] = os.path.getsize(self._path(entry_id))
+                self.size += self._entry_sizes[entry_id]
+                self._next_id = entry_id + 1
+
+    def __len__(self):
+        """
+        Return the number of requests not yet accepted by the API.
+        """
+        with self._condition:
+            return len(self._entries) + self._in_flight
+
+    @property
+    def healthy(self):
+        return self._consecutive_failures == 0
+
+    def _path(self, entry_id):
+        return os.path.join(self.directory, '{:020d}{}'.format(entry_id, ENTRY_SUFFIX))
+
+    def submit(self, resource, **kwargs):
+        """
+        Spool an inference request of `resource` (a spec, version or network) with the `inference()` parameters,
+        e.g. `spool.submit(spec, inputs=[ImageInput(url)])`. The request is written to disk before returning.
+
+        :return: the entry id of the request, given to `on_submitted` and `on_error`.
+        :rtype: int
+        """
+        content_type, data, files = resource._prepare_inference_kwargs(kwargs)
+        request = {
+            'uri': resource._uri(pk=resource._pk, suffix='/inference'),
+            'content_type': content_type,
+            'data': data,
+            'files': _encode_files(files),
+        }
+        content = json.dumps(request).encode('utf-8')
+
+        with self._condition:
+            if self.size + len(content) > self.max_size:
+                raise SpoolFullError(self.size, self.max_size)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entry_sizes[entry_id] = len(content)
+            self.size += len(content)
+
+        # written then renamed, and flushed to disk: a spooled request survives a crash
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(entry_id))
+        except BaseException:
+            with self._condition:
+                del self._entry_sizes[entry_id]
+                self.size -= len(content)
+            raise
+
+        with self._condition:
+            self._entries.append(entry_id)
+            self._condition.notify()
+        return entry_id
+
+    def start(self):
+        """
+        Start the threads sending the spooled requests.
+        """
+        with self._condition:
+            self._stopped = False
+        for i in range(self.workers - len(self._threads)):
+            thread = threading.Thread(target=self._run, name='deepomatic-spool-{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the threads once their current request is sent, the other requests stay on disk.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def join(self, timeout=None):
+        """
+        Wait until all the spooled requests are sent. Return False if `timeout` expired before.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._entries or self._in_flight:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _next_entry(self):
+        """
+        Wait for the next request to send, respecting the rate and the backoff. Return `None` when stopped.
+        """
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None
+                now = time.time()
+                wait_until = max(self._retry_time, self._next_send_time)
+                if self._entries and now >= wait_until:
+                    break
+                self._condition.wait(wait_until - now if self._entries else None)
+            entry_id = self._entries.popleft()
+            self._in_flight += 1
+            if self.max_rate:
+                self._next_send_time = max(now, self._next_send_time) + 1. / self.max_rate
+            return entry_id
+
+    def _run(self):
+        while True:
+            entry_id = self._next_entry()
+            if entry_id is None:
+                return
+            self._send(entry_id)
+
+    def _send(self, entry_id):
+        path = self._path(entry_id)
+        try:
+            with open(path, 'rb') as f:
+                request = json.loads(f.read().decode('utf-8'))
+            # no retry here: the spool retries when the API is healthy again
+            result = self._helper.post(request['uri'], content_type=request['content_type'],
+                                       data=request['data'], files=_decode_files(request['files']), http_retry=None)
+        except Exception as e:
+            if is_transient_error(e):
+                self._failed(entry_id, path, e)
+            else:
+                self._reject(entry_id, path, e)
+            return
+
+        self.submitted += 1
+        self._done(entry_id, path, success=True)
+        self._call(self.on_submitted, entry_id, Task(self._helper, pk=result['task_id']))
+
+    def _reject(self, entry_id, path, exception):
+        self.rejected += 1
+        logger.warning("Spooled request {} rejected: {}".format(entry_id, exception))
+        self._done(entry_id, path)
+        self._call(self.on_error, entry_id, exception)
+
+    @staticmethod
+    def _call(callback, entry_id, value):
+        # an error of the user callback must not stop the thread sending the requests
+        if callback is None:
+            return
+        try:
+            callback(entry_id, value)
+        except Exception:
+            logger.exception("Callback {} of spooled request {} failed".format(callback, entry_id))
+
+    def _failed(self, entry_id, path, exception):
+        with self._condition:
+            self.failures += 1
+            self._consecutive_failures += 1
+            backoff = min(self.max_backoff, self.min_backoff * 2 ** (self._consecutive_failures - 1))
+            self._retry_time = time.time() + backoff
+            attempts, submitted = self._attempts.get(entry_id, (0, self.submitted))
+            attempts += 1
+            rejected = False
+            if attempts < self.max_attempts:
+                # first in line when the API is healthy again
+                self._entries.appendleft(entry_id)
+                self._attempts[entry_id] = (attempts, submitted)
+            elif self.submitted == submitted:
+                # the API fails all the requests: sent again after the others
+                self._entries.append(entry_id)
+                self._attempts[entry_id] = (0, self.submitted)
+            else:
+                # the API accepts the other requests, this one would fail again
+                rejected = True
+            if not rejected:
+                self._in_flight -= 1
+                self._condition.notify_all()
+        if rejected:
+            self._reject(entry_id, path, exception)
+        else:
+            logger.warning("API unavailable, spooled requests are sent again in {:.1f}s: {}".format(backoff, exception))
+
+    def _done(self, entry_id, path, success=False):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # removed by hand, its request was rejected as it could not be read
+            pass
+        except OSError as e:
+            logger.warning("Could not remove spooled request {}: {}".format(entry_id, e))
+        finally:
+            with self._condition:
+                self.size -= self._entry_sizes.pop(entry_id, 0)
+                self._attempts.pop(entry_id, None)
+                self._in_flight -= 1
+                if success:
+                    self._consecutive_failures = 0
+                self._condition.notify_all()
@@ -25,7 +25,7 @@ THE SOFTWARE.
 import logging
 
 from deepomatic.api.exceptions import HTTPRetryError
-from tenacity import (Retrying, after_log, before_log)
+from tenacity import (AsyncRetrying, Retrying, after_log, before_log)
 
 logger = logging.getLogger(__name__)
 
@@ -40,23 +40,49 @@ def retry(apply_func, retry_if, wait, stop, **kwargs):
     return retryer(apply_func)
 
 
+async def async_retry(apply_func, retry_if, wait, stop, **kwargs):
+    # Same as `retry` but `apply_func` is a coroutine function, waits are done with `asyncio.sleep`
+    retryer = AsyncRetrying(retry=retry_if,
+                            wait=wait,
+                            stop=stop,
+                            before=before_log(logger, logging.DEBUG),
+                            after=after_log(logger, logging.DEBUG),
+                            **kwargs)
+    return await retryer(apply_func)
+
+
+def log_http_retry_error(retry_error, suffix=''):
+    last_attempt = retry_error.last_attempt
+    last_exception = last_attempt.exception(timeout=0)
+    msg = "HTTPHelper failed to refresh task status. In the last attempt, "
+    if last_exception is None:
+        last_response = last_attempt.result()
+        msg += 'the status code was {}.'.format(last_response.status_code)
+    else:
+        msg += 'an exception occured: {}.'.format(last_exception)
+    if suffix:
+        msg += ' ' + suffix
+    logger.warning(msg)
+
+
 def warn_on_http_retry_error(http_func, suffix='', reraise=True):
     # http helper can raise a HTTPRetryError
     try:
         # this should be an http_helper call
         return http_func()
     except HTTPRetryError as e:
-        last_attempt = e.last_attempt
-        last_exception = last_attempt.exception(timeout=0)
-        msg = "HTTPHelper failed to refresh task status. In the last attempt, "
-        if last_exception is None:
-            last_response = last_attempt.result()
-            msg += 'the status code was {}.'.format(last_response.status_code)
-        else:
-            msg += 'an exception occured: {}.'.format(last_exception)
-        if suffix:
-            msg += ' ' + suffix
-        logger.warning(msg)
+        log_http_retry_error(e, suffix)
+        if reraise:
+            raise
+        return None
+
+
+async def async_warn_on_http_retry_error(http_func, suffix='', reraise=True):
+    # Same as `warn_on_http_retry_error` but `http_func` is a coroutine function
+    try:
+        return await http_func()
+    except HTTPRetryError as e:
+        log_http_retry_error(e, suffix)
         if reraise:
             raise
         return None
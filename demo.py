@@ -340,6 +340,18 @@ def demo(client=None):
     for pos, success in success_tasks:
         assert (tasks[pos].pk == success.pk)
 
+    print_header("Run multiple inferences concurrently")
+    """
+    The same can be achieved with '.batch_inference()': inference requests are sent concurrently
+    and results are returned in the input order. An input failure doesn't fail the whole batch,
+    the exception is returned instead of the result.
+    """
+    results = spec.batch_inference([[ImageInput(demo_url)]] * nb_inference, max_in_flight=10)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning("Inference failed: %s" % result)
+    logger.info(results[0])
+
 ###########
 # Helpers #
 ###########
@@ -37,6 +37,14 @@ setup(
     long_description_content_type='text/markdown',
     data_files=[('', ['requirements.txt'])],
     install_requires=requirements,
+    extras_require={
+        'aio': ['aiohttp>=3.7,<4', 'tenacity>=8.0,<9'],
+        'orjson': ['orjson>=3,<4'],
+        'image': ['Pillow>=7'],
+    },
+    entry_points={
+        'console_scripts': ['deepomatic-infer=deepomatic.api.bulk:main'],
+    },
     python_requires=">=3.8.*",
     classifiers=[
         'Operating System :: OS Independent',
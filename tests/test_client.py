@@ -1,25 +1,51 @@
+import asyncio
 import base64
+import concurrent.futures
 import functools
+import gc
 import hashlib
+import io
+import json
 import logging
 import os
 import re
 import shutil
+import subprocess
+import sys
 import tempfile
 import time
+import weakref
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
 
 import httpretty
+import numpy as np
 import pytest
 import requests
 import six
+from deepomatic.api.aio.client import AsyncClient
+from deepomatic.api.bulk import bulk_inference, iter_inputs, main as bulk_main
+from deepomatic.api.checkpoint import CheckpointJournal
 from deepomatic.api.client import Client
-from deepomatic.api.exceptions import ServerError, ClientError, TaskError, TaskTimeout, HTTPRetryError, TaskRetryError
-from deepomatic.api.http_retry import HTTPRetry
-from deepomatic.api.inputs import ImageInput
+from deepomatic.api.concurrency import AIMDLimiter
+from deepomatic.api.exceptions import (ServerError, ClientError, TaskError, TaskTimeout, HTTPRetryError, TaskRetryError,
+                                       DeepomaticException, CircuitOpenError, SpoolFullError,
+                                       UnimplementedException)
+from deepomatic.api.hedging import RequestHedging
+from deepomatic.api.http_cache import ResponseCache
+from deepomatic.api.http_retry import CircuitBreaker, HTTPRetry, RetryBudget, parse_retry_after
+from deepomatic.api.inference_cache import InferenceCache, inference_cache_key
+from deepomatic.api.inputs import AUTO_SIZE, ImageInput, downscale_image, format_inputs
+from deepomatic.api.json_codec import JSONCodec, get_json_codec
+from deepomatic.api.metrics import Histogram, endpoint_label
+from deepomatic.api.multipart import MultipartEncoder
+from deepomatic.api.resources.network import Network, tensor_to_numpy
+from deepomatic.api.single_flight import SingleFlight
+from deepomatic.api.spool import InferenceSpool, is_transient_error
 from deepomatic.api.version import __title__, __version__
 from requests.exceptions import ConnectionError, MissingSchema
-from tenacity import RetryError, stop_after_delay
+from tenacity import RetryError, stop_after_delay, wait_fixed
 
 from pytest_voluptuous import S
 from voluptuous.validators import All, Any, Length
@@ -175,6 +201,39 @@ class TestClient(object):
             'Accept': 'application/json'
         }
 
+    def test_lazy_imports(self):
+        # numpy is only imported by `Network.inference`
+        script = ("import sys; from deepomatic.api.client import Client; Client(api_key='fake'); "
+                  "assert 'numpy' not in sys.modules")
+        subprocess.check_call([sys.executable, '-c', script])
+
+    def test_share_connections(self):
+        shared_client = get_client(share_connections=True, pool_block=True)
+        other_tenant_client = get_client(api_key='other-api-key', share_connections=True, pool_block=True)
+        client = get_client(pool_block=True)
+
+        def get_adapter(client):
+            return client.http_helper.session.get_adapter(client.http_helper.host)
+
+        assert get_adapter(shared_client) is get_adapter(other_tenant_client)
+        assert get_adapter(shared_client) is not get_adapter(client)
+        assert get_adapter(shared_client)._pool_block
+        assert other_tenant_client.http_helper.session.headers['X-API-KEY'] == 'other-api-key'
+
+    def test_warmup(self, client):
+        assert client.warmup(2) == 2
+        assert get_client(host='http://invalid-domain.deepomatic.com').warmup(2) == 0
+
+    def test_warmup_busy_pool(self):
+        client = get_client(host='http://127.0.0.1:1', pool_maxsize=1, pool_block=True)
+        pool = client.http_helper._get_pool()
+        # the only connection is used by another thread: no wait
+        conn = pool._get_conn()
+        try:
+            assert client.warmup() == 0
+        finally:
+            pool._put_conn(conn)
+
     def test_list_specs(self, client):
         specs = client.RecognitionSpec.list(public=True)
         assert specs.count() > 0
@@ -300,6 +359,30 @@ class TestClient(object):
         assert '\n' not in str(task_error)
         assert '\n' not in str(task_timeout)
 
+    def test_as_completed(self, client):
+        spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+        tasks = [spec.inference(inputs=[ImageInput(DEMO_URL)], return_task=True, wait_task=False)
+                 for _ in range(10)]
+
+        positions = []
+        for pos, task in client.Task.as_completed(tasks, timeout=30):
+            assert tasks[pos].pk == task.pk
+            assert task['status'] == 'success'
+            assert inference_schema() == task['data']
+            positions.append(pos)
+        assert sorted(positions) == list(range(len(tasks)))
+
+    def test_batch_inference(self, client):
+        spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+        inputs_list = [[ImageInput(DEMO_URL)] for _ in range(10)]
+        inputs_list.insert(3, [])  # invalid inputs, only this one should fail
+        results = spec.batch_inference(inputs_list, max_in_flight=5, show_discarded=True, max_predictions=3)
+        assert len(results) == len(inputs_list)
+        assert isinstance(results[3], ClientError)
+        for pos, result in enumerate(results):
+            if pos != 3:
+                assert inference_schema() == result
+
     def test_client_error(self, client):
         spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
         with pytest.raises(ClientError) as exc:
@@ -407,3 +490,1018 @@ class TestClientRetry(object):
         # check that there is no retry on exceptions from DEFAULT_RETRY_EXCEPTION_TYPES_BLACKLIST
         with pytest.raises(MissingSchema):
             client.http_helper.http_retry.retry(functools.partial(requests.get, ''))
+
+    @httpretty.activate
+    def test_retry_after(self):
+        task = json.dumps({'id': 42, 'status': 'success', 'data': {}, 'error': None})
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/.*'), responses=[
+            httpretty.Response(body='', status=429, adding_headers={'Retry-After': '0.5'}),
+            httpretty.Response(body=task, status=200, content_type='application/json'),
+        ])
+        client = self.get_client_with_retry()
+        t = time.time()
+        assert client.Task.retrieve(42).wait()['status'] == 'success'
+        assert 0.5 <= time.time() - t < 1.5
+
+        # the hint is capped by the remaining time before the retry stops
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/.*'), status=503,
+                               adding_headers={'Retry-After': '3600'})
+        t = time.time()
+        with pytest.raises(HTTPRetryError) as exc:
+            client.Task.retrieve(42).refresh()
+        assert exc.value.last_attempt.attempt_number == 2
+        assert self.DEFAULT_TIMEOUT <= time.time() - t < self.DEFAULT_TIMEOUT + 1
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('invalid') is None
+        assert parse_retry_after('2') == 2.
+        assert parse_retry_after(formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.
+
+    @httpretty.activate
+    def test_retry_budget(self):
+        self.register_uri([httpretty.GET], 502)
+        retry_budget = RetryBudget(ratio=0, min_retries_per_second=0, max_tokens=3)
+        client = get_client(http_retry=HTTPRetry(stop=stop_after_delay(self.DEFAULT_TIMEOUT), wait=wait_fixed(0),
+                                                 retry_budget=retry_budget))
+        t = time.time()
+        with pytest.raises(HTTPRetryError) as exc:
+            client.Task.retrieve(42).refresh()
+        assert exc.value.last_attempt.attempt_number == 4
+        assert time.time() - t < self.DEFAULT_TIMEOUT
+        # the budget is empty, the next requests and Task.wait() do not retry anymore
+        with pytest.raises(TaskTimeout):
+            client.Task.retrieve(42).wait(timeout=self.DEFAULT_TIMEOUT)
+        assert time.time() - t < self.DEFAULT_TIMEOUT
+        assert len(httpretty.latest_requests()) == 5
+
+    @httpretty.activate
+    def test_circuit_breaker(self):
+        self.register_uri([httpretty.GET], 502)
+        circuit_breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=0.5)
+        client = get_client(http_retry=HTTPRetry(stop=stop_after_delay(self.DEFAULT_TIMEOUT), wait=wait_fixed(0),
+                                                 circuit_breaker=circuit_breaker))
+        with pytest.raises(CircuitOpenError):
+            client.Task.retrieve(42).refresh()
+        assert len(httpretty.latest_requests()) == 3
+        assert circuit_breaker.state == CircuitBreaker.OPEN
+        # fail fast without sending requests
+        with pytest.raises(CircuitOpenError):
+            client.Task.retrieve(42).wait()
+        assert len(httpretty.latest_requests()) == 3
+
+        # half-open: a probe is sent after the recovery timeout
+        time.sleep(0.5)
+        assert circuit_breaker.state == CircuitBreaker.HALF_OPEN
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*'), content_type='application/json',
+                               body=json.dumps({'id': 42, 'status': 'success', 'data': {}, 'error': None}))
+        assert client.Task.retrieve(42).wait()['status'] == 'success'
+        assert circuit_breaker.state == CircuitBreaker.CLOSED
+
+    def test_circuit_breaker_stale_call(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.2)
+        slow_call = circuit_breaker.before_call()
+        circuit_breaker.after_call(True, circuit_breaker.before_call())
+        time.sleep(0.2)
+        probe = circuit_breaker.before_call()
+        assert probe and not slow_call
+        # the slow call, started before the circuit opened, completes during the probe: only the probe settles it
+        circuit_breaker.after_call(False, slow_call)
+        assert circuit_breaker.state == CircuitBreaker.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            circuit_breaker.before_call()
+        circuit_breaker.after_call(True, probe)
+        assert circuit_breaker.state == CircuitBreaker.OPEN
+
+
+class TestTaskPoller(object):
+
+    def register_tasks_list(self, error_task_ids=()):
+        def tasks_list(request, uri, response_headers):
+            results = []
+            for task_id in request.querystring['task_ids']:
+                task_id = int(task_id)
+                if task_id in error_task_ids:
+                    results.append({'id': task_id, 'status': 'error', 'data': None, 'error': 'error'})
+                else:
+                    results.append({'id': task_id, 'status': 'success', 'data': {'task_id': task_id}, 'error': None})
+            return [200, response_headers, json.dumps({'count': len(results), 'next': None, 'prev': None,
+                                                       'results': results})]
+
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/.*'), body=tasks_list,
+                               content_type='application/json')
+
+    @httpretty.activate
+    def test_task_poller(self):
+        self.register_tasks_list()
+        client = get_client(task_poller=True)
+        tasks = [client.Task.retrieve(task_id) for task_id in range(250)]
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            waited_tasks = list(executor.map(lambda task: task.wait(timeout=5), tasks))
+
+        assert all(task['status'] == 'success' for task in waited_tasks)
+        # tasks are refreshed per batch of 100 instead of one request per task
+        assert len(httpretty.latest_requests()) < 25
+        assert client.task_poller.pending_count() == 0
+
+    @httpretty.activate
+    def test_batch_wait_chunks(self):
+        self.register_tasks_list(error_task_ids=[42, 142])
+        client = get_client()
+        tasks = [client.Task.retrieve(task_id) for task_id in range(250)]
+        pending_tasks, success_tasks, error_tasks = client.Task.batch_wait(tasks, chunk_size=50, timeout=5)
+
+        assert pending_tasks == []
+        assert [pos for pos, task in error_tasks] == [42, 142]
+        assert [pos for pos, task in success_tasks] == [pos for pos in range(250) if pos not in (42, 142)]
+        assert all(tasks[pos].pk == task.pk for pos, task in success_tasks + error_tasks)
+        list_requests = [request for request in httpretty.latest_requests() if 'task_ids' in request.querystring]
+        assert sorted(len(request.querystring['task_ids']) for request in list_requests) == [50] * 5
+
+    @httpretty.activate
+    def test_inference_async(self):
+        self.register_tasks_list(error_task_ids=[3])
+        task_ids = iter(range(10))
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'),
+                               body=lambda request, uri, headers: [200, headers, json.dumps({'task_id': next(task_ids)})],
+                               content_type='application/json')
+        client = get_client()
+        spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+        futures = [spec.inference_async(inputs=[ImageInput(DEMO_URL)], timeout=5) for _ in range(10)]
+        futures.append(spec.inference_async(timeout=5))  # missing inputs
+
+        done, not_done = concurrent.futures.wait(futures, timeout=10)
+        assert not not_done
+        for task_id, future in enumerate(futures[:10]):
+            assert future.task.pk == task_id
+            if task_id == 3:
+                assert isinstance(future.exception(), TaskError)
+            else:
+                assert future.result() == {'task_id': task_id}
+        assert isinstance(futures[10].exception(), DeepomaticException)
+        # the client Task.wait() is unchanged
+        assert client.http_helper.task_poller is None
+
+        # the poller doesn't keep the client alive once its thread is stopped
+        task_poller = client.http_helper._task_poller
+        while task_poller._thread is not None:
+            time.sleep(0.01)
+        helper = weakref.ref(client.http_helper)
+        del client, spec, futures, done, future, task_poller
+        gc.collect()
+        assert helper() is None
+
+
+class TestClientMetrics(object):
+
+    @httpretty.activate
+    def test_stats(self):
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/.*'), responses=[
+            httpretty.Response(body='', status=502),
+            httpretty.Response(body=json.dumps({'id': 42, 'status': 'success', 'data': {}, 'error': None}), status=200,
+                               content_type='application/json'),
+        ])
+        client = get_client()
+        client.Task.retrieve(42).refresh()
+        client.Task.retrieve(43).refresh()
+
+        stats = client.stats()
+        assert list(stats) == ['GET /tasks/{id}/']
+        stats = stats['GET /tasks/{id}/']
+        assert stats['requests'] == 2
+        assert stats['attempts'] == 3
+        assert stats['retries'] == {'502': 1}
+        assert stats['status_codes'] == {'200': 2}
+        assert stats['errors'] == {}
+        assert stats['latency']['count'] == 2
+        assert stats['network']['count'] == 3
+        assert stats['retry_wait']['count'] == 1
+        assert stats['bytes_received'] == 2 * stats['response_size']['max'] > 0
+
+        prometheus = client.metrics.to_prometheus()
+        assert '# TYPE deepomatic_client_requests_total counter' in prometheus
+        assert 'deepomatic_client_requests_total{method="GET",endpoint="/tasks/{id}/"} 2' in prometheus
+        assert 'deepomatic_client_retries_total{method="GET",endpoint="/tasks/{id}/",cause="502"} 1' in prometheus
+        assert 'deepomatic_client_request_duration_seconds_count{method="GET",endpoint="/tasks/{id}/"} 2' in prometheus
+
+        assert client.stats(reset=True)
+        assert client.stats() == {}
+
+    def test_disabled(self):
+        client = get_client(metrics=False)
+        client.metrics.request('GET', '/tasks/42/').serialized(None)
+        assert client.stats() == {}
+
+    def test_endpoint_label(self):
+        assert endpoint_label('/recognition/specs/imagenet-inception-v3/inference') == '/recognition/specs/{id}/inference'
+        assert endpoint_label('https://api.deepomatic.com/v0.7/tasks/?page=2',
+                              'https://api.deepomatic.com/v0.7') == '/tasks/'
+        # ids are found by their position in the route, whatever their value
+        assert endpoint_label('/recognition/public/fashion-v/inference') == '/recognition/public/{id}/inference'
+        assert endpoint_label('/networks/public/customnet/') == '/networks/public/{id}/'
+        assert endpoint_label('/recognition/specs/my-spec/versions') == '/recognition/specs/{id}/versions'
+        assert endpoint_label('/networks/') == '/networks/'
+        assert endpoint_label('/accounts/me/') == '/accounts/me/'
+
+    def test_histogram(self):
+        histogram = Histogram()
+        for i in range(1, 10001):
+            histogram.record(i / 1000.)
+        assert histogram.count == 10000
+        assert histogram.min == 0.001 and histogram.max == 10.
+        for q in [0.5, 0.9, 0.99]:
+            assert histogram.quantile(q) == pytest.approx(10 * q, rel=0.04)
+
+
+class TestConcurrencyLimiter(object):
+
+    class Response(object):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    def test_aimd(self):
+        limiter = AIMDLimiter(initial_limit=4, max_limit=5)
+        tokens = [limiter.acquire() for _ in range(4)]
+        assert limiter.in_flight == 4
+        # the limit grows by one after about `limit` successful requests with a stable latency
+        for token in tokens:
+            limiter.release(token, 0.1, response=self.Response(200))
+        assert limiter.limit == 4
+        limiter.release(limiter.acquire(), 0.1, response=self.Response(200))
+        assert limiter.limit == 5
+        for _ in range(10):
+            limiter.release(limiter.acquire(), 0.1, response=self.Response(200))
+        assert limiter.limit == 5
+
+        # the requests in flight at the time of a decrease only decrease the limit once
+        tokens = [limiter.acquire() for _ in range(4)]
+        limiter.release(tokens[0], 0.1, response=self.Response(429))
+        limiter.release(tokens[1], 0.1, exception=requests.exceptions.ReadTimeout())
+        assert limiter.limit == 2
+        limiter.release(tokens[2], 0.1, response=self.Response(503))
+        assert limiter.limit == 2
+        limiter.release(limiter.acquire(), 0.1, response=self.Response(503))
+        assert limiter.limit == 1
+        # a latency increase does not raise the limit
+        limiter.release(tokens[3], 1., response=self.Response(200))
+        assert limiter.limit == 1
+        assert limiter.in_flight == 0
+
+    @httpretty.activate
+    def test_client(self):
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/.*'), responses=[
+            httpretty.Response(body='', status=503),
+            httpretty.Response(body=json.dumps({'id': 42, 'status': 'success', 'data': {}, 'error': None}), status=200,
+                               content_type='application/json'),
+        ])
+        client = get_client(concurrency_limiter=True, pool_maxsize=50)
+        limiter = client.http_helper.concurrency_limiter
+        assert limiter.limit == 10 and limiter.max_limit == 50
+        client.Task.retrieve(42).refresh()
+        assert limiter.limit == 5
+        assert limiter.in_flight == 0
+        assert 'deepomatic_client_concurrency_limit 5' in client.metrics.to_prometheus()
+
+
+class TestRequestHedging(object):
+
+    @httpretty.activate
+    def test_hedging(self):
+        calls = []
+
+        def task_detail(request, uri, response_headers):
+            calls.append(uri)
+            if len(calls) == 1:
+                time.sleep(1)  # the first request is slow, its duplicate answers first
+            return [200, response_headers, json.dumps({'id': 42, 'status': 'success', 'data': {}, 'error': None})]
+
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/.*'), body=task_detail,
+                               content_type='application/json')
+        hedging = RequestHedging(initial_delay=0.1)
+        client = get_client(hedging=hedging)
+        t = time.time()
+        assert client.Task.retrieve(42).wait()['status'] == 'success'
+        assert time.time() - t < 0.5
+        assert len(calls) == 2
+        assert hedging.hedges_sent == 1 and hedging.hedges_won == 1
+        assert 'deepomatic_client_hedged_requests_won_total 1' in client.metrics.to_prometheus()
+        hedging.shutdown()  # wait for the slow request
+
+        # the delay is the latency percentile of the endpoint once enough requests have been measured
+        assert hedging.get_delay(client.metrics, 'GET', '/tasks/43/') == 0.1
+        hedging.min_samples = 2
+        hedging.percentile = 0.5
+        assert hedging.get_delay(client.metrics, 'GET', '/tasks/43/') < 0.1
+
+    def test_hedge_budget(self):
+        hedging = RequestHedging(initial_delay=0.01, max_ratio=0)
+        for _ in range(12):
+            assert hedging.call(lambda: time.sleep(0.03) or 42, 0.01) == 42
+        assert hedging.hedges_sent == 10
+
+
+class TestSingleFlight(object):
+
+    @httpretty.activate
+    def test_coalesce_gets(self):
+        calls = []
+
+        def spec_detail(request, uri, response_headers):
+            calls.append(uri)
+            time.sleep(0.3)
+            return [200, response_headers, json.dumps({'id': 'my-spec', 'name': 'My spec', 'outputs': []})]
+
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/recognition/.*'), body=spec_detail,
+                               content_type='application/json')
+        client = get_client(coalesce_gets=True)
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            specs = list(executor.map(lambda _: client.RecognitionSpec.retrieve('my-spec').data(), range(10)))
+
+        assert len(calls) == 1
+        assert client.http_helper.single_flight.coalesced == 9
+        assert all(spec == {'id': 'my-spec', 'name': 'My spec', 'outputs': []} for spec in specs)
+        # each caller gets its own copy
+        assert len(set(id(spec) for spec in specs)) == 10
+
+        # a new request is sent once the previous one is done
+        client.RecognitionSpec.retrieve('my-spec').data()
+        assert len(calls) == 2
+
+    def test_exception(self):
+        single_flight = SingleFlight()
+
+        def fail():
+            time.sleep(0.2)
+            raise ValueError()
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(single_flight.do, 'key', fail) for _ in range(3)]
+        assert all(isinstance(future.exception(), ValueError) for future in futures)
+        assert single_flight.coalesced == 2
+        assert single_flight.do('key', lambda: 42) == (42, False)
+
+    def test_leader_shared(self):
+        single_flight = SingleFlight()
+
+        def slow():
+            time.sleep(0.2)
+            return {'id': 1}
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(single_flight.do, 'key', slow) for _ in range(3)]
+        # the caller which sent the request must also copy the result shared with the others
+        assert [future.result()[1] for future in futures] == [True] * 3
+
+
+class TestResponseCache(object):
+
+    @httpretty.activate
+    def test_revalidate(self):
+        calls = []
+
+        def spec_detail(request, uri, response_headers):
+            calls.append(request.headers.get('If-None-Match'))
+            response_headers['ETag'] = '"v1"'
+            if request.headers.get('If-None-Match') == '"v1"':
+                return [304, response_headers, '']
+            return [200, response_headers, json.dumps({'id': 1, 'name': 'My spec'})]
+
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/recognition/specs/1/'), body=spec_detail,
+                               content_type='application/json')
+        httpretty.register_uri(httpretty.PATCH, re.compile(r'https?://.*/recognition/specs/1/'),
+                               body=json.dumps({'id': 1, 'name': 'New name'}), content_type='application/json')
+        client = get_client(response_cache=True)
+        cache = client.http_helper.response_cache
+        assert client.RecognitionSpec.retrieve(1)['name'] == 'My spec'
+        assert client.RecognitionSpec.retrieve(1)['name'] == 'My spec'
+        assert calls == [None, '"v1"']
+        assert cache.revalidations == 1 and len(cache) == 1
+
+        client.RecognitionSpec.retrieve(1).update(name='New name')
+        assert len(cache) == 0
+
+    @httpretty.activate
+    def test_ttl(self):
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/recognition/versions/1/'),
+                               body=json.dumps({'id': 1, 'spec_id': 2}), content_type='application/json')
+        httpretty.register_uri(httpretty.DELETE, re.compile(r'https?://.*/recognition/versions/1/'), status=204)
+        client = get_client(response_cache=ResponseCache(ttls={'Task': 60}))
+        versions = [client.RecognitionVersion.retrieve(1).data() for _ in range(3)]
+        assert len(httpretty.latest_requests()) == 1
+        assert versions[0] == versions[2] and versions[0] is not versions[2]
+        assert client.http_helper.response_cache.hits == 2
+
+        client.RecognitionVersion.retrieve(1).delete()
+        client.RecognitionVersion.retrieve(1).data()
+        assert len(httpretty.latest_requests()) == 3
+
+    def test_size(self):
+        cache = ResponseCache(max_size=10)
+        for i in range(4):
+            response = requests.Response()
+            response._content = b'1234'
+            cache.set(ResponseCache.get_key('http://api/specs/%d/' % i), response)
+        assert len(cache) == 2 and cache.size == 8
+        assert cache.get('http://api/specs/0/', 10) == (None, False)
+        assert cache.get('http://api/specs/3/', 10)[1]
+        cache.invalidate('http://api/specs/', collection=True)
+        assert len(cache) == 2
+        cache.invalidate('http://api/specs/3/')
+        assert len(cache) == 1
+
+
+class TestInferenceCache(object):
+
+    def register_inference(self):
+        self.inferences = 0
+
+        def inference(request, uri, response_headers):
+            self.inferences += 1
+            return [200, response_headers, json.dumps({'task_id': self.inferences})]
+
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'), body=inference,
+                               content_type='application/json')
+
+        def task_detail(request, uri, response_headers):
+            task_id = int(uri.rstrip('/').rsplit('/', 1)[1])
+            task = {'id': task_id, 'status': 'success', 'data': {'outputs': [task_id]}}
+            return [200, response_headers, json.dumps(task)]
+
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/\d+/?'), body=task_detail,
+                               content_type='application/json')
+
+    @httpretty.activate
+    def test_inference_cache(self):
+        self.register_inference()
+        client = get_client(inference_cache=True)
+        spec = client.RecognitionSpec.retrieve(1)
+        image = b'\x89PNG fake image'
+        assert spec.inference(inputs=[ImageInput(image, encoding='binary')]) == {'outputs': [1]}
+        task = spec.inference(inputs=[ImageInput(base64.b64encode(image), encoding='base64')], return_task=True)
+        assert task.pk == 1 and task['data'] == {'outputs': [1]}
+        assert self.inferences == 1
+
+        # different inputs, parameters or resource
+        assert spec.inference(inputs=[ImageInput(image + b'!', encoding='binary')]) == {'outputs': [2]}
+        assert spec.inference(inputs=[ImageInput(image, encoding='binary', bbox={'xmin': 0.5})]) == {'outputs': [3]}
+        assert client.RecognitionSpec.retrieve(2).inference(inputs=[ImageInput(image, encoding='binary')]) == {'outputs': [4]}
+        spec.inference(inputs=[ImageInput(image, encoding='binary')], wait_task=False)
+        assert self.inferences == 5
+        cache = client.http_helper.inference_cache
+        assert cache.hits == 1 and cache.misses == 4
+
+    def test_file_path_key(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as f:
+            f.write(b'first image')
+            f.flush()
+            files = {'inputs': [{'image': {'source': f.name}}]}
+            key = inference_cache_key('uri', {}, files)
+            data_key = inference_cache_key('uri', {'source': f.name})
+            # the content of the file paths of `files` is hashed, the strings of `data` are not file paths
+            f.seek(0)
+            f.write(b'other image')
+            f.flush()
+            assert inference_cache_key('uri', {}, files) != key
+            assert inference_cache_key('uri', {'source': f.name}) == data_key
+
+    @httpretty.activate
+    def test_disk_cache(self):
+        self.register_inference()
+        directory = tempfile.mkdtemp()
+        try:
+            spec = get_client(inference_cache=directory).RecognitionSpec.retrieve(1)
+            for i in range(3):
+                spec.inference(inputs=[ImageInput('https://example.com/%d.jpg' % i)])
+            time.sleep(0.05)  # the access times used for the eviction have a coarse resolution
+            spec = get_client(inference_cache=InferenceCache(directory=directory, max_entries=1)).RecognitionSpec.retrieve(1)
+            assert spec.inference(inputs=[ImageInput('https://example.com/1.jpg')]) == {'outputs': [2]}
+            assert self.inferences == 3
+
+            # the least recently used tasks are removed, down to 90% of the maximum size
+            disk_size = get_client(inference_cache=directory).http_helper.inference_cache.disk_size
+            cache = InferenceCache(directory=directory, max_disk_size=disk_size)
+            cache.set(inference_cache_key('uri', {}), {'id': 4, 'status': 'success', 'data': {'outputs': [4]}})
+            assert len(os.listdir(directory)) == 2 and cache.disk_size <= 0.9 * disk_size
+            # the recently read task is kept
+            get_client(inference_cache=directory).RecognitionSpec.retrieve(1).inference(inputs=[ImageInput('https://example.com/1.jpg')])
+            assert self.inferences == 3
+            spec.inference(inputs=[ImageInput('https://example.com/0.jpg')])
+            assert self.inferences == 4
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestBulkInference(object):
+
+    def test_iter_inputs(self):
+        directory = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(directory, 'sub'))
+            for name in ['b.jpg', 'a.PNG', 'notes.txt', os.path.join('sub', 'c.jpeg')]:
+                with open(os.path.join(directory, name), 'wb') as f:
+                    f.write(b'image')
+            paths = [os.path.join(directory, name) for name in ['a.PNG', 'b.jpg', os.path.join('sub', 'c.jpeg')]]
+            assert [key for key, _ in iter_inputs(directory)] == paths
+            assert [key for key, _ in iter_inputs(os.path.join(directory, '**', '*.jp*g'))] == paths[1:]
+
+            jsonl = os.path.join(directory, 'manifest.jsonl')
+            with open(jsonl, 'w') as f:
+                f.write('"{}"\n\n{{"key": "dog", "url": "{}"}}\n'.format(paths[0], DEMO_URL))
+            assert list(iter_inputs(jsonl)) == [(paths[0], paths[0]), ('dog', DEMO_URL)]
+            csv_manifest = os.path.join(directory, 'manifest.csv')
+            with open(csv_manifest, 'w') as f:
+                f.write('image,label\n{},dog\n'.format(DEMO_URL))
+            assert list(iter_inputs(csv_manifest)) == [(DEMO_URL, DEMO_URL)]
+        finally:
+            shutil.rmtree(directory)
+
+    @httpretty.activate
+    def test_bulk_inference(self, capsys):
+        TestTaskPoller().register_tasks_list(error_task_ids=[2])
+        task_ids = iter(range(1, 100))
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'),
+                               body=lambda request, uri, headers: [200, headers, json.dumps({'task_id': next(task_ids)})],
+                               content_type='application/json')
+        directory = tempfile.mkdtemp()
+        try:
+            image = os.path.join(directory, 'image.jpg')
+            with open(image, 'wb') as f:
+                f.write(b'image')
+            output = os.path.join(directory, 'results.jsonl')
+            inputs = [DEMO_URL, image, os.path.join(directory, 'missing.jpg'), DEMO_URL]
+            assert bulk_main(['--spec', '42', '--api-key', 'fake', '--param', 'show_discarded=true',
+                              '-o', output, '-n', '1'] + inputs) == 1
+            with open(output) as f:
+                records = [json.loads(line) for line in f]
+        finally:
+            shutil.rmtree(directory)
+
+        # records arrive as the tasks complete
+        records.sort(key=lambda record: (record['source'] != DEMO_URL, record['source'], record.get('task_id')))
+        assert [record['source'] for record in records] == [DEMO_URL, DEMO_URL] + sorted(inputs[1:3])
+        assert [record['status'] for record in records] == ['success', 'success', 'error', 'error']
+        assert records[0]['data'] == {'task_id': records[0]['task_id']}
+        errors = {record['source']: record for record in records[2:]}
+        assert errors[image]['task_id'] == 2 and errors[image]['error_type'] == 'TaskError'
+        assert errors[inputs[2]]['error_type'] == 'FileNotFoundError'
+        assert '4 inputs processed' in capsys.readouterr().err
+        inference_request = [request for request in httpretty.latest_requests() if request.method == 'POST'][0]
+        assert json.loads(inference_request.body)['show_discarded'] is True
+
+    @httpretty.activate
+    def test_chunk_error(self):
+        task_ids = iter(range(1, 100))
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'),
+                               body=lambda request, uri, headers: [200, headers, json.dumps({'task_id': next(task_ids)})],
+                               content_type='application/json')
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/.*'), status=403,
+                               body=json.dumps({'error': 'Forbidden'}), content_type='application/json')
+        inputs = [(str(i), DEMO_URL) for i in range(4)]
+        records = list(bulk_inference(inputs, 'spec', 42, window_size=2, client_kwargs={'api_key': 'fake'}))
+
+        # the job goes on after the failure of the first tasks, the ids of the sent tasks are kept
+        assert sorted(record['key'] for record in records) == ['0', '1', '2', '3']
+        assert sorted(record['task_id'] for record in records) == [1, 2, 3, 4]
+        assert all(record['status'] == 'error' and record['error_type'] == 'ClientError' for record in records)
+
+    @httpretty.activate
+    def test_sliding_window(self):
+        posted = []
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'),
+                               body=lambda request, uri, headers: posted.append(uri) or [
+                                   200, headers, json.dumps({'task_id': len(posted)})],
+                               content_type='application/json')
+
+        completed = set()
+
+        def tasks_list(request, uri, response_headers):
+            results = []
+            for task_id in map(int, request.querystring['task_ids']):
+                # the first task completes after all the others
+                status = 'pending' if task_id == 1 and 6 not in completed else 'success'
+                results.append({'id': task_id, 'status': status, 'data': {'task_id': task_id}, 'error': None})
+            completed.update(result['id'] for result in results if result['status'] == 'success')
+            return [200, response_headers, json.dumps({'count': len(results), 'next': None, 'prev': None,
+                                                       'results': results})]
+
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/tasks/.*'), body=tasks_list,
+                               content_type='application/json')
+        inputs = [(str(i), DEMO_URL) for i in range(6)]
+        records = list(bulk_inference(inputs, 'spec', 42, max_in_flight=1, window_size=2, client_kwargs={'api_key': 'fake'}))
+
+        # a slow task holds one slot of the window, the other inputs are sent meanwhile
+        assert all(record['status'] == 'success' for record in records)
+        assert records[-1]['task_id'] == 1
+        assert sorted(record['key'] for record in records) == [key for key, _ in inputs]
+
+    @httpretty.activate
+    def test_resume(self):
+        TestTaskPoller().register_tasks_list()
+        posted = []
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'),
+                               body=lambda request, uri, headers: posted.append(uri) or [200, headers, json.dumps({'task_id': 3})],
+                               content_type='application/json')
+        directory = tempfile.mkdtemp()
+        try:
+            journal = CheckpointJournal(os.path.join(directory, 'journal.sqlite'))
+            journal.set_done([{'key': 'done', 'source': DEMO_URL, 'status': 'success', 'task_id': 1, 'data': {}}])
+            journal.set_submitted([('sent', DEMO_URL, 2)])
+            # the task of a timed out input may still be running: it is waited for again, a failed task is sent again
+            journal.set_done([{'key': 'timeout', 'source': DEMO_URL, 'status': 'error', 'task_id': 4, 'error_type': 'TaskTimeout'},
+                              {'key': 'failed', 'source': DEMO_URL, 'status': 'error', 'task_id': 5, 'error_type': 'TaskError'}])
+            inputs = [('done', DEMO_URL), ('sent', DEMO_URL), ('timeout', DEMO_URL), ('failed', DEMO_URL), ('new', DEMO_URL)]
+            records = list(bulk_inference(inputs, 'spec', 42, client_kwargs={'api_key': 'fake'}, journal=journal))
+
+            assert sorted((record['key'], record['task_id']) for record in records) == [
+                ('failed', 3), ('new', 3), ('sent', 2), ('timeout', 4)]
+            assert journal.skipped == 1 and journal.resumed == 2
+            assert len(posted) == 2
+            assert journal.lookup('sent') == ('success', 2) and journal.lookup('timeout') == ('success', 4)
+            assert len(list(journal.records(status='success'))) == 5
+            journal.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestInferenceSpool(object):
+
+    @httpretty.activate
+    def test_spool(self):
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'), responses=[
+            httpretty.Response(status=503, body='{}', content_type='application/json'),
+            httpretty.Response(body=json.dumps({'task_id': 1}), content_type='application/json'),
+            httpretty.Response(status=400, body='{"error": "bad input"}', content_type='application/json'),
+            httpretty.Response(body=json.dumps({'task_id': 2}), content_type='application/json'),
+        ])
+        client = get_client()
+        spec = client.RecognitionSpec.retrieve(42)
+        directory = tempfile.mkdtemp()
+        try:
+            spool = InferenceSpool(client, directory)
+            entry_ids = [spool.submit(spec, inputs=[ImageInput(DEMO_URL)]),
+                         spool.submit(spec, inputs=[ImageInput(b'image', encoding='binary')]),
+                         spool.submit(spec, inputs=[ImageInput(io.BytesIO(b'image'))])]
+            assert entry_ids == [0, 1, 2]
+            with open(spool._path(1)) as f:
+                assert json.load(f)['files'] == {'inputs': [{'image': {'source': {'$base64': 'aW1hZ2U='},
+                                                                       'crop_uniform_background': False}}]}
+            with pytest.raises(SpoolFullError):
+                InferenceSpool(client, directory, max_size=spool.size).submit(spec, inputs=[ImageInput(DEMO_URL)])
+
+            # the requests are sent by the next process, which removes the files of an interrupted submit()
+            open(os.path.join(directory, 'interrupted.tmp'), 'w').close()
+            submitted, errors = [], []
+            spool = InferenceSpool(client, directory, min_backoff=0.05, on_submitted=lambda i, task: submitted.append((i, task.pk)),
+                                   on_error=lambda i, e: errors.append((i, type(e))))
+            assert len(spool) == 3
+            with spool:
+                assert spool.join(timeout=5)
+            assert submitted == [(0, 1), (2, 2)]
+            assert errors == [(1, ClientError)]
+            assert spool.failures == 1 and spool.healthy
+            assert spool.size == 0 and os.listdir(directory) == []
+        finally:
+            shutil.rmtree(directory)
+
+    def test_transient_errors(self):
+        assert is_transient_error(ConnectionError())
+        assert is_transient_error(requests.exceptions.ReadTimeout())
+        # a misconfigured request would fail again
+        assert not is_transient_error(MissingSchema())
+        assert not is_transient_error(requests.exceptions.InvalidURL())
+
+    @httpretty.activate
+    def test_failing_callback(self):
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'),
+                               body=json.dumps({'task_id': 1}), content_type='application/json')
+        spec = get_client().RecognitionSpec.retrieve(42)
+        directory = tempfile.mkdtemp()
+        try:
+            def on_submitted(entry_id, task):
+                raise ValueError()
+
+            spool = InferenceSpool(spec._helper, directory, on_submitted=on_submitted)
+            for _ in range(3):
+                spool.submit(spec, inputs=[ImageInput(DEMO_URL)])
+            # a spooled request removed by hand is rejected
+            os.remove(spool._path(1))
+            with spool:
+                assert spool.join(timeout=5)
+            assert spool.submitted == 2 and spool.rejected == 1 and len(spool) == 0 and spool.size == 0
+        finally:
+            shutil.rmtree(directory)
+
+    @httpretty.activate
+    def test_failing_request(self):
+        def inference(request, uri, headers):
+            if b'bad' in request.body:
+                return [500, headers, '{}']
+            if b'invalid' in request.body:
+                return [400, headers, '{"error": "bad input"}']
+            return [200, headers, json.dumps({'task_id': 1})]
+
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'), body=inference,
+                               content_type='application/json')
+        spec = get_client().RecognitionSpec.retrieve(42)
+        directory = tempfile.mkdtemp()
+        try:
+            errors = []
+            spool = InferenceSpool(spec._helper, directory, min_backoff=0.01, max_attempts=2,
+                                   on_error=lambda i, e: errors.append((i, type(e))))
+            for source in ['bad', 'good', 'good']:
+                spool.submit(spec, inputs=[ImageInput(DEMO_URL + source)])
+            # a request which always fails waits behind the others, then is rejected
+            with spool:
+                assert spool.join(timeout=5)
+            assert errors == [(0, ServerError)]
+            assert spool.submitted == 2 and spool.rejected == 1 and spool.failures == 4
+
+            # a request rejected by the API doesn't make it healthy again
+            spool.submit(spec, inputs=[ImageInput(DEMO_URL + 'bad')])
+            spool.submit(spec, inputs=[ImageInput(DEMO_URL + 'invalid')])
+            spool.max_attempts = 1
+            with spool:
+                spool.join(timeout=0.2)
+            assert not spool.healthy and spool.rejected == 2
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestJSONCodec(object):
+
+    def test_get_json_codec(self):
+        assert isinstance(get_json_codec(), JSONCodec)
+        assert isinstance(get_json_codec('auto'), JSONCodec)
+        codec = JSONCodec()
+        assert get_json_codec(codec) is codec
+        with pytest.raises(DeepomaticException):
+            get_json_codec('unknown')
+
+    @httpretty.activate
+    def test_request_with_codec(self):
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*'),
+                               body='{"task_id": 1, "results": [1.5, 2.5]}',
+                               content_type='application/json')
+        client = get_client(json_codec='auto')
+        result = client.http_helper.post('/recognition/specs/1/inference',
+                                         data={'inputs': [{'image': {'source': DEMO_URL}}]},
+                                         params={'filter': {'name': 'dog'}})
+        assert result == {'task_id': 1, 'results': [1.5, 2.5]}
+        request = httpretty.last_request()
+        assert json.loads(request.body) == {'inputs': [{'image': {'source': DEMO_URL}}]}
+        assert json.loads(request.querystring['filter'][0]) == {'name': 'dog'}
+
+
+class TestTensorToNumpy(object):
+
+    def test_encodings(self):
+        array = np.arange(24, dtype=np.float32).reshape((1, 2, 3, 4))
+        npy = six.BytesIO()
+        np.save(npy, array)
+        tensors = [
+            {'name': 'json', 'shape': [1, 2, 3, 4], 'data': array.ravel().tolist()},
+            {'name': 'nested', 'shape': [1, 2, 3, 4], 'data': array.tolist()},
+            {'name': 'base64', 'shape': [1, 2, 3, 4], 'encoding': 'base64', 'dtype': 'float32',
+             'data': base64.b64encode(array.astype('<f4').tobytes()).decode('ascii')},
+            {'name': 'npy', 'shape': [1, 2, 3, 4], 'encoding': 'npy',
+             'data': base64.b64encode(npy.getvalue()).decode('ascii')},
+        ]
+        result = Network._convert_result_to_numpy({'tensors': tensors})
+        for name, value in result.items():
+            np.testing.assert_array_equal(value, array)
+        assert result['json'].dtype == np.float64  # same as before when no dtype is given
+        assert result['base64'].dtype == np.float32
+        # binary tensors are not copied
+        assert not result['base64'].flags.writeable and not result['npy'].flags.writeable
+
+        fortran = six.BytesIO()
+        np.save(fortran, np.asfortranarray(array[0, 0]))
+        tensor = {'name': 'fortran', 'shape': [3, 4], 'encoding': 'npy', 'data': fortran.getvalue()}
+        np.testing.assert_array_equal(tensor_to_numpy(tensor), array[0, 0])
+
+        result = Network._convert_result_to_numpy({'tensors': tensors}, dtype=np.float32)
+        for name, value in result.items():
+            assert value.dtype == np.float32
+            np.testing.assert_array_equal(value, array)
+
+    @httpretty.activate
+    def test_batch_inference_no_wait(self):
+        task_ids = iter(range(1, 10))
+        httpretty.register_uri(httpretty.POST, re.compile(r'https?://.*/inference'),
+                               body=lambda request, uri, headers: [200, headers, json.dumps({'task_id': next(task_ids)})],
+                               content_type='application/json')
+        network = get_client().Network.retrieve(1)
+        # the tasks are returned, convert_to_numpy is ignored
+        tasks = network.batch_inference([[ImageInput(DEMO_URL)]] * 2, wait_task=False, max_in_flight=1)
+        assert [task.pk for task in tasks] == [1, 2]
+
+    def test_unknown_encoding(self):
+        with pytest.raises(DeepomaticException):
+            tensor_to_numpy({'name': 'msgpack', 'shape': [1], 'encoding': 'msgpack', 'data': ''})
+
+
+class TestImageDownscaling(object):
+
+    def encode_image(self, size, mode='RGB', image_format='JPEG'):
+        from PIL import Image
+        output = io.BytesIO()
+        Image.new(mode, size, color='red').save(output, format=image_format)
+        return output.getvalue()
+
+    def decode_image(self, content):
+        from PIL import Image
+        image = Image.open(io.BytesIO(content))
+        return image.format, image.size
+
+    def test_max_side(self):
+        image = self.encode_image((2000, 1000))
+        image_input = ImageInput(image, encoding='binary', bbox={'xmin': 0.1, 'ymin': 0.1, 'xmax': 0.5, 'ymax': 0.5}, max_side=500)
+        resized = image_input.get_input()['image']['source']
+        assert self.decode_image(resized) == ('JPEG', (500, 250))
+        # computed once
+        assert image_input.get_input()['image']['source'] is resized
+
+        assert ImageInput(image, encoding='binary', max_side=4000).get_input()['image']['source'] is image
+        assert ImageInput(DEMO_URL, max_side=500).get_input()['image']['source'] == DEMO_URL
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as f:
+            f.write(image)
+            f.flush()
+            assert self.decode_image(ImageInput(f.name, encoding='binary', max_side=500).get_source()) == ('JPEG', (500, 250))
+        png = self.encode_image((1000, 800), mode='RGBA', image_format='PNG')
+        assert self.decode_image(downscale_image(png, max_side=100)) == ('PNG', (100, 80))
+        assert downscale_image(b'not an image', max_side=100) == b'not an image'
+
+    def test_image_objects(self):
+        from PIL import Image
+
+        array = np.zeros((300, 400, 3), dtype=np.uint8)
+        array[:, :, 0] = 255
+        image_input = ImageInput(array, bbox={'xmin': 0.1, 'ymin': 0.1, 'xmax': 0.5, 'ymax': 0.5})
+        content_type, _, files = format_inputs([image_input], {})
+        assert content_type == 'multipart/mixed'
+        encoded = files['inputs'][0]['image']['source']
+        assert self.decode_image(encoded) == ('JPEG', (400, 300))
+        assert Image.open(io.BytesIO(encoded)).getpixel((200, 150))[0] > 240
+        # encoded once, the same bytes are sent again by the retries
+        assert image_input.get_input()['image']['source'] is encoded
+
+        assert self.decode_image(ImageInput(array[:, :, 0], max_side=100).get_source()) == ('JPEG', (100, 75))
+        assert self.decode_image(ImageInput(np.zeros((50, 60, 4), dtype=np.uint8)).get_source()) == ('PNG', (60, 50))
+        assert self.decode_image(ImageInput(Image.new('RGB', (800, 600)), max_side=400).get_source()) == ('JPEG', (400, 300))
+        with pytest.raises(DeepomaticException):
+            ImageInput(np.zeros((10, 10, 3), dtype=np.float32)).get_source()
+
+    @httpretty.activate
+    def test_auto_size(self):
+        resources = {
+            '/recognition/specs/1/': {'id': 1, 'current_version_id': 2},
+            '/recognition/versions/2/': {'id': 2, 'network_id': 3},
+            '/networks/3/': {'id': 3, 'preprocessing': {'inputs': [{'image': {'target_size': '299x299'}}]}},
+        }
+        requested = []
+        for path, data in resources.items():
+            httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*' + path), content_type='application/json',
+                                   body=lambda request, uri, headers, data=data: requested.append(uri) or [200, headers, json.dumps(data)])
+        httpretty.register_uri(httpretty.GET, re.compile(r'https?://.*/networks/4/'), content_type='application/json',
+                               body=lambda request, uri, headers: requested.append(uri) or [503, headers, '{}'])
+        client = get_client()
+        source = io.BytesIO(self.encode_image((2000, 1000)))
+        image_input = ImageInput(source, max_side=AUTO_SIZE)
+        _, _, files = client.RecognitionSpec.retrieve(1)._prepare_inference_kwargs({'inputs': [image_input]})
+        assert self.decode_image(files['inputs'][0]['image']['source']) == ('JPEG', (598, 299))
+        assert len(requested) == 3
+
+        # the size is requested once per resource id, the input is not modified
+        _, _, files = client.RecognitionSpec.retrieve(1)._prepare_inference_kwargs({'inputs': [image_input]})
+        assert self.decode_image(files['inputs'][0]['image']['source']) == ('JPEG', (598, 299))
+        assert len(requested) == 3
+        assert image_input._source is source
+
+        # without retry, the images are sent as is if the size can't be retrieved
+        _, _, files = client.Network.retrieve(4)._prepare_inference_kwargs({'inputs': [image_input]})
+        assert files['inputs'][0]['image']['source'] is source
+        assert len(requested) == 4
+        # the file is read from its start for another size
+        source.seek(0, io.SEEK_END)
+        assert self.decode_image(image_input.get_source(input_size=100)) == ('JPEG', (200, 100))
+
+
+class TestMultipartEncoder(object):
+
+    def get_files(self, content):
+        return {
+            'model': six.BytesIO(content),
+            'raw': b'raw bytes',
+            'scalar': (None, True, 'application/json'),
+        }
+
+    def test_same_body_as_requests(self):
+        content = os.urandom(200 * 1024)
+        data = {'name': 'streamed', 'preprocessing.batched_output': 1}
+        body, content_type = requests.models.RequestEncodingMixin._encode_files(self.get_files(content), data)
+        boundary = content_type.split('boundary=')[1]
+
+        encoder = MultipartEncoder(data, self.get_files(content), boundary=boundary)
+        assert encoder.content_type == content_type
+        assert len(encoder) == len(body)
+        assert b''.join(encoder) == body
+
+        # the body is sent again from its start after a rewind, as done before each retry
+        encoder.rewind()
+        chunks = []
+        chunk = encoder.read(16384)
+        while chunk:
+            assert len(chunk) <= 16384
+            chunks.append(chunk)
+            chunk = encoder.read(16384)
+        assert b''.join(chunks) == body
+
+    def test_not_seekable(self):
+        class Stream(object):
+            def read(self, size=-1):
+                return b''
+
+        with pytest.raises(DeepomaticException):
+            MultipartEncoder({}, {'file': Stream()})
+
+    def test_text_mode(self):
+        with pytest.raises(DeepomaticException):
+            MultipartEncoder({}, {'file': io.StringIO(u'text')})
+
+
+def run_async(coroutine_function):
+    @functools.wraps(coroutine_function)
+    def wrapper(*args, **kwargs):
+        return asyncio.run(coroutine_function(*args, **kwargs))
+    return wrapper
+
+
+def get_async_client(*args, **kwargs):
+    return AsyncClient(*args, user_agent_prefix=USER_AGENT_PREFIX, **kwargs)
+
+
+class TestAsyncClient(object):
+
+    @run_async
+    async def test_list_specs(self):
+        async with get_async_client() as client:
+            specs = client.RecognitionSpec.list(public=True)
+            assert await specs.count() > 0
+            async for spec in specs:
+                assert spec['id']
+                data = await spec.data()
+                assert 'name' in data
+                assert 'update_date' in data
+
+    @run_async
+    async def test_inference_spec(self):
+        async with get_async_client() as client:
+            spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+            first_result = await spec.inference(inputs=[ImageInput(DEMO_URL)], show_discarded=True, max_predictions=3)
+            assert inference_schema() == first_result
+
+            with open(download_file(DEMO_URL), 'rb') as f:
+                result = await spec.inference(inputs=[ImageInput(f)], show_discarded=True, max_predictions=3)
+            assert result == first_result
+
+    @run_async
+    async def test_batch_wait(self):
+        async with get_async_client() as client:
+            spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+            tasks = await asyncio.gather(*[spec.inference(inputs=[ImageInput(DEMO_URL)], return_task=True, wait_task=False)
+                                           for _ in range(20)])
+            pending_tasks, success_tasks, error_tasks = await client.Task.batch_wait(tasks=tasks, timeout=30)
+            assert len(pending_tasks) == 0
+            assert len(error_tasks) == 0
+            assert len(success_tasks) == len(tasks)
+            for pos, success in success_tasks:
+                assert (tasks[pos].pk == success.pk)
+                assert inference_schema() == success['data']
+
+    @run_async
+    async def test_unimplemented_sync_methods(self):
+        async with get_async_client(api_key='fake') as client:
+            for resource in [client.RecognitionSpec.retrieve(1), client.Network.retrieve(1)]:
+                with pytest.raises(UnimplementedException):
+                    resource.inference_async(inputs=[ImageInput(DEMO_URL)])
+                with pytest.raises(UnimplementedException):
+                    resource.batch_inference([[ImageInput(DEMO_URL)]])
+            with pytest.raises(UnimplementedException):
+                client.Task.as_completed([])
+
+    @run_async
+    async def test_retry_network_failure(self):
+        timeout = TestClientRetry.DEFAULT_TIMEOUT
+        http_retry = HTTPRetry(stop=stop_after_delay(timeout))
+        async with get_async_client(host='http://invalid-domain.deepomatic.com', http_retry=http_retry) as client:
+            spec = client.RecognitionSpec.retrieve('imagenet-inception-v3')
+            start_time = time.time()
+            with pytest.raises(HTTPRetryError) as exc:
+                await spec.data()
+
+        diff = time.time() - start_time
+        assert diff > timeout and diff < timeout + HTTPRetry.Default.RETRY_EXP_MAX
+        last_attempt = exc.value.last_attempt
+        assert last_attempt.attempt_number >= TestClientRetry.DEFAULT_MIN_ATTEMPT_NUMBER
+        assert isinstance(last_attempt.exception(timeout=0), ConnectionError)